@@ -2,32 +2,51 @@
 
 from flask import Flask
 import os
-from config import BUCKET_NAME, S3_URL, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
+from config import (
+    BUCKET_NAME, S3_URL, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY,
+    DATABASE_URL, SNAPSHOT_PATH, REFRESH_INTERVAL_S, CACHE_CONFIG, CLUSTER_RADIUS_M,
+    INGEST_GRACE_S,
+)
 from services.s3_service import S3Service
-from services.data_loader import load_pothole_data
-from routes import api, dashboard, export
-
-from flask_caching import Cache
+from services.repository import open_repository
+from services.snapshot import SidecarSnapshot
+from services.data_loader import load_pothole_data, load_entities, start_refresher
+from services.cache import cache, bump_data_version
+from services import metrics
+from routes import api, dashboard, export, metrics as metrics_route
 
 def create_app():
     app = Flask(__name__)
-    app.config['CACHE_TYPE'] = 'SimpleCache'
-    app.config['CACHE_DEFAULT_TIMEOUT'] = 300  # 5 minutes
+    app.config.from_mapping(CACHE_CONFIG)
+    cache.init_app(app)
+    metrics.init_app(app)
 
-    cache = Cache(app)        # ⇦ add this
-    
     app.s3 = S3Service(
         bucket_name=BUCKET_NAME,
         endpoint_url=S3_URL,
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY
     )
-
-    app.pothole_data = load_pothole_data(app)
+    metrics.instrument_boto(app.s3.svc)
+
+    app.repository = open_repository(DATABASE_URL)
+    app.snapshot = SidecarSnapshot(app.repository, push_grace_s=INGEST_GRACE_S) if app.repository is not None else None
+    if app.snapshot is not None and SNAPSHOT_PATH and not len(app.snapshot):
+        app.snapshot.import_json(SNAPSHOT_PATH)
+    # with a filled repository and a refresher, serve first and sync after
+    background_sync = app.snapshot is not None and REFRESH_INTERVAL_S > 0 and len(app.snapshot) > 0
+    app.pothole_data = load_pothole_data(app, sync=not background_sync)
+    load_entities(app, CLUSTER_RADIUS_M)
+    with app.app_context():
+        bump_data_version()
+    if app.snapshot is not None and REFRESH_INTERVAL_S > 0:
+        start_refresher(app, REFRESH_INTERVAL_S, sync_now=background_sync)
 
     app.register_blueprint(dashboard.bp)
     app.register_blueprint(api.bp)
     app.register_blueprint(export.bp)
+    if metrics.REGISTRY.enabled:
+        app.register_blueprint(metrics_route.bp)
 
     return app
 
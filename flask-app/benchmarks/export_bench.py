@@ -0,0 +1,64 @@
+"""
+Compare /api/export encodings on a synthetic dataset: bytes on the wire
+and encode time for CSV (plain and gzip) vs the columnar formats.
+
+    python benchmarks/export_bench.py [n_records]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import numpy as np
+
+from services import columnar_export
+from services.store import PotholeStore
+from services.streaming import iter_row_chunks, iter_csv, gzip_stream
+
+
+def synthetic_store(n: int) -> PotholeStore:
+    rng = np.random.default_rng(0)
+    days = rng.integers(0, 365, n)
+    records = [
+        {
+            "id": 1_700_000_000 + i,
+            "lat": round(39.9526 + rng.uniform(-0.1, 0.1), 6),
+            "lng": round(-75.1652 + rng.uniform(-0.1, 0.1), 6),
+            "severity": int(rng.integers(1, 6)),
+            "confidence": round(rng.uniform(0.5, 1.0), 2),
+            "date": str(np.datetime64("2025-01-01") + int(days[i])),
+            "description": "",
+            "s3_prefix": str(np.datetime64("2025-01-01") + int(days[i])),
+            "s3_base": f"pothole_{1_700_000_000 + i}",
+        }
+        for i in range(n)
+    ]
+    return PotholeStore.from_records(records)
+
+
+def measure(name, make_stream):
+    started = time.perf_counter()
+    size = sum(len(c if isinstance(c, bytes) else c.encode()) for c in make_stream())
+    elapsed = time.perf_counter() - started
+    print(f"{name:<12} {size / 1e6:>9.2f} MB {elapsed:>8.3f} s")
+    return size, elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    store = synthetic_store(n)
+    idx = np.arange(len(store))
+    print(f"{n} records\n{'format':<12} {'size':>12} {'encode':>10}")
+
+    measure("csv", lambda: iter_csv(iter_row_chunks(store, idx), store.fields))
+    measure("csv+gzip", lambda: gzip_stream(iter_csv(iter_row_chunks(store, idx), store.fields)))
+    if not columnar_export.available():
+        print("pyarrow not installed; skipping columnar formats")
+        return
+    for fmt in columnar_export.COLUMNAR_FORMATS:
+        measure(fmt, lambda: columnar_export.iter_columnar(fmt, store, idx))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,5 +2,45 @@ import os
 
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-S3_URL = "https://fly.storage.tigris.dev/"
-BUCKET_NAME = "pothole-images"
+S3_URL = os.getenv("S3_URL", "https://fly.storage.tigris.dev/")
+BUCKET_NAME = os.getenv("BUCKET_NAME", "pothole-images")
+
+# Sidecar ingestion: number of concurrent GETs (1 = sequential)
+S3_FETCH_WORKERS = int(os.getenv("S3_FETCH_WORKERS", "16"))
+# Lifetime of presigned image URLs handed to the dashboard. /api/potholes
+# ETags roll over every half lifetime and URLs are reused for at most half,
+# so a revalidated body never holds an expired URL
+PRESIGN_EXPIRES_S = max(2, int(os.getenv("PRESIGN_EXPIRES_S", "3600")))
+
+# Where parsed sidecars are kept between restarts ("" disables): memory://,
+# sqlite:///data/potholes.db, or the postgres:// URL Fly sets when the
+# potholes-db app is attached. And how often to resync it with the bucket.
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///data/potholes.db")
+REFRESH_INTERVAL_S = int(os.getenv("REFRESH_INTERVAL_S", "300"))
+# JSON snapshot from before the repository, imported once into an empty one
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "data/sidecar_snapshot.json")
+# observations within this many metres of a pothole entity's centroid join it
+CLUSTER_RADIUS_M = float(os.getenv("CLUSTER_RADIUS_M", "10"))
+
+# POST /api/ingest: devices push sidecar batches (needs DATABASE_URL) and must
+# send "Authorization: Bearer <token>". Without a token the endpoint refuses
+# every batch unless INGEST_ALLOW_ANONYMOUS=1 (local testing only)
+INGEST_TOKEN = os.getenv("INGEST_TOKEN", "")
+INGEST_ALLOW_ANONYMOUS = os.getenv("INGEST_ALLOW_ANONYMOUS", "0") == "1"
+INGEST_MAX_RECORDS = int(os.getenv("INGEST_MAX_RECORDS", "500"))
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(8 * 1024 * 1024)))   # inflated
+# a pushed sidecar still missing from the bucket this long after the push is dropped
+INGEST_GRACE_S = int(os.getenv("INGEST_GRACE_S", "3600"))
+
+# Prometheus text metrics at /metrics; off, instrumentation is a no-op
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+
+# flask_caching backend; e.g. CACHE_TYPE=RedisCache + CACHE_REDIS_URL to share
+# cached query results between workers
+CACHE_CONFIG = {
+    "CACHE_TYPE": os.getenv("CACHE_TYPE", "SimpleCache"),
+    "CACHE_DEFAULT_TIMEOUT": int(os.getenv("CACHE_DEFAULT_TIMEOUT", "300")),  # 5 minutes
+    "CACHE_KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "potholes:"),
+}
+if os.getenv("CACHE_REDIS_URL"):
+    CACHE_CONFIG["CACHE_REDIS_URL"] = os.getenv("CACHE_REDIS_URL")
@@ -1,30 +1,127 @@
-import os, glob, datetime, mimetypes
+import os, glob, time, datetime, mimetypes, hmac
 from werkzeug.utils import secure_filename
-from flask import Blueprint, request, jsonify, current_app, abort, send_file
+from flask import Blueprint, request, jsonify, current_app, abort, send_file, Response, stream_with_context
 from services.s3_service import S3Service
-from services.filter import filter_potholes
+from services.filter import PotholeQuery, filter_indices, paginate, add_distances
+from services.streaming import iter_row_chunks, iter_json_array, iter_ndjson
+from services.cache import request_etag, etag_matches, not_modified, cached_rows, bump_data_version
+from services.metrics import INGEST_RECORDS, SERIALIZE_SECONDS, timed_iter
+from services.clustering import view_store
+from services.ingest import IngestError, decode_body, batch_rows
+from services.data_loader import ingest_rows, remove_keys
+from config import PRESIGN_EXPIRES_S, INGEST_TOKEN, INGEST_ALLOW_ANONYMOUS, INGEST_MAX_BYTES, INGEST_MAX_RECORDS
 import kaggle_to_tigris
 
 
 
 bp = Blueprint('api', __name__, url_prefix = '/api')
+URL_EPOCH_S = max(1, PRESIGN_EXPIRES_S // 2)
+
 @bp.route('/potholes', methods=['GET'])
 def get_potholes():
+    """
+    Filtered potholes, streamed as a JSON array (or NDJSON with
+    format=ndjson / Accept: application/x-ndjson).
+    limit=N pages the id-ordered results; the X-Next-Cursor response
+    header carries the cursor= value for the next page.
+    view=entities returns one row per clustered pothole (with observation
+    count and first/last seen) instead of every raw observation.
+    """
     s3: S3Service = current_app.s3
-    data = current_app.pothole_data
-    results = filter_potholes(request.args, data)
+    try:
+        data = view_store(current_app, request.args.get('view'))
+        query = PotholeQuery.from_args(request.args)
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        if limit is not None and limit <= 0:
+            raise ValueError("limit must be positive")
+        if cursor and query.near is not None:
+            raise ValueError("cursor is not supported with near queries")
+    except ValueError as e:
+        current_app.logger.error(f"Error filtering potholes: {e}")
+        abort(400, "Invalid filter parameters")
+
+    ndjson = request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson'
+    # bodies embed presigned URLs reused for up to half their lifetime, so the
+    # ETag rolls over every other half: a 304'd body never outlives its URLs
+    url_epoch = int(time.time() // URL_EPOCH_S)
+    etag = request_etag(data, 'potholes', query, limit, cursor, ndjson, url_epoch)
+    if etag_matches(etag):
+        return not_modified(etag)
+
+    def page_rows():
+        idx = filter_indices(query, data)
+        if query.near is not None:
+            return idx[:limit], None
+        return paginate(data, idx, limit, cursor)
+
+    try:
+        page, next_cursor = cached_rows(f"rows:{etag}", page_rows)
+    except ValueError as e:
+        current_app.logger.error(f"Error filtering potholes: {e}")
+        abort(400, "Invalid filter parameters")
 
-    for p in results:
-        # your bucket has: <date-folder>/<base>.json  &  <base>_best.<ext>
-        if p.get('s3_prefix') and p.get('s3_base'):
-            prefix = f"{p['s3_prefix']}/{p['s3_base']}_best"
+    def decorate(rows, part):
+        add_distances(query, data, rows, part)
+        for p in rows:
+            # image keys are resolved at ingestion, so presigning is local
+            key = p.get('image_key')
             try:
-                # List objects in the bucket to find matching image files
-                p['image_url'] = current_app.s3.presign_image_get(prefix)
+                p['image_url'] = s3.presign_get(key) if key else None
             except Exception as e:
-                current_app.logger.warning(f"Couldn't find or presign image for {prefix}: {e}")
+                current_app.logger.warning(f"Couldn't presign image {key}: {e}")
                 p['image_url'] = None
-    return jsonify(results)
+
+    chunks = iter_row_chunks(data, page, decorate)
+    if ndjson:
+        body, mimetype = iter_ndjson(chunks), 'application/x-ndjson'
+    else:
+        body, mimetype = iter_json_array(chunks), 'application/json'
+
+    body = timed_iter(body, SERIALIZE_SECONDS, 'ndjson' if ndjson else 'json')
+    resp = Response(stream_with_context(body), mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    if next_cursor:
+        resp.headers['X-Next-Cursor'] = next_cursor
+    return resp
+
+@bp.route('/ingest', methods=['POST'])
+def ingest():
+    """
+    Batched sidecars pushed by a device, JSON and usually gzipped
+    (Content-Encoding: gzip): {"device_id": ..., "sidecars": [{"key":
+    "<date>/pothole_<ts>.json", "sidecar": {...}}, ...]}.
+    Idempotent on device_id + timestamp: resent sidecars count as
+    duplicates. New ones are served as soon as the response is sent.
+    Refused unless INGEST_TOKEN is set or anonymous ingest is opted into.
+    """
+    if INGEST_TOKEN:
+        sent = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(sent.encode(), f"Bearer {INGEST_TOKEN}".encode()):
+            abort(401)
+    elif not INGEST_ALLOW_ANONYMOUS:
+        abort(503, "Ingest needs INGEST_TOKEN (or INGEST_ALLOW_ANONYMOUS=1)")
+    if getattr(current_app, 'snapshot', None) is None:
+        abort(503, "Ingest needs a repository (DATABASE_URL)")
+    if request.content_length and request.content_length > INGEST_MAX_BYTES:
+        abort(413)
+    try:
+        payload = decode_body(request.get_data(), request.headers.get('Content-Encoding'), INGEST_MAX_BYTES)
+        rows, rejected = batch_rows(payload, INGEST_MAX_RECORDS)
+    except IngestError as e:
+        current_app.logger.warning(f"Rejected ingest batch: {e}")
+        return jsonify({'error': str(e)}), 400
+
+    result = ingest_rows(current_app, rows) if rows else {'accepted': 0, 'duplicates': 0}
+    result['rejected'] = rejected
+    for outcome, n in (('accepted', result['accepted']), ('duplicate', result['duplicates']), ('rejected', rejected)):
+        INGEST_RECORDS.inc(n, outcome)
+    current_app.logger.info(
+        f"Ingested {result['accepted']} sidecars from {payload['device_id']} "
+        f"({result['duplicates']} duplicates, {rejected} rejected)"
+    )
+    return jsonify(result), 200
 
 @bp.route('/delete_today_directory', methods=['DELETE'])
 def delete_today_directory():
@@ -33,6 +130,10 @@ def delete_today_directory():
     """
     today_prefix = datetime.date.today().isoformat()
     deleted = current_app.s3.delete_s3_directory(today_prefix)
+    if deleted:
+        # stop serving them now rather than at the next refresh
+        remove_keys(current_app, [d['Key'] for d in deleted if 'Key' in d])
+        bump_data_version()
     if not deleted:
         return jsonify({'message': f'No objects found under "{today_prefix}/"'}), 404
     return jsonify({'deleted': deleted}), 200
@@ -1,46 +1,70 @@
-import io, csv
 import services.filter
-from flask import Blueprint, request, jsonify, current_app, send_file, abort
+from services import columnar_export
+from services.spatial import haversine_m
+from services.streaming import iter_row_chunks, iter_csv, iter_geojson, gzip_stream
+from services.cache import request_etag, etag_matches, not_modified, cached_rows
+from services.metrics import SERIALIZE_SECONDS, timed_iter
+from services.clustering import view_store
+from flask import Blueprint, request, current_app, abort, Response, stream_with_context
 
 bp = Blueprint('export', __name__, url_prefix = "/api")
 
 @bp.route('/export', methods=['GET'])
 def export_data():
+    """
+    Stream the filtered potholes as CSV (default), GeoJSON, or one of the
+    columnar formats: arrow (IPC stream), parquet, geoparquet.
+    compress=gzip gzips the text formats on the fly (Content-Encoding: gzip).
+    view=entities exports clustered potholes instead of raw observations.
+    """
     fmt = request.args.get('format', 'csv')
+    compress = request.args.get('compress')
     try:
-        data = services.filter.filter_potholes(request.args, current_app.pothole_data)
+        store = view_store(current_app, request.args.get('view'))
+        query = services.filter.PotholeQuery.from_args(request.args)
     except Exception as e:
         current_app.logger.error(f"Error filtering potholes: {e}")
         abort(400, "Invalid filter parameters")
 
-    if fmt == 'geojson':
-        features = []
-        for p in data:
-            features.append({
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [p["lng"], p["lat"]],
-                },
-                "properties": {
-                    k: v for k, v in p.items() if k not in ("lat", "lng")
-                }
-            })
-        return jsonify({
-            "type": "FeatureCollection",
-            "features": features
-        })
+    etag = request_etag(store, 'export', query, fmt, compress)
+    if etag_matches(etag):
+        return not_modified(etag)
+    # the row set does not depend on the output format
+    idx, _ = cached_rows(
+        f"rows:{request_etag(store, 'export', query)}",
+        lambda: (services.filter.filter_indices(query, store), None),
+    )
+
+    if fmt in columnar_export.COLUMNAR_FORMATS:
+        if not columnar_export.available():
+            abort(501, f"{fmt} export needs pyarrow installed")
+        distances = haversine_m(*query.near, store.lat[idx], store.lng[idx]) if query.near is not None else None
+        mimetype, filename = columnar_export.COLUMNAR_FORMATS[fmt]
+        resp = Response(
+            stream_with_context(timed_iter(columnar_export.iter_columnar(fmt, store, idx, distances), SERIALIZE_SECONDS, fmt)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'},
+        )
+        resp.set_etag(etag)
+        return resp
 
-    si = io.StringIO()
-    fieldnames = list(data[0].keys() )if data else []
-    writer = csv.DictWriter(si, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(data)
+    def decorate(rows, part):
+        services.filter.add_distances(query, store, rows, part)
+
+    chunks = iter_row_chunks(store, idx, decorate)
+    headers = {}
+    if fmt == 'geojson':
+        body, mimetype = iter_geojson(chunks), 'application/json'
+    else:
+        fieldnames = store.fields + (['distance_m'] if query.near is not None else [])
+        body, mimetype = iter_csv(chunks, fieldnames), 'text/csv'
+        headers['Content-Disposition'] = 'attachment; filename=potholes.csv'
 
-    output = io.BytesIO(si.getvalue().encode())
-    return send_file(
-        output,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='potholes.csv'
-    )
\ No newline at end of file
+    if compress == 'gzip':
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    body = timed_iter(body, SERIALIZE_SECONDS, fmt if fmt == 'geojson' else 'csv')
+    resp = Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+    resp.set_etag(etag)
+    return resp
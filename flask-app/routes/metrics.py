@@ -0,0 +1,13 @@
+from flask import Blueprint, Response
+
+from services.metrics import REGISTRY
+
+# registered by create_app only when METRICS_ENABLED=1
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Every counter and histogram in Prometheus text exposition format
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
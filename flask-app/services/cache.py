@@ -0,0 +1,76 @@
+import hashlib
+import logging
+from typing import Callable, Tuple
+
+import numpy as np
+from flask import Response, request
+from flask_caching import Cache
+
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# shared by the app and the routes; the backend comes from app.config
+# (CACHE_TYPE / CACHE_REDIS_URL ...), so several workers can share one
+cache = Cache()
+
+DATA_VERSION_KEY = "potholes:data_version"
+MAX_CACHED_ROWS = 100_000     # larger result sets are recomputed rather than cached
+
+
+def data_version() -> int:
+    return cache.get(DATA_VERSION_KEY) or 0
+
+
+def bump_data_version() -> int:
+    """
+    Invalidate every cached query result and ETag; call after the
+    dataset changes. The version itself never expires.
+    """
+    version = data_version() + 1
+    cache.set(DATA_VERSION_KEY, version, timeout=0)
+    logger.info(f"Dataset version is now {version}")
+    return version
+
+
+def request_etag(store, *parts) -> str:
+    """
+    Strong ETag for a normalised request against store under the current
+    dataset version. Also used as the cache key for the request's rows.
+    """
+    raw = repr((data_version(), store.fingerprint) + parts).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def etag_matches(etag: str) -> bool:
+    """
+    Whether the client's If-None-Match already has etag
+    """
+    if not request.if_none_match:
+        return False
+    hit = request.if_none_match.contains(etag)
+    CACHE_LOOKUPS.inc(1, "etag", "hit" if hit else "miss")
+    return hit
+
+
+def not_modified(etag: str) -> Response:
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+def cached_rows(key: str, compute: Callable[[], Tuple[np.ndarray, object]]) -> Tuple[np.ndarray, object]:
+    """
+    (row indices, extra) for key, computing and caching them on a miss.
+    Indices are stored as int32 so cached entries stay small.
+    """
+    hit = cache.get(key)
+    if hit is not None:
+        CACHE_LOOKUPS.inc(1, "rows", "hit")
+        return hit
+    CACHE_LOOKUPS.inc(1, "rows", "miss")
+    idx, extra = compute()
+    if len(idx) <= MAX_CACHED_ROWS:
+        cache.set(key, (idx.astype(np.int32), extra))
+    return idx, extra
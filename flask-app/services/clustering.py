@@ -0,0 +1,207 @@
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .spatial import M_PER_DEG_LAT, haversine_m, radius_bbox
+from .store import PotholeStore, source_key
+
+DEFAULT_RADIUS_M = 10.0
+VIEWS = ("observations", "entities")
+
+# record fields the entity computes itself; everything else (description,
+# image/video keys, ...) is taken from its best observation
+_ENTITY_FIELDS = ("id", "lat", "lng", "severity", "confidence", "date")
+
+
+class Entity:
+    """
+    One physical pothole: a running centroid over its observations
+    """
+    __slots__ = ("id", "lat", "lng", "count", "first_seen", "last_seen", "severity", "confidence", "best", "cell")
+
+    def __init__(self, obs: dict):
+        self.id = obs["id"]             # id of the first observation; stable
+        self.lat = obs["lat"]
+        self.lng = obs["lng"]
+        self.count = 0
+        self.first_seen = self.last_seen = obs["date"]
+        self.severity = None
+        self.confidence = None
+        self.best = obs
+        self.cell = None
+        self.add(obs)
+
+    def add(self, obs: dict):
+        self.count += 1
+        if self.count > 1:
+            self.lat += (obs["lat"] - self.lat) / self.count
+            self.lng += (obs["lng"] - self.lng) / self.count
+        self.first_seen = min(self.first_seen, obs["date"])
+        self.last_seen = max(self.last_seen, obs["date"])
+        if obs.get("severity") is not None:
+            self.severity = max(self.severity or 0, obs["severity"])
+        if obs.get("confidence") is not None:
+            self.confidence = max(self.confidence or 0.0, obs["confidence"])
+        if _best_rank(obs) > _best_rank(self.best):
+            self.best = obs
+
+    def to_record(self) -> dict:
+        record = {
+            "id": self.id,
+            "lat": round(self.lat, 7),
+            "lng": round(self.lng, 7),
+            "severity": self.severity,
+            "confidence": self.confidence,
+            "date": self.last_seen,
+            "observations": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+        for k, v in self.best.items():
+            if k not in _ENTITY_FIELDS:
+                record.setdefault(k, v)
+        return record
+
+
+def _best_rank(obs: dict) -> Tuple:
+    # an observation with an image beats one without, then confidence, then recency
+    conf = obs.get("confidence")
+    return (obs.get("image_key") is not None, -1.0 if conf is None else conf, obs["id"])
+
+
+class PotholeClusterer:
+    """
+    Incremental leader clustering of observations into pothole entities.
+
+    Each observation joins the nearest entity whose centroid is within
+    radius_m, or starts a new one. Entities sit in a dict grid of
+    lat/lng cells radius_m tall, so an observation only compares against
+    the cells its radius_bbox overlaps and adding a batch never touches
+    the rest of the data set. Observations are told apart by source_key,
+    so two with the same timestamp are both clustered; an entity's id is
+    its first observation's id, bumped past any id already taken. Observations
+    should arrive in id order for stable entity ids; media changes can be
+    patched in with update(), anything else that removes or rewrites
+    observations needs a rebuild.
+    """
+    def __init__(self, radius_m: float = DEFAULT_RADIUS_M):
+        self.radius_m = radius_m
+        self.cell_deg = radius_m / M_PER_DEG_LAT
+        self.entities: Dict[int, Entity] = {}
+        self.assignments: Dict[object, int] = {}     # observation source_key -> entity id
+        self._grid: Dict[Tuple[int, int], List[Entity]] = {}
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor((lat + 90.0) / self.cell_deg), math.floor((lng + 180.0) / self.cell_deg)
+
+    def _candidates(self, lat: float, lng: float) -> List[Entity]:
+        """
+        Entities in every cell overlapping the radius_m box around (lat, lng)
+        """
+        min_lng, min_lat, max_lng, max_lat = radius_bbox(lat, lng, self.radius_m)
+        (r0, c0), (r1, c1) = self._cell(min_lat, min_lng), self._cell(max_lat, max_lng)
+        rows = range(r0, r1 + 1)
+        if min_lng <= max_lng:
+            cols = range(c0, c1 + 1)
+        else:   # wraps across the antimeridian
+            cols = [*range(c0, self._cell(0.0, 180.0)[1] + 1), *range(0, c1 + 1)]
+        if len(rows) * len(cols) > len(self._grid):
+            # near a pole the box spans every longitude; walk the occupied cells instead
+            cols = set(cols)
+            return [e for (r, c), bucket in self._grid.items() if r in rows and c in cols for e in bucket]
+        candidates = []
+        for r in rows:
+            for c in cols:
+                candidates.extend(self._grid.get((r, c), ()))
+        return candidates
+
+    def _nearest(self, lat: float, lng: float) -> Optional[Entity]:
+        candidates = self._candidates(lat, lng)
+        if not candidates:
+            return None
+        d = haversine_m(
+            lat, lng,
+            np.fromiter((e.lat for e in candidates), dtype=np.float64, count=len(candidates)),
+            np.fromiter((e.lng for e in candidates), dtype=np.float64, count=len(candidates)),
+        )
+        i = int(np.argmin(d))
+        return candidates[i] if d[i] <= self.radius_m else None
+
+    def _place(self, entity: Entity):
+        cell = self._cell(entity.lat, entity.lng)
+        if cell == entity.cell:
+            return
+        if entity.cell is not None:
+            bucket = self._grid[entity.cell]
+            bucket.remove(entity)
+            if not bucket:
+                del self._grid[entity.cell]
+        self._grid.setdefault(cell, []).append(entity)
+        entity.cell = cell
+
+    def add(self, records: Iterable[dict]) -> List[int]:
+        """
+        Cluster new observations; returns the ids of entities created or changed
+        """
+        touched = {}
+        for obs in sorted(records, key=lambda p: p["id"]):
+            key = source_key(obs)
+            if key in self.assignments:
+                continue
+            entity = self._nearest(obs["lat"], obs["lng"])
+            if entity is None:
+                entity = Entity(obs)
+                while entity.id in self.entities:
+                    entity.id += 1
+                self.entities[entity.id] = entity
+            else:
+                entity.add(obs)
+            self._place(entity)
+            self.assignments[key] = entity.id
+            touched[entity.id] = None
+        return list(touched)
+
+    def update(self, records: Iterable[dict]) -> List[int]:
+        """
+        Observations already clustered whose media (image/video keys)
+        changed: each may become, or stop being, its entity's best
+        observation. Returns the ids of entities changed.
+        """
+        touched = {}
+        for obs in records:
+            key = source_key(obs)
+            entity = self.entities.get(self.assignments.get(key))
+            if entity is None:
+                continue
+            if source_key(entity.best) == key or _best_rank(obs) > _best_rank(entity.best):
+                entity.best = obs
+                touched[entity.id] = None
+        return list(touched)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def records(self) -> List[dict]:
+        return [e.to_record() for e in self.entities.values()]
+
+    def store(self) -> PotholeStore:
+        return PotholeStore.from_records(self.records())
+
+    @classmethod
+    def from_store(cls, store: PotholeStore, radius_m: float = DEFAULT_RADIUS_M) -> "PotholeClusterer":
+        clusterer = cls(radius_m)
+        clusterer.add(store.to_records(np.arange(len(store))))
+        return clusterer
+
+
+def view_store(app, view: Optional[str]) -> PotholeStore:
+    """
+    The store a request reads: raw observations (default) or entities.
+    Raises ValueError for an unknown view.
+    """
+    if view in (None, "", "observations"):
+        return app.pothole_data
+    if view == "entities":
+        return app.entity_data
+    raise ValueError(f"view must be one of {VIEWS}")
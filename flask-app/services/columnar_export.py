@@ -0,0 +1,161 @@
+import json
+from typing import Iterator, Optional
+
+import numpy as np
+
+from .store import MISSING_SEVERITY, NUMERIC_COLUMNS, PotholeStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only the binary export formats need it
+    pa = pq = None
+
+BATCH_ROWS = 65_536
+
+# format -> (mimetype, download name)
+COLUMNAR_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "potholes.arrows"),
+    "parquet": ("application/vnd.apache.parquet", "potholes.parquet"),
+    "geoparquet": ("application/vnd.apache.parquet", "potholes.geoparquet"),
+}
+
+# little-endian WKB Point: byte order, geometry type, x, y (21 bytes, no padding)
+_WKB_POINT = np.dtype([("order", "u1"), ("type", "<u4"), ("x", "<f8"), ("y", "<f8")])
+
+
+def available() -> bool:
+    return pa is not None
+
+
+class _ChunkSink:
+    """
+    Write-only file object that hands back whatever was written since the
+    last drain(), so writers can be streamed batch by batch
+    """
+    def __init__(self):
+        self.parts = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self.parts)
+        self.parts.clear()
+        return out
+
+
+def _strings(col, idx: np.ndarray):
+    # re-index against only the values these rows use, so a small export
+    # doesn't carry the whole store's dictionary
+    used, codes = np.unique(col.codes[idx], return_inverse=True)
+    values = [col.values[c] for c in used.tolist()]
+    null_codes = [i for i, v in enumerate(values) if v is None]
+    mask = np.isin(codes, null_codes) if null_codes else None
+    dictionary = pa.array(["" if v is None else v for v in values], type=pa.string())
+    return pa.DictionaryArray.from_arrays(codes.astype(np.int32), dictionary, mask=mask)
+
+
+def _wkb_points(lng: np.ndarray, lat: np.ndarray):
+    n = len(lng)
+    points = np.empty(n, dtype=_WKB_POINT)
+    points["order"] = 1
+    points["type"] = 1
+    points["x"] = lng
+    points["y"] = lat
+    offsets = np.arange(0, (n + 1) * _WKB_POINT.itemsize, _WKB_POINT.itemsize, dtype=np.int32)
+    return pa.Array.from_buffers(pa.binary(), n, [None, pa.py_buffer(offsets), pa.py_buffer(points.tobytes())])
+
+
+def record_batch(store: PotholeStore, idx: np.ndarray, distances: Optional[np.ndarray] = None, geometry: bool = False):
+    """
+    Rows idx as an Arrow RecordBatch built column-wise from the store's
+    arrays; strings stay dictionary-encoded, dates become date32
+    """
+    arrays, names = [], []
+    for k in store.fields:
+        if k == "date":
+            arr = pa.array(store.day[idx], type=pa.date32())
+        elif k == "severity":
+            sev = store.severity[idx]
+            arr = pa.array(sev, mask=sev == MISSING_SEVERITY)
+        elif k == "confidence":
+            arr = pa.array(store.confidence[idx], from_pandas=True)   # NaN -> null
+        elif k in NUMERIC_COLUMNS:
+            arr = pa.array(store.columns[k][idx])
+        else:
+            arr = _strings(store.strings[k], idx)
+        arrays.append(arr)
+        names.append(k)
+    if distances is not None:
+        arrays.append(pa.array(np.round(distances, 1)))
+        names.append("distance_m")
+    if geometry:
+        arrays.append(_wkb_points(store.lng[idx], store.lat[idx]))
+        names.append("geometry")
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def _geo_metadata(store: PotholeStore, idx: np.ndarray) -> bytes:
+    meta = {
+        "version": "1.0.0",
+        "primary_column": "geometry",
+        "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Point"]}},
+    }
+    if len(idx):
+        lng, lat = store.lng[idx], store.lat[idx]
+        meta["columns"]["geometry"]["bbox"] = [float(lng.min()), float(lat.min()), float(lng.max()), float(lat.max())]
+    return json.dumps(meta).encode()
+
+
+def iter_columnar(fmt: str, store: PotholeStore, idx: np.ndarray, distances: Optional[np.ndarray] = None) -> Iterator[bytes]:
+    """
+    Stream rows idx as an Arrow IPC stream, Parquet or GeoParquet file,
+    one record batch / row group at a time
+    """
+    geometry = fmt == "geoparquet"
+    sink = _ChunkSink()
+
+    def batches():
+        for start in range(0, max(len(idx), 1), BATCH_ROWS):
+            part = idx[start:start + BATCH_ROWS]
+            dist = None if distances is None else distances[start:start + BATCH_ROWS]
+            yield record_batch(store, part, dist, geometry)
+
+    first = None
+    for batch in batches():
+        if first is None:
+            first = batch
+            schema = batch.schema
+            if geometry:
+                schema = schema.with_metadata({b"geo": _geo_metadata(store, idx)})
+            if fmt == "arrow":
+                writer = pa.ipc.new_stream(sink, schema)
+            else:
+                writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        if fmt == "arrow":
+            writer.write_batch(batch)
+        else:
+            writer.write_table(pa.Table.from_batches([batch], schema=schema))
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
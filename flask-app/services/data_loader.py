@@ -1,24 +1,190 @@
-from typing import List
-from .s3_service import S3Service
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from .s3_service import ASSET_FIELDS, S3Service
+from .repository import Row
+from .snapshot import SidecarSnapshot
+from .store import PotholeStore, source_key
+from .clustering import PotholeClusterer
+from .cache import bump_data_version
 from .dummy_gen import generate_dummy_potholes
 from flask import Flask
 
 
 
-def load_pothole_data(app: Flask, n_dummy: int =100)->List[dict]:
+def load_pothole_data(app: Flask, n_dummy: int =100, sync: bool = True)->PotholeStore:
     """
     Attempt to load real pothole sidecar data from S3 via app.s3.
-    If that fails—or returns an empty list—fall back to dummy data.
+    With a snapshot configured only new/changed sidecars are downloaded,
+    and with sync=False the repository is served as it is (the refresher
+    catches up in the background), so boot time doesn't grow with the
+    bucket. If that fails—or returns an empty list—fall back to the
+    repository as it is, then to dummy data.
     """
     s3: S3Service = app.s3
+    snapshot: Optional[SidecarSnapshot] = getattr(app, 'snapshot', None)
+    if snapshot is not None and not sync:
+        data = snapshot.records()
+        if data:
+            app.logger.info(f"Serving {len(data)} records from the repository; syncing in the background")
+            return PotholeStore.from_records(data)
     try:
-        data =  s3.fetch_pothole_data()
+        if snapshot is not None:
+            snapshot.sync(s3)
+            data = snapshot.records()
+        else:
+            data = s3.fetch_pothole_data()
         app.logger.info(f"Loaded {len(data)} records from S3 bucket")
         if not data:
             raise RuntimeError("No JSON sidecars found in the bucket")
     except Exception as e:
         app.logger.error(f"Error fetching from S3: {e}")
-        data = generate_dummy_potholes(n_dummy)
-        app.logger.info("Falling back to dummy data")
+        data = snapshot.records() if snapshot is not None else []
+        if data:
+            app.logger.info(f"Serving {len(data)} records from the repository")
+        else:
+            data = generate_dummy_potholes(n_dummy)
+            app.logger.info("Falling back to dummy data")
+
+    return PotholeStore.from_records(data)
+
+
+def refreshed_store(store: PotholeStore, snapshot: SidecarSnapshot, stats: dict) -> PotholeStore:
+    """
+    Store reflecting a snapshot sync. Pure additions of newer potholes are
+    appended (extending the spatial index in place); anything else rebuilds.
+    """
+    if stats["updated"] or stats["removed_keys"] or len(store) != len(snapshot) - stats["added"]:
+        return PotholeStore.from_records(snapshot.records())
+    if not stats["upserted_records"]:
+        return store
+    try:
+        return store.append(stats["upserted_records"])
+    except ValueError:
+        return PotholeStore.from_records(snapshot.records())
+
+
+def load_entities(app: Flask, radius_m: float):
+    """
+    Cluster app.pothole_data into app.clusters / app.entity_data
+    """
+    app.clusters = PotholeClusterer.from_store(app.pothole_data, radius_m)
+    app.entity_data = app.clusters.store()
+    app.logger.info(f"Clustered {len(app.pothole_data)} observations into {len(app.clusters)} potholes")
+
+
+def refreshed_entities(app: Flask, store: PotholeStore, stats: dict) -> PotholeClusterer:
+    """
+    Clusterer for a refreshed store: new observations join the existing
+    clusters; removals or rewrites recluster from scratch
+    """
+    clusters: PotholeClusterer = app.clusters
+    if stats["updated"] or stats["removed_keys"]:
+        return PotholeClusterer.from_store(store, clusters.radius_m)
+    clusters.add(stats["upserted_records"])
+    return clusters
+
+
+# the refresher and ingest both read-modify-write app.pothole_data/app.clusters
+_swap_lock = threading.Lock()
+
+
+def _swap(app: Flask, stats: dict):
+    store = refreshed_store(app.pothole_data, app.snapshot, stats)
+    clusters = refreshed_entities(app, store, stats)
+    if stats.get("media_records"):
+        try:
+            store = store.patch(stats["media_records"], ASSET_FIELDS)
+        except KeyError:
+            store = PotholeStore.from_records(app.snapshot.records())
+        clusters.update(stats["media_records"])
+    entity_data = clusters.store()
+    app.pothole_data, app.clusters, app.entity_data = store, clusters, entity_data
+
+
+def ingest_rows(app: Flask, rows: List[Row]) -> dict:
+    """
+    Store rows pushed by a device and add them to the served data straight
+    away. Keys already in the repository are skipped, so a resent batch
+    changes nothing (and leaves the dataset version alone).
+    """
+    with _swap_lock:
+        known = app.snapshot.repo.get_many([key for key, _, _, _ in rows])
+        new = [row for row in rows if row[0] not in known]
+        app.snapshot.repo.upsert(new)
+        stats = {
+            "added": len(new),
+            "updated": 0,
+            "upserted_keys": [key for key, _, _, _ in new],
+            "upserted_records": [record for _, _, _, record in new],
+            "removed_keys": [],
+        }
+        if new:
+            _swap(app, stats)
+    if new:
+        bump_data_version()
+    return {"accepted": len(new), "duplicates": len(rows) - len(new)}
+
+
+def remove_keys(app: Flask, keys: List[str]) -> int:
+    """
+    Drop sidecars deleted from the bucket from the repository and the
+    served data straight away, rather than at the next refresh. Returns
+    how many records went.
+    """
+    keys = [key for key in keys if key.lower().endswith('.json')]
+    if not keys:
+        return 0
+    with _swap_lock:
+        snapshot: Optional[SidecarSnapshot] = getattr(app, 'snapshot', None)
+        if snapshot is not None:
+            removed = snapshot.repo.delete(keys)
+            if removed:
+                _swap(app, {
+                    "added": 0,
+                    "updated": 0,
+                    "upserted_keys": [],
+                    "upserted_records": [],
+                    "removed_keys": keys,
+                })
+            return removed
+        # no repository: filter what is being served
+        gone = {key[:-len('.json')] for key in keys}
+        records = app.pothole_data.to_records(np.arange(len(app.pothole_data)))
+        kept = [record for record in records if source_key(record) not in gone]
+        if len(kept) < len(records):
+            app.pothole_data = PotholeStore.from_records(kept)
+            app.clusters = PotholeClusterer.from_store(app.pothole_data, app.clusters.radius_m)
+            app.entity_data = app.clusters.store()
+        return len(records) - len(kept)
+
+
+def start_refresher(app: Flask, interval_s: int, sync_now: bool = False) -> threading.Thread:
+    """
+    Periodically resync the snapshot and swap in a fresh app.pothole_data
+    (and the entities clustered from it). Requests keep reading the old
+    stores until the new ones are assigned. sync_now runs the first sync
+    straight away (after a boot that skipped it).
+    """
+    def run():
+        delay = 0 if sync_now else interval_s
+        while True:
+            time.sleep(delay)
+            delay = interval_s
+            try:
+                stats = app.snapshot.sync(app.s3)
+                if not (stats["upserted_keys"] or stats["media_keys"] or stats["removed_keys"]):
+                    continue
+                with _swap_lock:
+                    _swap(app, stats)
+                with app.app_context():
+                    bump_data_version()
+                app.logger.info(f"Refreshed pothole data: {len(app.pothole_data)} records, {len(app.clusters)} potholes")
+            except Exception as e:
+                app.logger.error(f"Background refresh failed: {e}")
 
-    return data
\ No newline at end of file
+    thread = threading.Thread(target=run, name="pothole-refresher", daemon=True)
+    thread.start()
+    return thread
@@ -1,20 +1,192 @@
+import math
+from dataclasses import dataclass
+from typing import Optional, Tuple
 
-    # --- Helper to filter potholes based on query args ---
-def filter_potholes(args, data):
-    sev_list = args.getlist('severity', type=int)
-    start = args.get('start_date')
-    end = args.get('end_date')
-    conf_min = args.get('conf_min', type=float, default=0.0)
-
-    results = []
-    for p in data:
-        if sev_list and p['severity'] not in sev_list:
-            continue
-        if start and p['date'] < start:
-            continue
-        if end and p['date'] > end:
-            continue
-        if (p.get('confidence') or 0) < conf_min:
-            continue
-        results.append(p)
-    return results
+import numpy as np
+
+from .store import PotholeStore, to_day
+from .spatial import M_PER_DEG_LAT, haversine_m, radius_bbox
+from .metrics import FILTER_SECONDS, timed
+
+MAX_SEARCH_RADIUS_M = 2.1e7      # half the earth's circumference, covers everything
+
+
+def _floats(raw: str, n: int, name: str) -> Tuple[float, ...]:
+    parts = [float(v) for v in raw.split(',')]
+    if len(parts) != n:
+        raise ValueError(f"{name} needs {n} comma-separated numbers")
+    if not all(map(math.isfinite, parts)):
+        raise ValueError(f"{name} must be finite")
+    return tuple(parts)
+
+
+@dataclass(frozen=True)
+class PotholeQuery:
+    """
+    Parsed /api/potholes and /api/export filter parameters.
+
+    bbox is min_lng,min_lat,max_lng,max_lat (Leaflet's toBBoxString order);
+    near is lat,lng and needs radius_m and/or k. Near queries come back
+    ordered by distance, everything else in id order.
+    """
+    severities: Tuple[int, ...] = ()
+    start_day: Optional[int] = None
+    end_day: Optional[int] = None
+    conf_min: float = 0.0
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    near: Optional[Tuple[float, float]] = None
+    radius_m: Optional[float] = None
+    k: Optional[int] = None
+
+    @classmethod
+    def from_args(cls, args) -> "PotholeQuery":
+        """
+        Raises ValueError on malformed parameters
+        """
+        start = args.get('start_date')
+        end = args.get('end_date')
+        bbox = args.get('bbox')
+        near = args.get('near')
+        radius_m = args.get('radius_m', type=float)
+        k = args.get('k', type=int)
+
+        if near and radius_m is None and k is None:
+            raise ValueError("near needs radius_m or k")
+        if (radius_m is not None or k is not None) and not near:
+            raise ValueError("radius_m and k need near=lat,lng")
+        if radius_m is not None and not (math.isfinite(radius_m) and radius_m > 0):
+            raise ValueError("radius_m must be a positive number")
+        conf_min = args.get('conf_min', type=float, default=0.0)
+        if not math.isfinite(conf_min):
+            raise ValueError("conf_min must be finite")
+        if k is not None and k <= 0:
+            raise ValueError("k must be positive")
+
+        return cls(
+            severities=tuple(sorted(set(args.getlist('severity', type=int)))),
+            start_day=to_day(start) if start else None,
+            end_day=to_day(end) if end else None,
+            conf_min=conf_min,
+            bbox=_floats(bbox, 4, "bbox") if bbox else None,
+            near=_floats(near, 2, "near") if near else None,
+            # past half the globe every point is already inside
+            radius_m=min(radius_m, MAX_SEARCH_RADIUS_M) if radius_m is not None else None,
+            k=k,
+        )
+
+
+# --- Helpers to filter potholes based on query args ---
+def _attribute_mask(query: PotholeQuery, store: PotholeStore, idx: Optional[np.ndarray]) -> np.ndarray:
+    def col(a):
+        return a if idx is None else a[idx]
+
+    mask = np.ones(len(store) if idx is None else len(idx), dtype=bool)
+    if query.severities:
+        mask &= np.isin(col(store.severity), query.severities)
+    if query.start_day is not None:
+        mask &= col(store.day) >= query.start_day
+    if query.end_day is not None:
+        mask &= col(store.day) <= query.end_day
+    if query.conf_min > 0:
+        # missing confidence is NaN and never passes, same as treating it as 0
+        mask &= col(store.confidence) >= query.conf_min
+    if query.bbox is not None:
+        min_lng, min_lat, max_lng, max_lat = query.bbox
+        lat, lng = col(store.lat), col(store.lng)
+        mask &= (lat >= min_lat) & (lat <= max_lat)
+        if min_lng <= max_lng:
+            mask &= (lng >= min_lng) & (lng <= max_lng)
+        else:
+            mask &= (lng >= min_lng) | (lng <= max_lng)
+    return mask
+
+
+def _candidates(query: PotholeQuery, store: PotholeStore, bbox) -> np.ndarray:
+    """
+    Rows inside bbox (plus query.bbox, if any) that pass the attribute filters
+    """
+    idx = store.index.bbox_candidates(*bbox)
+    return idx[_attribute_mask(query, store, idx)]
+
+
+def _nearest(query: PotholeQuery, store: PotholeStore) -> np.ndarray:
+    lat, lng = query.near
+    limit = query.radius_m or MAX_SEARCH_RADIUS_M
+    k = query.k or len(store)
+    # plain radius queries need exactly one pass; k-nearest grows outwards
+    r = limit if query.k is None else min(limit, store.index.cell_deg * M_PER_DEG_LAT)
+    while True:
+        idx = _candidates(query, store, radius_bbox(lat, lng, r))
+        dist = haversine_m(lat, lng, store.lat[idx], store.lng[idx])
+        inside = dist <= r
+        # every point within r is in the box, so once k of them are found
+        # they are guaranteed to include the k nearest
+        if int(inside.sum()) >= k or r >= limit:
+            idx, dist = idx[inside], dist[inside]
+            order = np.argsort(dist, kind="stable")[:k]
+            return idx[order]
+        r = min(limit, r * 4)
+
+
+@timed(FILTER_SECONDS)
+def filter_indices(query: PotholeQuery, store: PotholeStore) -> np.ndarray:
+    """
+    Row indices matching query: id order, or distance order for near queries.
+    Spatial predicates go through the grid index so only nearby rows are
+    looked at; the rest is a vectorised mask over the columns.
+    """
+    if not len(store):
+        return np.empty(0, dtype=np.intp)
+    if query.near is not None:
+        return _nearest(query, store)
+    if query.bbox is not None:
+        return _candidates(query, store, query.bbox)
+    return np.flatnonzero(_attribute_mask(query, store, None))
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    '<id>.<n>': resume after the first n rows that have this id
+    """
+    cid, _, skip = cursor.partition('.')
+    cid, skip = int(cid), int(skip or 0)
+    if skip < 0:
+        raise ValueError("bad cursor")
+    return cid, skip
+
+
+def paginate(store: PotholeStore, idx: np.ndarray, limit: Optional[int], cursor: Optional[str]):
+    """
+    Slice id-ordered rows idx to one page. Returns (page, next_cursor);
+    next_cursor is None on the last page. Cursors are (id, offset within
+    that id) so they stay valid when rows are added between requests.
+    """
+    start = 0
+    ids = store.id[idx]
+    if cursor:
+        cid, skip = parse_cursor(cursor)
+        run_start = int(np.searchsorted(ids, cid, side='left'))
+        run_end = int(np.searchsorted(ids, cid, side='right'))
+        start = min(run_start + skip, run_end)
+    if limit is None or start + limit >= len(idx):
+        return idx[start:], None
+
+    end = start + limit
+    last = ids[end - 1]
+    seen_of_last = end - int(np.searchsorted(ids, last, side='left'))
+    return idx[start:end], f"{int(last)}.{seen_of_last}"
+
+
+def add_distances(query: PotholeQuery, store: PotholeStore, records, idx: np.ndarray):
+    if query.near is not None:
+        lat, lng = query.near
+        for p, d in zip(records, haversine_m(lat, lng, store.lat[idx], store.lng[idx]).tolist()):
+            p['distance_m'] = round(d, 1)
+
+
+def filter_potholes(args, data: PotholeStore):
+    query = args if isinstance(args, PotholeQuery) else PotholeQuery.from_args(args)
+    idx = filter_indices(query, data)
+    records = data.to_records(idx)
+    add_distances(query, data, records, idx)
+    return records
@@ -0,0 +1,110 @@
+import datetime
+import json
+import logging
+import math
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from .repository import Row
+from .s3_service import S3Service, attach_assets
+
+logger = logging.getLogger(__name__)
+
+# sidecar timestamps accepted: 2000-01-01 up to a day ahead of the server clock
+MIN_TIMESTAMP = 946684800
+MAX_CLOCK_SKEW_S = 86400
+
+
+class IngestError(ValueError):
+    """
+    A batch that can never be accepted as sent (the client should drop it)
+    """
+
+
+def decode_body(body: bytes, content_encoding: Optional[str], max_bytes: int) -> Dict:
+    """
+    Parse a (possibly gzip-compressed) JSON batch, refusing anything that
+    inflates beyond max_bytes
+    """
+    if content_encoding == "gzip":
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = inflater.decompress(body, max_bytes)
+        except zlib.error as e:
+            raise IngestError(f"bad gzip body: {e}")
+        if inflater.unconsumed_tail:
+            raise IngestError(f"batch inflates beyond {max_bytes} bytes")
+    elif content_encoding not in (None, "", "identity"):
+        raise IngestError(f"unsupported Content-Encoding {content_encoding}")
+    if len(body) > max_bytes:
+        raise IngestError(f"batch is larger than {max_bytes} bytes")
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise IngestError(f"batch is not JSON: {e}")
+    if not isinstance(payload, dict) or not isinstance(payload.get("sidecars"), list):
+        raise IngestError("batch must be an object with a sidecars list")
+    return payload
+
+
+def _finite(value, lo: float, hi: float) -> bool:
+    return (
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        and math.isfinite(value) and lo <= value <= hi
+    )
+
+
+def valid_sidecar(sidecar: Dict) -> bool:
+    """
+    Whether timestamp and gps are finite numbers in range, so the record
+    can be dated and indexed
+    """
+    gps = sidecar.get("gps")
+    if not isinstance(gps, dict):
+        return False
+    return (
+        _finite(sidecar.get("timestamp"), MIN_TIMESTAMP, time.time() + MAX_CLOCK_SKEW_S)
+        and _finite(gps.get("lat"), -90.0, 90.0)
+        and _finite(gps.get("lon"), -180.0, 180.0)
+    )
+
+
+def batch_rows(payload: Dict, max_records: int) -> Tuple[List[Row], int]:
+    """
+    Repository rows for a batch {"device_id": ..., "sidecars": [{"key":
+    ..., "sidecar": {...}}]}, plus the number of sidecars rejected for
+    missing or out-of-range timestamp/geodata (see valid_sidecar).
+    key is the S3 key the device uploads the sidecar to
+    ({date}/pothole_{timestamp}.json), so the row is the one a later
+    bucket sync finds; without it the key is {device_id}/pothole_{timestamp}.json.
+    Either way a resent (device_id, timestamp) maps to the same row.
+    Rows carry no ETag, since they did not come from a listing, and the
+    push time as their LastModified: a sync drops them once they are
+    older than its grace period and still not in the bucket.
+    """
+    device_id = payload.get("device_id")
+    if not isinstance(device_id, str) or not device_id:
+        raise IngestError("device_id is required")
+    items = payload["sidecars"]
+    if len(items) > max_records:
+        raise IngestError(f"at most {max_records} sidecars per batch")
+
+    rows: Dict[str, Row] = {}
+    rejected = 0
+    pushed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    for item in items:
+        sidecar = item.get("sidecar") if isinstance(item, dict) else None
+        if not isinstance(sidecar, dict):
+            raise IngestError("each item needs a sidecar object")
+        key = item.get("key") or f"{device_id}/pothole_{sidecar.get('timestamp')}.json"
+        if not isinstance(key, str) or not key.endswith(".json"):
+            raise IngestError(f"bad sidecar key {key!r}")
+        record = S3Service.sidecar_to_record(key, sidecar) if valid_sidecar(sidecar) else None
+        if record is None:
+            rejected += 1
+            continue
+        record["device_id"] = device_id
+        # media is uploaded after the sidecar; the next sync attaches it
+        rows[key] = (key, None, pushed_at, attach_assets(record, {}))
+    return list(rows.values()), rejected
@@ -0,0 +1,143 @@
+import functools
+import inspect
+import time
+from typing import Iterable, Iterator, Tuple
+
+from config import METRICS_ENABLED
+
+from .promtext import Metric, Registry
+
+# seconds; covers a cached 304 up to a full-table export
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = Registry(METRICS_ENABLED, DEFAULT_BUCKETS)
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "Request latency by route, including streamed bodies", ("route", "method", "status"))
+S3_CALLS = REGISTRY.counter("s3_calls_total", "S3 API calls by operation and outcome", ("operation", "outcome"))
+S3_SECONDS = REGISTRY.histogram("s3_call_seconds", "S3 API call latency by operation", ("operation",))
+S3_SERVICE_SECONDS = REGISTRY.histogram("s3_service_seconds", "Time spent in S3Service methods", ("method",))
+FILTER_SECONDS = REGISTRY.histogram("pothole_filter_seconds", "filter_indices time")
+SERIALIZE_SECONDS = REGISTRY.histogram(
+    "pothole_serialize_seconds", "Time producing a response body (rows, presigning, encoding)", ("format",))
+CACHE_LOOKUPS = REGISTRY.counter("cache_lookups_total", "Query cache and ETag lookups by result", ("kind", "result"))
+INGEST_RECORDS = REGISTRY.counter(
+    "ingest_records_total", "Pushed sidecars by result (accepted, duplicate, rejected)", ("result",))
+
+
+def _hit_ratio() -> float:
+    hits = misses = 0.0
+    for (kind, result), child in CACHE_LOOKUPS.children.items():
+        if result == "hit":
+            hits += child.value
+        else:
+            misses += child.value
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+REGISTRY.collector(lambda: [("cache_hit_ratio", "Hits over all cache and ETag lookups since start", _hit_ratio())])
+
+
+def timed(metric: Metric, *labels):
+    """
+    Decorator observing a function's duration (for generator functions,
+    the time spent producing items); a no-op when metrics are disabled
+    """
+    def wrap(fn):
+        if not REGISTRY.enabled:
+            return fn
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen(*args, **kwargs):
+                yield from timed_iter(fn(*args, **kwargs), metric, *labels)
+            return gen
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - t, *labels)
+        return inner
+    return wrap
+
+
+def timed_iter(items: Iterable, metric: Metric, *labels) -> Iterable:
+    """
+    Pass items through, observing the total time spent inside next()
+    once the iterator is exhausted or closed
+    """
+    if not REGISTRY.enabled:
+        return items
+    return _timed_iter(iter(items), metric, labels)
+
+
+def _timed_iter(it: Iterator, metric: Metric, labels: Tuple) -> Iterator:
+    spent = 0.0
+    try:
+        while True:
+            t = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                spent += time.perf_counter() - t
+                return
+            spent += time.perf_counter() - t
+            yield item
+    finally:
+        metric.observe(spent, *labels)
+
+
+def instrument_boto(client):
+    """
+    Count and time every call the boto3 client makes, by operation
+    """
+    if not REGISTRY.enabled:
+        return
+
+    def before(context, model, **_):
+        context["metrics_call"] = (model.name, time.perf_counter())
+
+    def after(context, http_response=None, **_):
+        call = context.pop("metrics_call", None)
+        if call is None:
+            return
+        status = getattr(http_response, "status_code", 0)
+        S3_SECONDS.observe(time.perf_counter() - call[1], call[0])
+        S3_CALLS.inc(1, call[0], "ok" if status < 300 else "error")
+
+    def after_error(context, **_):
+        # connection failures; no response was parsed
+        call = context.pop("metrics_call", None)
+        if call is not None:
+            S3_SECONDS.observe(time.perf_counter() - call[1], call[0])
+            S3_CALLS.inc(1, call[0], "error")
+
+    events = client.meta.events
+    events.register("before-call.s3", before)
+    events.register("after-call.s3", after)
+    events.register("after-call-error.s3", after_error)
+
+
+def init_app(app):
+    """
+    Time every request (streamed bodies included) by route
+    """
+    if not REGISTRY.enabled:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _finish(resp):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return resp
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        labels = (route, request.method, resp.status_code)
+        resp.call_on_close(lambda: HTTP_SECONDS.observe(time.perf_counter() - started, *labels))
+        return resp
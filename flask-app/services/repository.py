@@ -0,0 +1,252 @@
+import abc
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .s3_service import ASSET_FIELDS
+
+try:
+    import psycopg
+except ImportError:  # optional: only the Postgres backend needs it
+    psycopg = None
+
+# (key, etag, last_modified, record); etag/last_modified are the S3 listing's
+Row = Tuple[str, Optional[str], Optional[str], Dict]
+# key -> (etag, last_modified, (image_key, image_clean_key, video_key))
+SyncState = Dict[str, Tuple[Optional[str], Optional[str], Tuple]]
+
+
+def _assets(record: Dict) -> Tuple:
+    return tuple(record.get(f) for f in ASSET_FIELDS)
+
+
+class PotholeRepository(abc.ABC):
+    """
+    Durable home of parsed sidecar records, keyed by S3 key (or any other
+    unique source key). The snapshot sync and device pushes upsert into
+    it, and the app loads its in-memory PotholeStore from it at boot
+    without touching S3. Queries run against that store, not here.
+    """
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abc.abstractmethod
+    def sync_state(self) -> SyncState:
+        ...
+
+    @abc.abstractmethod
+    def upsert(self, rows: Iterable[Row]) -> int:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, keys: Sequence[str]) -> int:
+        ...
+
+    @abc.abstractmethod
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Dict]:
+        ...
+
+    @abc.abstractmethod
+    def records(self) -> List[Dict]:
+        """
+        Every record, in id order
+        """
+
+    def close(self):
+        pass
+
+
+class MemoryRepository(PotholeRepository):
+    """
+    Dict-backed; nothing survives a restart
+    """
+    def __init__(self):
+        self.rows: Dict[str, Tuple[Optional[str], Optional[str], Dict]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def sync_state(self) -> SyncState:
+        with self._lock:
+            return {k: (etag, lm, _assets(rec)) for k, (etag, lm, rec) in self.rows.items()}
+
+    def upsert(self, rows: Iterable[Row]) -> int:
+        n = 0
+        with self._lock:
+            for key, etag, last_modified, record in rows:
+                self.rows[key] = (etag, last_modified, record)
+                n += 1
+        return n
+
+    def delete(self, keys: Sequence[str]) -> int:
+        with self._lock:
+            return sum(self.rows.pop(k, None) is not None for k in keys)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Dict]:
+        with self._lock:
+            return {k: self.rows[k][2] for k in keys if k in self.rows}
+
+    def records(self) -> List[Dict]:
+        with self._lock:
+            return sorted((rec for _, _, rec in self.rows.values()), key=lambda r: r["id"])
+
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS potholes (
+        key             TEXT PRIMARY KEY,
+        etag            TEXT,
+        last_modified   TEXT,
+        id              BIGINT NOT NULL,
+        image_key       TEXT,
+        image_clean_key TEXT,
+        video_key       TEXT,
+        record          TEXT NOT NULL
+    )
+    """,
+    # records() reads in id order; filters run on the in-memory store
+    "CREATE INDEX IF NOT EXISTS potholes_id ON potholes (id)",
+)
+COLUMNS = ("key", "etag", "last_modified", "id") + ASSET_FIELDS + ("record",)
+UPSERT = (
+    f"INSERT INTO potholes ({', '.join(COLUMNS)}) VALUES ({{params}}) "
+    f"ON CONFLICT (key) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c != "key")
+)
+# rows per executemany/IN list
+BATCH = 500
+
+
+def _row_values(row: Row) -> Tuple:
+    key, etag, last_modified, r = row
+    return (
+        key, etag, last_modified, int(r["id"]), *_assets(r), json.dumps(r),
+    )
+
+
+class SQLRepository(PotholeRepository):
+    """
+    Shared SQL for the SQLite and Postgres backends: one row per record
+    holding the full record as JSON, plus the columns the repository
+    itself reads (id for ordering, the asset keys for sync_state)
+    """
+    placeholder = "?"
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+        with self._lock:
+            cur = self.conn.cursor()
+            for stmt in SCHEMA:
+                cur.execute(stmt)
+            self.conn.commit()
+
+    def _params(self, n: int) -> str:
+        return ", ".join([self.placeholder] * n)
+
+    def _fetch(self, sql: str, args: Sequence = ()) -> List[Tuple]:
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute(sql.replace("?", self.placeholder), tuple(args))
+            return cur.fetchall()
+
+    def __len__(self) -> int:
+        return self._fetch("SELECT COUNT(*) FROM potholes")[0][0]
+
+    def sync_state(self) -> SyncState:
+        rows = self._fetch(f"SELECT key, etag, last_modified, {', '.join(ASSET_FIELDS)} FROM potholes")
+        return {key: (etag, lm, tuple(assets)) for key, etag, lm, *assets in rows}
+
+    def upsert(self, rows: Iterable[Row]) -> int:
+        sql = UPSERT.format(params=self._params(len(COLUMNS)))
+        n = 0
+        with self._lock:
+            cur = self.conn.cursor()
+            batch = []
+            for row in rows:
+                batch.append(_row_values(row))
+                if len(batch) >= BATCH:
+                    cur.executemany(sql, batch)
+                    n += len(batch)
+                    batch = []
+            if batch:
+                cur.executemany(sql, batch)
+                n += len(batch)
+            self.conn.commit()
+        return n
+
+    def delete(self, keys: Sequence[str]) -> int:
+        keys = list(keys)
+        n = 0
+        with self._lock:
+            cur = self.conn.cursor()
+            for i in range(0, len(keys), BATCH):
+                part = keys[i:i + BATCH]
+                cur.execute(f"DELETE FROM potholes WHERE key IN ({self._params(len(part))})", part)
+                n += cur.rowcount
+            self.conn.commit()
+        return n
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Dict]:
+        keys = list(keys)
+        out = {}
+        for i in range(0, len(keys), BATCH):
+            part = keys[i:i + BATCH]
+            for key, record in self._fetch(f"SELECT key, record FROM potholes WHERE key IN ({self._params(len(part))})", part):
+                out[key] = json.loads(record)
+        return out
+
+    def records(self) -> List[Dict]:
+        return [json.loads(r) for (r,) in self._fetch("SELECT record FROM potholes ORDER BY id, key")]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class SQLiteRepository(SQLRepository):
+    """
+    Single-file database for local runs and tests
+    """
+    def __init__(self, path: str):
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        super().__init__(conn)
+        self.path = path
+
+
+class PostgresRepository(SQLRepository):
+    """
+    Production backend (the postgres/ Fly app); needs psycopg installed
+    """
+    placeholder = "%s"
+
+    def __init__(self, dsn: str):
+        if psycopg is None:
+            raise RuntimeError("The Postgres repository needs psycopg installed (pip install 'psycopg[binary]')")
+        # reads should not hold a transaction open; upserts commit per call
+        super().__init__(psycopg.connect(dsn, autocommit=True))
+
+
+def open_repository(url: str) -> Optional[PotholeRepository]:
+    """
+    Repository for a DATABASE_URL: "" for none, memory://, sqlite:///relative.db,
+    sqlite:////absolute.db, or a postgres:// / postgresql:// DSN
+    """
+    if not url:
+        return None
+    if url == "memory://":
+        return MemoryRepository()
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        return SQLiteRepository(path)
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresRepository(url)
+    raise ValueError(f"Unsupported DATABASE_URL {url!r}")
@@ -1,10 +1,14 @@
 import os
 import json
+import time
 import datetime
+import threading
 import random
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
 
-from config import BUCKET_NAME, S3_URL, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
+from config import S3_FETCH_WORKERS, PRESIGN_EXPIRES_S
 
 import boto3
 from botocore.config import Config  as BotoConfig
@@ -13,8 +17,46 @@ from botocore.exceptions import BotoCoreError, ClientError
 import config
 import logging
 
+from .metrics import CACHE_LOOKUPS, S3_SERVICE_SECONDS, timed
+
 logger = logging.getLogger(__name__)
 
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.gif')
+VIDEO_EXTS = ('.avi', '.mp4', '.mkv', '.mov')
+# <base>_best_clean.jpg / <base>_best.jpg / <base>.avi next to <base>.json
+ASSET_FIELDS = ("image_key", "image_clean_key", "video_key")
+PRESIGN_CACHE_SIZE = 50_000
+# reuse a presigned URL for this share of its lifetime; with the /api/potholes
+# ETag epoch of half a lifetime, reuse + epoch stays within the expiry
+PRESIGN_REUSE_FRACTION = 0.5
+
+
+def asset_slot(key: str) -> Optional[Tuple[str, str]]:
+    """
+    Map a media key to (sidecar key without extension, record field)
+    """
+    stem, _, ext = key.rpartition('.')
+    ext = '.' + ext.lower()
+    if ext in IMAGE_EXTS:
+        if stem.endswith('_best_clean'):
+            return stem[:-len('_best_clean')], "image_clean_key"
+        if stem.endswith('_best'):
+            return stem[:-len('_best')], "image_key"
+    elif ext in VIDEO_EXTS:
+        return stem, "video_key"
+    return None
+
+
+def attach_assets(record: Dict, assets: Dict[str, Dict[str, str]]) -> Dict:
+    """
+    Set the image/video key fields of a record from a listing's asset map
+    """
+    stem = f"{record['s3_prefix']}/{record['s3_base']}" if record.get('s3_prefix') else record.get('s3_base')
+    found = assets.get(stem, {})
+    for field in ASSET_FIELDS:
+        record[field] = found.get(field)
+    return record
+
 
 class S3Service:
     """
@@ -27,80 +69,179 @@ class S3Service:
         aws_access_key_id: str,
         aws_secret_access_key: str,
         max_attempts: int =3,
+        fetch_workers: int = S3_FETCH_WORKERS,
     ):
-        self.bucket = BUCKET_NAME
+        self.bucket = bucket_name
+        self.fetch_workers = max(1, fetch_workers)
+        # one client (and one urllib3 pool) shared by every fetch worker;
+        # the pool must be at least as large as the worker count
         self.svc = boto3.client(
-        's3',
-        endpoint_url=S3_URL,
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY 
-    )
+            's3',
+            endpoint_url=endpoint_url,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            config=BotoConfig(
+                retries={"max_attempts": max_attempts, "mode": "standard"},
+                max_pool_connections=max(10, self.fetch_workers),
+            ),
+        )
+        self.last_fetch_stats: Dict = {}
+        self._stats_lock = threading.Lock()
+        self._presign_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._presign_lock = threading.Lock()
 
-    def list_json_sidecars(self, prefix: Optional[str]=None) -> List[str]:
+    @timed(S3_SERVICE_SECONDS, "iter_sidecar_objects")
+    def iter_sidecar_objects(self, prefix: Optional[str]=None, assets: Optional[Dict]=None) -> Iterator[Dict]:
         """
-        Return all .json keys under prefix or entire bucket
+        Yield list_objects_v2 entries (Key, ETag, LastModified, ...) for
+        .json keys page by page while the listing is still running.
+        If assets is given, best-frame images and videos seen on the way
+        are collected into it as {sidecar stem: {field: key}}.
         """
         paginator = self.svc.get_paginator('list_objects_v2')
         kwargs = {"Bucket": self.bucket}
         if prefix:
             kwargs["Prefix"] = prefix
 
-        keys: List[str] = []
         for page in paginator.paginate(**kwargs):
             for obj in page.get('Contents', []):
                 key = obj['Key']
                 if key.lower().endswith('.json'):
-                    keys.append(key)
-        return keys
+                    yield obj
+                elif assets is not None:
+                    slot = asset_slot(key)
+                    if slot:
+                        # listing is sorted, so keep the first match like presign_image_get did
+                        assets.setdefault(slot[0], {}).setdefault(slot[1], key)
+
+    def iter_json_sidecars(self, prefix: Optional[str]=None, assets: Optional[Dict]=None) -> Iterator[str]:
+        """
+        Yield .json keys page by page while the listing is still running
+        """
+        for obj in self.iter_sidecar_objects(prefix, assets):
+            yield obj['Key']
+
+    def list_json_sidecars(self, prefix: Optional[str]=None) -> List[str]:
+        """
+        Return all .json keys under prefix or entire bucket
+        """
+        return list(self.iter_json_sidecars(prefix))
 
-    def fetch_sidecar(self, key: str) -> Optional[dict]:
+    @timed(S3_SERVICE_SECONDS, "fetch_sidecar")
+    def fetch_sidecar(self, key: str, stats: Optional[Dict] = None) -> Optional[dict]:
         """
         Fetch and parse a single JSON sidecar. Returns NONE on Failure
         """
         try:
             resp    = self.svc.get_object(Bucket=self.bucket, Key=key)
-            return json.loads(resp['Body'].read())
+            body = resp['Body'].read()
+            if stats is not None:
+                with self._stats_lock:
+                    stats["bytes"] += len(body)
+            return json.loads(body)
         except (ClientError, BotoCoreError,  ValueError) as e:
             logger.warning(f"Skipping {key}: {e}")
             return None
 
-    def fetch_pothole_data(self) -> List[Dict]:
+    @timed(S3_SERVICE_SECONDS, "fetch_pothole_data")
+    def fetch_pothole_data(self, workers: Optional[int] = None) -> List[Dict]:
         """
         Walk all json sidecars, extract geodata and metadata,
-        return list of pothole dicts ready for filtering
+        return list of pothole dicts ready for filtering.
+        Image and video keys are resolved from the same listing.
+        Throughput numbers for the run are left in self.last_fetch_stats.
         """
-        data: List[Dict] = []
-        for key in self.list_json_sidecars():
-            sidecar = self.fetch_sidecar(key)
+        assets: Dict[str, Dict[str, str]] = {}
+        fetched = self.fetch_records(self.iter_json_sidecars(assets=assets), workers)
+        return [attach_assets(rec, assets) for _, rec in fetched if rec]
+
+    @timed(S3_SERVICE_SECONDS, "fetch_records")
+    def fetch_records(self, keys: Iterable[str], workers: Optional[int] = None) -> List[Tuple[str, Optional[Dict]]]:
+        """
+        Fetch and parse sidecars for keys, returning (key, record) pairs in
+        key order. record is None for sidecars that failed or were incomplete.
+        With workers > 1 the GETs run on a bounded thread pool and start as
+        soon as the first listing page arrives.
+        """
+        workers = self.fetch_workers if workers is None else max(1, workers)
+        started = time.perf_counter()
+        stats = {"workers": workers, "listed": 0, "records": 0, "skipped": 0, "bytes": 0}
+
+        results: List[Tuple[int, str, Optional[Dict]]] = []
+        if workers == 1:
+            for seq, key in enumerate(keys):
+                results.append((seq, key, self._fetch_record(key, stats)))
+        else:
+            # keep a few requests queued per worker so the pool never idles,
+            # without materialising futures for the whole bucket up front
+            max_in_flight = workers * 4
+            in_flight = {}
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-fetch") as pool:
+                for seq, key in enumerate(keys):
+                    in_flight[pool.submit(self._fetch_record, key, stats)] = (seq, key)
+                    if len(in_flight) >= max_in_flight:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for fut in done:
+                            results.append((*in_flight.pop(fut), fut.result()))
+                for fut in wait(in_flight).done:
+                    results.append((*in_flight[fut], fut.result()))
+        results.sort(key=lambda r: r[0])
+
+        elapsed = time.perf_counter() - started
+        stats["listed"] = len(results)
+        stats["records"] = sum(1 for r in results if r[2])
+        stats["skipped"] = stats["listed"] - stats["records"]
+        stats["seconds"] = round(elapsed, 3)
+        stats["keys_per_s"] = round(stats["listed"] / elapsed, 1) if elapsed else 0.0
+        stats["mb_per_s"] = round(stats["bytes"] / 1e6 / elapsed, 2) if elapsed else 0.0
+        self.last_fetch_stats = stats
+        logger.info(
+            f"Fetched {stats['records']}/{stats['listed']} sidecars in {stats['seconds']}s "
+            f"({stats['keys_per_s']} keys/s, {stats['mb_per_s']} MB/s, {workers} workers)"
+        )
+        return [(key, rec) for _, key, rec in results]
+
+    def _fetch_record(self, key: str, stats: Dict) -> Optional[Dict]:
+        # a bad sidecar must only cost its own key, never the whole run
+        try:
+            sidecar = self.fetch_sidecar(key, stats)
             if not sidecar:
-                continue
-
-            ts  = sidecar.get("timestamp")
-            gps = sidecar.get("gps", {})
-            lat = gps.get("lat")
-            lon = gps.get("lon")
-            if ts is None or lat is None or lon is None:
-                logger.warning(f"Skipping incomplete sidecar {key}")
-                continue
-
-                # split off the date-folder and base filename
-            prefix, filename = key.rsplit('/', 1)            # e.g. "2025-5-01", "pothole_1746148157.json"
-            base = filename.rsplit('.', 1)[0]    # e.g. "pothole_1746148157"
-
-            data.append({
-                "id":          ts,                             # timestamp
-                "lat":         lat,
-                "lng":         lon,
-                "severity" : random.randint(1, 5),
-                "confidence" : round(random.uniform(0.5, 1.0), 2),
-                "date":        datetime.date.fromtimestamp(ts).isoformat(),
-                "description": sidecar.get("description", ""),
-                "s3_prefix":   prefix,
-                "s3_base":     base
-            })
-
-        return data
+                return None
+            return self.sidecar_to_record(key, sidecar)
+        except Exception as e:
+            logger.warning(f"Skipping malformed sidecar {key}: {e!r}")
+            return None
+
+    @staticmethod
+    def sidecar_to_record(key: str, sidecar: dict) -> Optional[Dict]:
+        """
+        Turn a parsed sidecar into a pothole dict, or None if it lacks geodata
+        """
+        ts  = sidecar.get("timestamp")
+        gps = sidecar.get("gps") or {}
+        lat = gps.get("lat")
+        lon = gps.get("lon")
+        if ts is None or lat is None or lon is None:
+            logger.warning(f"Skipping incomplete sidecar {key}")
+            return None
+
+        # split off the date-folder and base filename
+        prefix, filename = key.rsplit('/', 1) if '/' in key else ('', key)  # e.g. "2025-5-01", "pothole_1746148157.json"
+        base = filename.rsplit('.', 1)[0]    # e.g. "pothole_1746148157"
+
+        return {
+            "id":          ts,                             # timestamp
+            "lat":         lat,
+            "lng":         lon,
+            "severity" : random.randint(1, 5),
+            "confidence" : round(random.uniform(0.5, 1.0), 2),
+            "date":        datetime.date.fromtimestamp(ts).isoformat(),
+            "description": sidecar.get("description", ""),
+            "s3_prefix":   prefix,
+            "s3_base":     base
+        }
 
+    @timed(S3_SERVICE_SECONDS, "generate_presigned_post")
     def generate_presigned_post(self, key:str, content_type:str, expires_in: int = 3600) -> Dict:
         """
         Single-file upload presigned POST.
@@ -113,6 +254,7 @@ class S3Service:
             ExpiresIn=expires_in,
         )
 
+    @timed(S3_SERVICE_SECONDS, "delete_s3_directory")
     def delete_s3_directory(self, prefix: str):
         """
         Delete all objects under a prefix. Returns list of deleted metadata.
@@ -134,6 +276,34 @@ class S3Service:
 
         return deleted
 
+    @timed(S3_SERVICE_SECONDS, "presign_get")
+    def presign_get(self, key: str, expires_in: int = PRESIGN_EXPIRES_S) -> str:
+        """
+        Presigned GET URL for a known key. Signing is local (no request to
+        S3); URLs are reused until half of their lifetime has passed.
+        """
+        now = time.monotonic()
+        with self._presign_lock:
+            hit = self._presign_cache.get(key)
+            if hit and hit[0] > now:
+                self._presign_cache.move_to_end(key)
+                CACHE_LOOKUPS.inc(1, "presign", "hit")
+                return hit[1]
+        CACHE_LOOKUPS.inc(1, "presign", "miss")
+
+        url = self.svc.generate_presigned_url(
+            ClientMethod='get_object',
+            Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=expires_in
+        )
+        with self._presign_lock:
+            self._presign_cache[key] = (now + expires_in * PRESIGN_REUSE_FRACTION, url)
+            self._presign_cache.move_to_end(key)
+            while len(self._presign_cache) > PRESIGN_CACHE_SIZE:
+                self._presign_cache.popitem(last=False)
+        return url
+
+    @timed(S3_SERVICE_SECONDS, "presign_image_get")
     def presign_image_get(self, prefix:str, expires_in: int =3600) -> Optional[str]:
         response = self.svc.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
         # Find the first matching image file
@@ -0,0 +1,163 @@
+import os
+import json
+import datetime
+import logging
+from typing import Dict, List, Optional
+
+from .s3_service import ASSET_FIELDS, S3Service, attach_assets
+from .repository import PotholeRepository
+
+logger = logging.getLogger(__name__)
+
+
+class SidecarSnapshot:
+    """
+    Parsed sidecar records persisted in a PotholeRepository, keyed by S3
+    key together with the ETag/LastModified they were fetched at, so a
+    restart serves what is already stored and a sync only has to download
+    sidecars that are new or changed since the last one.
+
+    Rows pushed by a device (no ETag) wait push_grace_s for their upload
+    to show up in the listing; after that a sync treats them like any
+    other key the bucket no longer has.
+    """
+    FORMAT_VERSION = 1      # of the JSON files import_json() reads
+    DEFAULT_PUSH_GRACE_S = 3600
+
+    def __init__(self, repo: PotholeRepository, push_grace_s: float = DEFAULT_PUSH_GRACE_S):
+        self.repo = repo
+        self.push_grace_s = push_grace_s
+
+    def __len__(self) -> int:
+        return len(self.repo)
+
+    def import_json(self, path: str) -> int:
+        """
+        Copy a JSON snapshot file (the format before the repository) into
+        the repository; returns the number of records imported
+        """
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+            return 0
+
+        if payload.get("version") != self.FORMAT_VERSION:
+            logger.warning(f"Ignoring snapshot {path} with version {payload.get('version')}")
+            return 0
+        entries = payload.get("entries", {})
+        n = self.repo.upsert((k, e["etag"], e["last_modified"], e["record"]) for k, e in entries.items())
+        logger.info(f"Imported {n} sidecars from snapshot {path}")
+        return n
+
+    def records(self) -> List[Dict]:
+        return self.repo.records()
+
+    def sync(self, s3: S3Service, workers: Optional[int] = None) -> Dict:
+        """
+        Bring the repository in line with the bucket listing: fetch
+        sidecars whose ETag/LastModified changed, drop keys that are gone,
+        and refresh every record's image/video keys from the same listing.
+        Returns counts plus the upserted records (new or changed sidecars),
+        the media records (only image/video keys changed) and removed keys.
+        """
+        state = self.repo.sync_state()
+        seen = set()
+        listed_meta: Dict[str, tuple] = {}
+        assets: Dict[str, Dict[str, str]] = {}
+        adopted: Dict[str, tuple] = {}
+
+        def changed_keys():
+            for obj in s3.iter_sidecar_objects(assets=assets):
+                key = obj["Key"]
+                seen.add(key)
+                etag = obj.get("ETag")
+                last_modified = obj["LastModified"].isoformat()
+                known = state.get(key)
+                if known and known[0] == etag and known[1] == last_modified:
+                    continue
+                if known and known[0] is None:
+                    # pushed by its device before the upload landed: same
+                    # sidecar, so take the listing's ETag instead of refetching
+                    adopted[key] = (etag, last_modified)
+                    continue
+                listed_meta[key] = (etag, last_modified)
+                yield key
+
+        upserted: Dict[str, Dict] = {}
+        added = 0
+        for key, record in s3.fetch_records(changed_keys(), workers):
+            # failed or incomplete sidecars are not remembered, so they are
+            # retried on the next sync instead of being masked by their ETag
+            if not record:
+                continue
+            if key not in state:
+                added += 1
+            upserted[key] = attach_assets(record, assets)
+        self.repo.upsert((k, *listed_meta[k], rec) for k, rec in upserted.items())
+
+        # only reached when the listing finished, so absence really means
+        # deleted -- except for rows pushed so recently their upload may
+        # not have landed yet
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.push_grace_s)
+        removed = [
+            key for key, (etag, last_modified, _) in state.items()
+            if key not in seen and (etag is not None or not _pushed_since(last_modified, cutoff))
+        ]
+        self.repo.delete(removed)
+
+        # best frames are uploaded after the sidecar, so unchanged sidecars
+        # can still gain (or lose) media between syncs
+        stale, changed, media = [], set(), {}
+        for key, (etag, last_modified, before) in state.items():
+            if key in upserted or key not in seen:
+                continue
+            found = assets.get(os.path.splitext(key)[0], {})
+            if before != tuple(found.get(f) for f in ASSET_FIELDS):
+                changed.add(key)
+            elif key not in adopted:
+                continue
+            stale.append((key, *adopted.get(key, (etag, last_modified))))
+        if stale:
+            records = self.repo.get_many([k for k, _, _ in stale])
+            rows = [(k, etag, lm, attach_assets(records[k], assets)) for k, etag, lm in stale if k in records]
+            self.repo.upsert(rows)
+            # only the media fields changed: patched into the served data in place
+            media = {k: rec for k, _, _, rec in rows if k in changed}
+
+        stats = {
+            "listed": len(seen),
+            "added": added,
+            "updated": len(upserted) - added,
+            "removed": len(removed),
+            "adopted": len(adopted),
+            "media": len(media),
+            "upserted_keys": list(upserted),
+            "upserted_records": list(upserted.values()),
+            "media_keys": list(media),
+            "media_records": list(media.values()),
+            "removed_keys": removed,
+        }
+        logger.info(
+            f"Snapshot sync: {stats['listed']} listed, {stats['added']} added, "
+            f"{stats['updated']} updated, {stats['media']} with new media, {stats['removed']} removed, "
+            f"{stats['adopted']} pushed rows adopted"
+        )
+        return stats
+
+
+def _pushed_since(last_modified: Optional[str], cutoff: datetime.datetime) -> bool:
+    """
+    Whether a pushed row's LastModified (its push time) is after cutoff;
+    rows with no usable push time are treated as old
+    """
+    try:
+        pushed = datetime.datetime.fromisoformat(last_modified)
+    except (TypeError, ValueError):
+        return False
+    if pushed.tzinfo is None:
+        pushed = pushed.replace(tzinfo=datetime.timezone.utc)
+    return pushed > cutoff
@@ -0,0 +1,138 @@
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+M_PER_DEG_LAT = 111320.0
+DEFAULT_CELL_DEG = 0.01          # ~1.1 km of latitude per cell
+MAX_DELTA_FRACTION = 0.1         # rebuild once appended rows exceed 10% of the base
+
+
+def haversine_m(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distance in metres from (lat, lng) to every point
+    """
+    p1 = math.radians(lat)
+    p2 = np.radians(lats)
+    dp = p2 - p1
+    dl = np.radians(lngs - lng)
+    a = np.sin(dp / 2) ** 2 + math.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def radius_bbox(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """
+    (min_lng, min_lat, max_lng, max_lat) enclosing a circle. Near the
+    antimeridian the lng range wraps (min_lng > max_lng, like a bbox that
+    crosses it); a circle reaching a pole spans every longitude.
+    """
+    dlat = radius_m / M_PER_DEG_LAT
+    coslat = math.cos(math.radians(lat))
+    if coslat < 1e-6 or lat + dlat >= 90.0 or lat - dlat <= -90.0:
+        dlng = 180.0
+    else:
+        dlng = radius_m / (M_PER_DEG_LAT * coslat)
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    if dlng >= 180.0:
+        return -180.0, min_lat, 180.0, max_lat
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180.0:
+        min_lng += 360.0
+    if max_lng > 180.0:
+        max_lng -= 360.0
+    return min_lng, min_lat, max_lng, max_lat
+
+
+class _GridPart:
+    """
+    One CSR grid: row ids sorted by cell key, the distinct keys and where
+    each key's run starts in that order
+    """
+    __slots__ = ("keys", "starts", "order")
+
+    def __init__(self, cell_keys: np.ndarray, offset: int):
+        order = np.argsort(cell_keys, kind="stable")
+        sorted_keys = cell_keys[order]
+        self.keys, starts = np.unique(sorted_keys, return_index=True)
+        self.starts = np.append(starts, len(sorted_keys))
+        self.order = order + offset
+
+    def __len__(self):
+        return len(self.order)
+
+    def row_range(self, key_lo: np.ndarray, key_hi: np.ndarray) -> List[np.ndarray]:
+        # cells with keys in [lo, hi] are one contiguous run of self.order
+        lo = self.starts[np.searchsorted(self.keys, key_lo, side="left")]
+        hi = self.starts[np.searchsorted(self.keys, key_hi, side="right")]
+        return [self.order[a:b] for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+
+
+class GridIndex:
+    """
+    Uniform lat/lng grid over store row indices.
+    A bbox lookup does one binary search per grid row of the box, then only
+    touches points in the overlapping cells, so the cost follows the result
+    size rather than the dataset size. Rows appended on refresh go into
+    small delta grids that are folded in by a full rebuild once they grow.
+    """
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, cell_deg: float = DEFAULT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.nx = int(math.ceil(360.0 / cell_deg)) + 1
+        self.ny = int(math.ceil(180.0 / cell_deg)) + 1
+        self.size = len(lat)
+        self.parts = [_GridPart(self._keys(lat, lng), 0)] if self.size else []
+
+    def _cells(self, lat, lng):
+        cy = np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+        cx = np.floor((np.asarray(lng) + 180.0) / self.cell_deg).astype(np.int64)
+        return cy, cx
+
+    def _keys(self, lat, lng) -> np.ndarray:
+        cy, cx = self._cells(lat, lng)
+        return cy * self.nx + cx
+
+    def extend(self, lat: np.ndarray, lng: np.ndarray) -> "GridIndex":
+        """
+        Index for the same rows plus lat[self.size:], lng[self.size:].
+        lat/lng are the full columns of the grown store.
+        """
+        base = max((len(p) for p in self.parts), default=0)
+        delta = len(lat) - base
+        if delta > MAX_DELTA_FRACTION * base:
+            return GridIndex(lat, lng, self.cell_deg)
+        grown = GridIndex.__new__(GridIndex)
+        grown.cell_deg, grown.nx, grown.ny, grown.size = self.cell_deg, self.nx, self.ny, len(lat)
+        grown.parts = list(self.parts)
+        if len(lat) > self.size:
+            grown.parts.append(_GridPart(self._keys(lat[self.size:], lng[self.size:]), self.size))
+        return grown
+
+    def _spans(self, min_lng: float, max_lng: float) -> List[Tuple[int, int]]:
+        """
+        Inclusive cell column ranges covering [min_lng, max_lng], clamped
+        to the grid; two when the range wraps across the antimeridian
+        """
+        if max_lng - min_lng >= 360.0:
+            return [(0, self.nx - 1)]
+        if min_lng > max_lng:
+            return self._spans(min_lng, 180.0) + self._spans(-180.0, max_lng)
+        _, (cx0, cx1) = self._cells([0.0, 0.0], [min_lng, max_lng])
+        cx0, cx1 = max(0, int(cx0)), min(self.nx - 1, int(cx1))
+        return [(cx0, cx1)] if cx0 <= cx1 else []
+
+    def bbox_candidates(self, min_lng: float, min_lat: float, max_lng: float, max_lat: float) -> np.ndarray:
+        """
+        Sorted, distinct row ids in every cell overlapping the box (a
+        superset of the hits). min_lng > max_lng crosses the antimeridian.
+        """
+        (cy0, cy1), _ = self._cells([min_lat, max_lat], [0.0, 0.0])
+        cy0, cy1 = max(0, int(cy0)), min(self.ny - 1, int(cy1))
+        rows = np.arange(cy0, cy1 + 1, dtype=np.int64) * self.nx
+        chunks = []
+        for cx0, cx1 in self._spans(min_lng, max_lng):
+            for part in self.parts:
+                chunks.extend(part.row_range(rows + cx0, rows + cx1))
+        if not chunks:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate(chunks))
@@ -0,0 +1,274 @@
+import datetime
+import hashlib
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .spatial import GridIndex
+
+EPOCH = datetime.date(1970, 1, 1)
+
+# numeric columns and their dtypes; every other record field is kept as a
+# dictionary-encoded string column
+NUMERIC_COLUMNS = {
+    "id": np.int64,
+    "lat": np.float64,
+    "lng": np.float64,
+    "severity": np.int8,
+    "confidence": np.float64,
+    "observations": np.int32,      # entities only; a raw observation counts once
+}
+MISSING_SEVERITY = -1
+
+
+def to_day(iso_date: str) -> int:
+    """
+    'YYYY-MM-DD' -> days since 1970-01-01. Raises ValueError on bad input.
+    """
+    return (datetime.date.fromisoformat(iso_date) - EPOCH).days
+
+
+def source_key(record: dict):
+    """
+    What identifies a record: the sidecar it was parsed from
+    ({s3_prefix}/{s3_base}), or its id for records without one (dummy data)
+    """
+    base = record.get("s3_base")
+    if base is None:
+        return record["id"]
+    return f"{record['s3_prefix']}/{base}" if record.get("s3_prefix") else base
+
+
+class StringColumn:
+    """
+    Dictionary-encoded strings: int32 codes into a list of distinct values.
+    Date folders, descriptions and the like repeat heavily, so this is far
+    smaller than one Python str per row.
+    """
+    __slots__ = ("codes", "values")
+
+    def __init__(self, codes: np.ndarray, values: List[Optional[str]]):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def encode(cls, items: Sequence[Optional[str]]) -> "StringColumn":
+        return cls(np.empty(0, dtype=np.int32), []).extend(items)
+
+    def extend(self, items: Sequence[Optional[str]]) -> "StringColumn":
+        """
+        New column with items appended; self is left untouched
+        """
+        lookup: Dict[Optional[str], int] = {v: i for i, v in enumerate(self.values)}
+        codes = np.fromiter(
+            (lookup.setdefault(v, len(lookup)) for v in items),
+            dtype=np.int32, count=len(items),
+        )
+        return StringColumn(np.concatenate([self.codes, codes]), list(lookup))
+
+    def replace(self, rows: np.ndarray, items: Sequence[Optional[str]]) -> "StringColumn":
+        """
+        New column with the values at rows replaced; self is left untouched
+        """
+        lookup: Dict[Optional[str], int] = {v: i for i, v in enumerate(self.values)}
+        codes = self.codes.copy()
+        codes[rows] = [lookup.setdefault(v, len(lookup)) for v in items]
+        return StringColumn(codes, list(lookup))
+
+    def take(self, idx: np.ndarray) -> List[Optional[str]]:
+        values = self.values
+        return [values[c] for c in self.codes[idx].tolist()]
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class PotholeStore:
+    """
+    Column-oriented pothole records backed by NumPy arrays.
+    Rows are kept sorted by id; filters work on whole columns and return
+    row index arrays, and dicts are only built for rows that are returned.
+    """
+    def __init__(self, columns: Dict[str, np.ndarray], strings: Dict[str, StringColumn], fields: List[str]):
+        self.columns = columns      # numeric columns plus "day"
+        self.strings = strings
+        self.fields = fields        # record keys in output order
+        self._index: Optional[GridIndex] = None
+        self._fingerprint: Optional[str] = None
+
+    # convenience accessors for the filter hot path
+    @property
+    def id(self) -> np.ndarray:
+        return self.columns["id"]
+
+    @property
+    def lat(self) -> np.ndarray:
+        return self.columns["lat"]
+
+    @property
+    def lng(self) -> np.ndarray:
+        return self.columns["lng"]
+
+    @property
+    def severity(self) -> np.ndarray:
+        return self.columns["severity"]
+
+    @property
+    def confidence(self) -> np.ndarray:
+        return self.columns["confidence"]
+
+    @property
+    def day(self) -> np.ndarray:
+        return self.columns["day"]
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    @property
+    def index(self) -> GridIndex:
+        """
+        Spatial grid over the rows, built on first use
+        """
+        if self._index is None:
+            self._index = GridIndex(self.lat, self.lng)
+        return self._index
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Content hash, computed once; cached row indices are keyed by it so
+        they are never applied to a different store
+        """
+        if self._fingerprint is None:
+            h = hashlib.sha1(repr(self.fields).encode())
+            for k in sorted(self.columns):
+                h.update(self.columns[k].tobytes())
+            for k in sorted(self.strings):
+                h.update(self.strings[k].codes.tobytes())
+                h.update(repr(self.strings[k].values).encode())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    @staticmethod
+    def _encode_numeric(records: List[dict]) -> Dict[str, np.ndarray]:
+        n = len(records)
+        return {
+            "id": np.fromiter((p["id"] for p in records), dtype=np.int64, count=n),
+            "lat": np.fromiter((p["lat"] for p in records), dtype=np.float64, count=n),
+            "lng": np.fromiter((p["lng"] for p in records), dtype=np.float64, count=n),
+            "severity": np.fromiter(
+                (MISSING_SEVERITY if p.get("severity") is None else p["severity"] for p in records),
+                dtype=np.int8, count=n,
+            ),
+            "confidence": np.fromiter(
+                (np.nan if p.get("confidence") is None else p["confidence"] for p in records),
+                dtype=np.float64, count=n,
+            ),
+            "observations": np.fromiter(
+                (p.get("observations", 1) for p in records), dtype=np.int32, count=n,
+            ),
+            "day": np.array([p["date"] for p in records], dtype="datetime64[D]").astype(np.int32),
+        }
+
+    @staticmethod
+    def _fields(records: List[dict], fields: Sequence[str] = ()) -> List[str]:
+        seen: Dict[str, None] = dict.fromkeys(fields)
+        for p in records:
+            for k in p:
+                seen.setdefault(k, None)
+        for k in ("id", "lat", "lng", "date"):
+            seen.setdefault(k, None)
+        return list(seen)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "PotholeStore":
+        records = sorted(records, key=lambda p: p["id"])
+        fields = cls._fields(records)
+        strings = {
+            k: StringColumn.encode([p.get(k) for p in records])
+            for k in fields if k not in NUMERIC_COLUMNS and k != "date"
+        }
+        return cls(cls._encode_numeric(records), strings, fields)
+
+    def append(self, records: Iterable[dict]) -> "PotholeStore":
+        """
+        New store with records added after the existing rows, reusing the
+        string dictionaries and extending the spatial index incrementally.
+        Raises ValueError if that would break id order; rebuild instead.
+        """
+        records = sorted(records, key=lambda p: p["id"])
+        if records and len(self) and records[0]["id"] < self.id[-1]:
+            raise ValueError("appended records must not precede existing ids")
+
+        fields = self._fields(records, self.fields)
+        new = self._encode_numeric(records)
+        columns = {k: np.concatenate([self.columns[k], new[k]]) for k in self.columns}
+        strings = {}
+        for k in fields:
+            if k in NUMERIC_COLUMNS or k == "date":
+                continue
+            col = self.strings.get(k)
+            if col is None:
+                # field first seen in this batch: existing rows read as None
+                col = StringColumn(np.zeros(len(self), dtype=np.int32), [None])
+            strings[k] = col.extend([p.get(k) for p in records])
+
+        grown = PotholeStore(columns, strings, fields)
+        if self._index is not None:
+            grown._index = self._index.extend(grown.lat, grown.lng)
+        return grown
+
+    def row_of(self, record: dict) -> Optional[int]:
+        """
+        Row holding record (matched by source_key among the rows with its id)
+        """
+        lo, hi = np.searchsorted(self.id, record["id"], side="left"), np.searchsorted(self.id, record["id"], side="right")
+        key = source_key(record)
+        for row, other in zip(range(lo, hi), self.to_records(np.arange(lo, hi))):
+            if source_key(other) == key:
+                return row
+        return None
+
+    def patch(self, records: Sequence[dict], fields: Sequence[str]) -> "PotholeStore":
+        """
+        New store with string fields of existing rows replaced by the values
+        in records. Only those columns are copied; the rest, and the spatial
+        index, are shared. Raises KeyError for a record with no row.
+        """
+        rows = []
+        for record in records:
+            row = self.row_of(record)
+            if row is None:
+                raise KeyError(source_key(record))
+            rows.append(row)
+        rows = np.asarray(rows, dtype=np.intp)
+        strings = dict(self.strings)
+        for k in fields:
+            col = strings.get(k) or StringColumn(np.zeros(len(self), dtype=np.int32), [None])
+            strings[k] = col.replace(rows, [p.get(k) for p in records])
+        patched = PotholeStore(self.columns, strings, self._fields([], list(self.fields) + list(fields)))
+        patched._index = self._index
+        return patched
+
+    def to_records(self, idx: np.ndarray) -> List[dict]:
+        """
+        Materialise rows idx as plain dicts in the original record shape
+        """
+        idx = np.asarray(idx, dtype=np.intp)
+        cols: Dict[str, list] = {}
+        for k in self.fields:
+            if k == "date":
+                cols[k] = self.day[idx].astype("datetime64[D]").astype(str).tolist()
+            elif k == "severity":
+                cols[k] = [None if s == MISSING_SEVERITY else s for s in self.severity[idx].tolist()]
+            elif k == "confidence":
+                cols[k] = [None if c != c else c for c in self.confidence[idx].tolist()]
+            elif k in NUMERIC_COLUMNS:
+                cols[k] = self.columns[k][idx].tolist()
+            else:
+                cols[k] = self.strings[k].take(idx)
+        keys = list(cols)
+        return [dict(zip(keys, row)) for row in zip(*cols.values())]
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.columns.values()) + sum(s.codes.nbytes for s in self.strings.values())
@@ -0,0 +1,108 @@
+import io
+import csv
+import json
+import zlib
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .store import PotholeStore
+
+ROW_CHUNK = 500          # rows materialised as dicts at a time
+
+
+def iter_row_chunks(
+    store: PotholeStore,
+    idx: np.ndarray,
+    decorate: Optional[Callable[[List[dict], np.ndarray], None]] = None,
+    chunk: int = ROW_CHUNK,
+) -> Iterator[List[dict]]:
+    """
+    Yield rows idx as lists of dicts, chunk rows at a time, so only one
+    chunk is alive at once. decorate(rows, chunk_idx) can add fields in place.
+    """
+    for start in range(0, len(idx), chunk):
+        part = idx[start:start + chunk]
+        rows = store.to_records(part)
+        if decorate:
+            decorate(rows, part)
+        yield rows
+
+
+def iter_json_array(chunks: Iterable[List[dict]]) -> Iterator[str]:
+    """
+    Serialise row chunks as one JSON array, a chunk per yielded string
+    """
+    yield '['
+    first = True
+    for rows in chunks:
+        if not rows:
+            continue
+        body = ','.join(json.dumps(r) for r in rows)
+        yield body if first else ',' + body
+        first = False
+    yield ']'
+
+
+def iter_ndjson(chunks: Iterable[List[dict]]) -> Iterator[str]:
+    """
+    Serialise row chunks as newline-delimited JSON
+    """
+    for rows in chunks:
+        if rows:
+            yield ''.join(json.dumps(r) + '\n' for r in rows)
+
+
+def iter_csv(chunks: Iterable[List[dict]], fieldnames: List[str]) -> Iterator[str]:
+    """
+    Serialise row chunks as CSV, reusing one small buffer per chunk
+    """
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def iter_geojson(chunks: Iterable[List[dict]]) -> Iterator[str]:
+    """
+    Serialise row chunks as a GeoJSON FeatureCollection of points
+    """
+    def feature(p):
+        return json.dumps({
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [p["lng"], p["lat"]],
+            },
+            "properties": {
+                k: v for k, v in p.items() if k not in ("lat", "lng")
+            }
+        })
+
+    yield '{"type": "FeatureCollection", "features": ['
+    first = True
+    for rows in chunks:
+        if not rows:
+            continue
+        body = ','.join(feature(p) for p in rows)
+        yield body if first else ',' + body
+        first = False
+    yield ']}'
+
+
+def gzip_stream(parts: Iterable, level: int = 6) -> Iterator[bytes]:
+    """
+    Gzip a stream of str/bytes pieces on the fly
+    """
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)   # wbits 31 = gzip container
+    for part in parts:
+        out = z.compress(part.encode() if isinstance(part, str) else part)
+        if out:
+            yield out
+    yield z.flush()
@@ -142,10 +142,13 @@ document.addEventListener('DOMContentLoaded', () => {
       return params.toString();
     }
   
-    // 7) Fetch & render
+    // 7) Fetch & render (only what is inside the current viewport)
     async function fetchAndRender() {
       try {
-        const res = await fetch('/api/potholes?' + buildParams());
+        const params = new URLSearchParams(buildParams());
+        params.set('bbox', map.getBounds().pad(0.25).toBBoxString());
+        params.set('view', 'entities');   // one marker per pothole, not per sighting
+        const res = await fetch('/api/potholes?' + params.toString());
         const data = await res.json();
         markers.clearLayers();
         data.forEach(p => {
@@ -156,7 +159,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 : `<em>No image available</em>`
               }
               <strong>ID:</strong> ${p.id}<br>
-              <strong>Date:</strong> ${p.date}<br>
+              <strong>Seen:</strong> ${p.observations}× (${p.first_seen} – ${p.last_seen})<br>
               <strong>Severity:</strong> ${p.severity}<br>
               <strong>Confidence:</strong> ${p.confidence.toFixed(2)}<br>
               
@@ -169,7 +172,8 @@ document.addEventListener('DOMContentLoaded', () => {
       }
     }
   
-    // 8) Initial load
+    // 8) Initial load, then refetch whenever the viewport settles
     fetchAndRender();
+    map.on('moveend', fetchAndRender);
   });
   
\ No newline at end of file
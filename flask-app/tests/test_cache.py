@@ -0,0 +1,208 @@
+import numpy as np
+import pytest
+from flask import Flask
+
+from routes import api, export
+from services import cache as cache_module
+from services.cache import bump_data_version, cache, cached_rows, data_version
+from services.data_loader import load_entities
+from services.repository import MemoryRepository
+from services.snapshot import SidecarSnapshot
+from services.store import PotholeStore
+
+TS = 1746148157
+
+
+class FakeS3:
+    def __init__(self):
+        self.deleted = []
+
+    def presign_get(self, key):
+        return f"https://signed.example/{key}"
+
+    def delete_s3_directory(self, prefix):
+        return [{"Key": k} for k in self.deleted]
+
+
+def records(n):
+    return [
+        dict(id=TS + i, lat=39.95 + i * 1e-3, lng=-75.16, severity=1 + i % 5, confidence=0.5 + i / (2 * n),
+             date="2025-05-02", s3_prefix="2025-05-02", s3_base=f"pothole_{TS + i}",
+             image_key=f"2025-05-02/pothole_{TS + i}_best.jpg")
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["CACHE_TYPE"] = "SimpleCache"
+    cache.init_app(app)
+    app.s3 = FakeS3()
+    app.pothole_data = PotholeStore.from_records(records(20))
+    load_entities(app, 10.0)
+    app.register_blueprint(api.bp)
+    app.register_blueprint(export.bp)
+    with app.app_context():
+        cache.clear()
+        yield app
+
+
+class Client:
+    """
+    Test client that reads every streamed body, so no generator outlives its request
+    """
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, url, etag=None):
+        resp = self.client.get(url, headers={"If-None-Match": etag} if etag else {})
+        resp.data
+        return resp
+
+    def delete(self, url):
+        return self.client.delete(url)
+
+
+@pytest.fixture
+def client(app):
+    return Client(app)
+
+
+def test_repeat_poll_is_answered_with_304(client):
+    first = client.get("/api/potholes?severity=2")
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    body = first.get_json()
+    assert [p["severity"] for p in body] == [2] * 4
+    assert body[0]["image_url"].startswith("https://signed.example/")
+
+    again = client.get("/api/potholes?severity=2", first.headers["ETag"])
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_etag_depends_on_the_query(client):
+    a = client.get("/api/potholes?severity=2").headers["ETag"]
+    b = client.get("/api/potholes?severity=3").headers["ETag"]
+    c = client.get("/api/potholes?severity=2&limit=2").headers["ETag"]
+    ndjson = client.get("/api/potholes?severity=2&format=ndjson").headers["ETag"]
+    assert len({a, b, c, ndjson}) == 4
+    stale = client.get("/api/potholes?severity=3", a)
+    assert stale.status_code == 200
+
+
+def test_bumping_the_data_version_invalidates(app, client):
+    etag = client.get("/api/potholes").headers["ETag"]
+    bump_data_version()
+    resp = client.get("/api/potholes", etag)
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+
+
+def test_etag_rolls_over_with_the_url_epoch(client, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(api.time, "time", lambda: now[0])
+    etag = client.get("/api/potholes").headers["ETag"]
+    assert client.get("/api/potholes", etag).status_code == 304
+    now[0] += api.URL_EPOCH_S
+    assert client.get("/api/potholes", etag).status_code == 200
+
+
+def test_delete_today_invalidates_only_when_something_went(app, client):
+    etag = client.get("/api/potholes").headers["ETag"]
+    version = data_version()
+
+    assert client.delete("/api/delete_today_directory").status_code == 404
+    assert data_version() == version
+    assert client.get("/api/potholes", etag).status_code == 304
+
+    app.s3.deleted = ["2025-05-02/pothole_1.json"]
+    assert client.delete("/api/delete_today_directory").status_code == 200
+    assert data_version() == version + 1
+    assert client.get("/api/potholes", etag).status_code == 200
+
+
+def deleted_keys(recs):
+    keys = []
+    for r in recs:
+        keys += [f"{r['s3_prefix']}/{r['s3_base']}.json", r["image_key"]]
+    return keys
+
+
+def test_deleted_rows_leave_the_next_response(app, client):
+    gone = records(20)[:3]
+    app.s3.deleted = deleted_keys(gone)
+    etag = client.get("/api/potholes").headers["ETag"]
+    assert client.delete("/api/delete_today_directory").status_code == 200
+
+    resp = client.get("/api/potholes", etag)
+    assert resp.status_code == 200
+    ids = {p["id"] for p in resp.get_json()}
+    assert len(ids) == 17 and not ids & {r["id"] for r in gone}
+    assert len(app.pothole_data) == 17
+    assert sum(e["observations"] for e in app.clusters.records()) == 17
+
+
+def test_deleted_rows_leave_the_repository(app, client):
+    snapshot = SidecarSnapshot(MemoryRepository())
+    recs = records(20)
+    snapshot.repo.upsert((f"{r['s3_prefix']}/{r['s3_base']}.json", "etag", "2025-05-02T00:00:00", r) for r in recs)
+    app.snapshot = snapshot
+    app.pothole_data = PotholeStore.from_records(snapshot.records())
+    load_entities(app, 10.0)
+
+    app.s3.deleted = deleted_keys(recs[5:7])
+    assert client.delete("/api/delete_today_directory").status_code == 200
+    assert len(snapshot) == 18
+    ids = {p["id"] for p in client.get("/api/potholes").get_json()}
+    assert len(ids) == 18 and TS + 5 not in ids and TS + 6 not in ids
+
+
+@pytest.mark.parametrize("fmt", ["csv", "geojson"])
+def test_export_revalidates(client, fmt):
+    first = client.get(f"/api/export?format={fmt}&severity=1")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert client.get(f"/api/export?format={fmt}&severity=1", etag).status_code == 304
+    # same rows, other encoding: a different body, so a different tag
+    other = client.get(f"/api/export?format={fmt}&severity=1&compress=gzip", etag)
+    assert other.status_code == 200 and other.headers["ETag"] != etag
+    bump_data_version()
+    assert client.get(f"/api/export?format={fmt}&severity=1", etag).status_code == 200
+
+
+def test_export_formats_share_cached_rows(client, monkeypatch):
+    calls = []
+    filter_indices = export.services.filter.filter_indices
+    monkeypatch.setattr(export.services.filter, "filter_indices", lambda *a: calls.append(a) or filter_indices(*a))
+    client.get("/api/export?format=csv&severity=4")
+    client.get("/api/export?format=geojson&severity=4")
+    assert len(calls) == 1
+    bump_data_version()
+    client.get("/api/export?format=csv&severity=4")
+    assert len(calls) == 2
+
+
+def test_cached_rows_computes_once_per_key(app):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.arange(5, dtype=np.int64), "next"
+
+    idx, extra = cached_rows("rows:a", compute)
+    again, extra_again = cached_rows("rows:a", compute)
+    assert len(calls) == 1
+    assert again.dtype == np.int32 and again.tolist() == idx.tolist()
+    assert extra_again == extra == "next"
+    cached_rows("rows:b", compute)
+    assert len(calls) == 2
+
+
+def test_large_row_sets_are_not_cached(app, monkeypatch):
+    monkeypatch.setattr(cache_module, "MAX_CACHED_ROWS", 3)
+    calls = []
+    compute = lambda: calls.append(1) or (np.arange(5), None)
+    cached_rows("rows:big", compute)
+    cached_rows("rows:big", compute)
+    assert len(calls) == 2
@@ -0,0 +1,63 @@
+from services.clustering import PotholeClusterer
+from services.store import PotholeStore
+
+TS = 1746148157
+
+
+def obs(i, ts=TS, lat=39.95, lng=-75.16, confidence=0.8, **extra):
+    return dict(id=ts, lat=lat, lng=lng, severity=2, confidence=confidence, date="2025-05-02",
+                s3_prefix="2025-05-02", s3_base=f"pothole_{i}", **extra)
+
+
+def test_nearby_observations_form_one_entity():
+    clusters = PotholeClusterer(10.0)
+    clusters.add([obs(0), obs(1, ts=TS + 60, lat=39.95003), obs(2, ts=TS + 120, lat=39.96)])
+    assert sorted(e.count for e in clusters.entities.values()) == [1, 2]
+
+
+def test_neighbours_are_found_across_cell_edges_and_the_antimeridian():
+    clusters = PotholeClusterer(10.0)
+    # 4 m apart on either side of the antimeridian, and on either side of
+    # a cell boundary at high latitude where cells are narrow in metres
+    clusters.add([obs(0, lng=179.99998), obs(1, ts=TS + 1, lng=-179.99997)])
+    edge = clusters.cell_deg * 1000 - 180.0
+    clusters.add([obs(2, ts=TS + 2, lat=69.5, lng=edge - 1e-5), obs(3, ts=TS + 3, lat=69.5, lng=edge + 1e-5)])
+    assert sorted(e.count for e in clusters.entities.values()) == [2, 2]
+    # beyond radius_m stays apart even near a pole, where the box spans every longitude
+    clusters.add([obs(4, ts=TS + 4, lat=89.99995, lng=0.0), obs(5, ts=TS + 5, lat=89.99995, lng=180.0)])
+    assert len(clusters) == 4
+
+
+def test_same_timestamp_observations_are_both_clustered():
+    clusters = PotholeClusterer(10.0)
+    clusters.add([obs(0), obs(1, lat=40.5)])
+    assert len(clusters) == 2
+    assert len(clusters.assignments) == 2
+    # entity ids stay unique, so the entity store keeps both
+    assert len(clusters.store()) == 2
+
+
+def test_adding_the_same_observation_twice_is_a_no_op():
+    clusters = PotholeClusterer(10.0)
+    clusters.add([obs(0)])
+    assert clusters.add([obs(0)]) == []
+    assert next(iter(clusters.entities.values())).count == 1
+
+
+def test_update_patches_the_best_observation():
+    clusters = PotholeClusterer(10.0)
+    clusters.add([obs(0, confidence=0.9), obs(1, ts=TS + 60)])
+    entity = next(iter(clusters.entities.values()))
+    assert entity.best["s3_base"] == "pothole_0"
+
+    # an image beats confidence
+    assert clusters.update([obs(1, ts=TS + 60, image_key="2025-05-02/pothole_1_best.jpg")]) == [entity.id]
+    assert clusters.store().to_records([0])[0]["image_key"] == "2025-05-02/pothole_1_best.jpg"
+    # the best observation's own media changes are always taken
+    clusters.update([obs(1, ts=TS + 60, image_key=None, video_key="v.mp4")])
+    assert entity.best["video_key"] == "v.mp4"
+
+
+def test_from_store_round_trip():
+    store = PotholeStore.from_records([obs(0), obs(1), obs(2, ts=TS + 1, lat=41.0)])
+    assert len(PotholeClusterer.from_store(store, 10.0)) == 2
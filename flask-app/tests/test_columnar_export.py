@@ -0,0 +1,105 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from services import columnar_export
+from services.columnar_export import iter_columnar
+from services.store import PotholeStore
+
+TS = 1746148157
+
+
+def records(n):
+    return [
+        dict(id=TS + i, lat=39.9 + i * 1e-4, lng=-75.2 + i * 1e-4, severity=None if i % 7 == 0 else 1 + i % 5,
+             confidence=0.5 + (i % 50) / 100, date="2025-05-02",
+             description=None if i % 3 == 0 else f"pothole number {i} on a long street name",
+             s3_prefix="2025-05-02", s3_base=f"pothole_{TS + i}")
+        for i in range(n)
+    ]
+
+
+@pytest.fixture(scope="module")
+def store():
+    return PotholeStore.from_records(records(5000))
+
+
+def export(fmt, store, idx, distances=None):
+    return b"".join(iter_columnar(fmt, store, np.asarray(idx, dtype=np.int64), distances))
+
+
+def expected(store, idx):
+    return store.to_records(np.asarray(idx))
+
+
+def as_rows(table):
+    rows = table.to_pylist()
+    for r in rows:
+        r["date"] = r["date"].isoformat()
+        r.pop("geometry", None)
+    return rows
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet", "geoparquet"])
+def test_round_trip(store, fmt):
+    idx = [0, 3, 4, 21, 4999]
+    data = export(fmt, store, idx)
+    table = pa.ipc.open_stream(data).read_all() if fmt == "arrow" else pq.read_table(io.BytesIO(data))
+    want = expected(store, idx)
+    assert table.column_names[:len(store.fields)] == store.fields
+    got = as_rows(table)
+    for g, w in zip(got, want):
+        assert g == pytest.approx(w)
+    # null strings and severities survive as nulls
+    assert got[0]["description"] is None and got[0]["severity"] is None
+    assert got[2]["description"] == want[2]["description"] is not None
+
+
+def test_multiple_batches_each_with_their_own_dictionary(store, monkeypatch):
+    monkeypatch.setattr(columnar_export, "BATCH_ROWS", 1000)
+    idx = np.arange(len(store))
+    table = pa.ipc.open_stream(export("arrow", store, idx)).read_all()
+    assert table.num_rows == len(store)
+    assert table.column("s3_base").to_pylist() == [r["s3_base"] for r in expected(store, idx)]
+    table = pq.read_table(io.BytesIO(export("parquet", store, idx)))
+    assert table.column("description").to_pylist() == [r["description"] for r in expected(store, idx)]
+
+
+def test_geoparquet_metadata_and_points(store):
+    idx = [10, 20, 30]
+    table = pq.read_table(io.BytesIO(export("geoparquet", store, idx)))
+    geo = json.loads(table.schema.metadata[b"geo"])
+    assert geo["primary_column"] == "geometry"
+    assert geo["columns"]["geometry"]["encoding"] == "WKB"
+    assert geo["columns"]["geometry"]["bbox"] == [
+        float(store.lng[idx].min()), float(store.lat[idx].min()), float(store.lng[idx].max()), float(store.lat[idx].max()),
+    ]
+    for wkb, i in zip(table.column("geometry").to_pylist(), idx):
+        order, kind, x, y = np.frombuffer(wkb, dtype=columnar_export._WKB_POINT)[0].tolist()
+        assert (order, kind, x, y) == (1, 1, store.lng[i], store.lat[i])
+
+
+def test_distances_column(store):
+    table = pa.ipc.open_stream(export("arrow", store, [1, 2], np.array([12.34, 56.78]))).read_all()
+    assert table.column("distance_m").to_pylist() == [12.3, 56.8]
+
+
+def test_empty_export_has_a_schema(store):
+    for fmt in ("arrow", "parquet"):
+        data = export(fmt, store, [])
+        table = pa.ipc.open_stream(data).read_all() if fmt == "arrow" else pq.read_table(io.BytesIO(data))
+        assert table.num_rows == 0 and table.column_names[:len(store.fields)] == store.fields
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_small_subset_stays_small(store, fmt):
+    # the dictionaries only hold what the rows use, not the whole store's strings
+    small = len(export(fmt, store, [1, 2, 3]))
+    full = len(export(fmt, store, np.arange(len(store))))
+    assert small < 4096
+    assert small * 20 < full
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from services.filter import paginate, parse_cursor
+from services.store import PotholeStore
+
+TS = 1746148157
+
+
+def store_of(ids):
+    return PotholeStore.from_records(
+        dict(id=i, lat=39.95, lng=-75.16, date="2025-05-02", s3_base=f"pothole_{n}") for n, i in enumerate(ids)
+    )
+
+
+def pages(store, limit):
+    idx, cursor, out = np.arange(len(store)), None, []
+    while True:
+        page, cursor = paginate(store, idx, limit, cursor)
+        out.append(page.tolist())
+        if cursor is None:
+            return out
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 100])
+def test_pages_cover_every_row_once(limit):
+    # runs of equal ids straddle page boundaries
+    store = store_of([TS, TS, TS, TS + 1, TS + 2, TS + 2, TS + 3])
+    walked = pages(store, limit)
+    assert sum(walked, []) == list(range(len(store)))
+    assert all(len(p) == limit for p in walked[:-1])
+
+
+def test_cursor_survives_rows_added_between_pages():
+    store = store_of([TS, TS, TS + 1, TS + 2])
+    first, cursor = paginate(store, np.arange(4), 1, None)
+    assert cursor == f"{TS}.1"
+    # a newer row, and another with an id already paged past
+    grown = store_of([TS - 5, TS, TS, TS + 1, TS + 2, TS + 3])
+    rest, _ = paginate(grown, np.arange(6), None, cursor)
+    assert grown.to_records(rest)[0]["id"] == TS
+    assert store.id[first].tolist() + grown.id[rest].tolist() == [TS, TS, TS + 1, TS + 2, TS + 3]
+
+
+def test_parse_cursor():
+    assert parse_cursor(f"{TS}.2") == (TS, 2)
+    assert parse_cursor(f"{TS}") == (TS, 0)
+    for bad in ("x.1", f"{TS}.-1", f"{TS}.y"):
+        with pytest.raises(ValueError):
+            parse_cursor(bad)
@@ -0,0 +1,142 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+from routes import api
+from services.cache import cache, data_version
+from services.data_loader import ingest_rows, load_entities
+from services.ingest import IngestError, batch_rows, decode_body
+from services.repository import MemoryRepository
+from services.snapshot import SidecarSnapshot
+from services.store import PotholeStore
+
+TS = 1746148157
+
+
+def sidecar(ts=TS, lat=39.95, lon=-75.16):
+    return {"timestamp": ts, "gps": {"lat": lat, "lon": lon}, "confidence": 0.8}
+
+
+def batch(*sidecars, device_id="pi-01"):
+    return {
+        "device_id": device_id,
+        "sidecars": [{"key": f"2025-05-02/pothole_{s['timestamp']}.json", "sidecar": s} for s in sidecars],
+    }
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["CACHE_TYPE"] = "SimpleCache"
+    cache.init_app(app)
+    app.snapshot = SidecarSnapshot(MemoryRepository())
+    app.pothole_data = PotholeStore.from_records([])
+    load_entities(app, 10.0)
+    with app.app_context():
+        yield app
+
+
+def test_decode_gzip_body():
+    raw = json.dumps(batch(sidecar())).encode()
+    assert decode_body(gzip.compress(raw), "gzip", 1 << 20) == json.loads(raw)
+    assert decode_body(raw, None, 1 << 20) == json.loads(raw)
+
+
+def test_decode_refuses_bombs_and_garbage():
+    with pytest.raises(IngestError):
+        decode_body(gzip.compress(b" " * (2 << 20)), "gzip", 1 << 20)
+    with pytest.raises(IngestError):
+        decode_body(b"not gzip", "gzip", 1 << 20)
+    with pytest.raises(IngestError):
+        decode_body(b"[]", None, 1 << 20)
+
+
+@pytest.mark.parametrize("bad", [
+    sidecar(ts=1e20),
+    sidecar(ts=float("nan")),
+    sidecar(ts=-5),
+    sidecar(ts=True),
+    sidecar(lat=float("nan")),
+    sidecar(lat=91.0),
+    sidecar(lon=float("inf")),
+    sidecar(lon="x"),
+    {"timestamp": TS},
+    {"timestamp": TS, "gps": None},
+])
+def test_out_of_range_sidecars_are_rejected(bad):
+    rows, rejected = batch_rows(batch(bad, sidecar(ts=TS + 1)), 10)
+    assert rejected == 1
+    assert [key for key, _, _, _ in rows] == [f"2025-05-02/pothole_{TS + 1}.json"]
+
+
+def test_nan_survives_a_json_round_trip_and_is_rejected():
+    payload = decode_body(json.dumps(batch(sidecar(lat=float("nan")))).encode(), None, 1 << 20)
+    assert batch_rows(payload, 10) == ([], 1)
+
+
+def test_batch_needs_device_id_and_a_size_limit():
+    with pytest.raises(IngestError):
+        batch_rows({"sidecars": []}, 10)
+    with pytest.raises(IngestError):
+        batch_rows(batch(*[sidecar(ts=TS + i) for i in range(3)]), 2)
+
+
+def test_key_defaults_to_device_and_timestamp():
+    rows, _ = batch_rows({"device_id": "pi-01", "sidecars": [{"sidecar": sidecar()}]}, 10)
+    key, etag, _, record = rows[0]
+    assert key == f"pi-01/pothole_{TS}.json"
+    assert etag is None
+    assert record["device_id"] == "pi-01"
+
+
+def test_ingest_is_idempotent(app):
+    rows, _ = batch_rows(batch(sidecar(), sidecar(ts=TS + 60, lat=40.0)), 10)
+    assert ingest_rows(app, rows) == {"accepted": 2, "duplicates": 0}
+    version = data_version()
+    assert len(app.pothole_data) == 2
+    assert len(app.entity_data) == 2
+
+    assert ingest_rows(app, rows) == {"accepted": 0, "duplicates": 2}
+    assert data_version() == version
+    assert len(app.pothole_data) == 2
+    assert len(app.snapshot) == 2
+
+
+def test_ingest_appends_to_the_served_store(app):
+    first, _ = batch_rows(batch(sidecar()), 10)
+    ingest_rows(app, first)
+    more, _ = batch_rows(batch(sidecar(), sidecar(ts=TS - 60, lat=41.0)), 10)
+    assert ingest_rows(app, more) == {"accepted": 1, "duplicates": 1}
+    # out-of-order ids fall back to a rebuild, still id-sorted
+    assert app.pothole_data.id.tolist() == [TS - 60, TS]
+
+
+def post_batch(app, headers=None):
+    if "api" not in app.blueprints:
+        app.register_blueprint(api.bp)
+    return app.test_client().post("/api/ingest", json=batch(sidecar()), headers=headers or {})
+
+
+def test_ingest_endpoint_fails_closed_without_a_token(app, monkeypatch):
+    monkeypatch.setattr(api, "INGEST_TOKEN", "")
+    monkeypatch.setattr(api, "INGEST_ALLOW_ANONYMOUS", False)
+    assert post_batch(app).status_code == 503
+    assert len(app.snapshot) == 0
+
+
+def test_ingest_endpoint_checks_the_bearer_token(app, monkeypatch):
+    monkeypatch.setattr(api, "INGEST_TOKEN", "s3cret")
+    assert post_batch(app).status_code == 401
+    assert post_batch(app, {"Authorization": "Bearer nope"}).status_code == 401
+    resp = post_batch(app, {"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+    assert resp.get_json()["accepted"] == 1
+
+
+def test_anonymous_ingest_is_an_explicit_opt_in(app, monkeypatch):
+    monkeypatch.setattr(api, "INGEST_TOKEN", "")
+    monkeypatch.setattr(api, "INGEST_ALLOW_ANONYMOUS", True)
+    assert post_batch(app).status_code == 200
+    assert len(app.snapshot) == 1
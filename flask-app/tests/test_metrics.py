@@ -0,0 +1,37 @@
+from services.promtext import Registry
+
+
+def test_render():
+    registry = Registry(True, (0.1, 1.0))
+    calls = registry.counter("calls_total", "Calls", ("op",))
+    seconds = registry.histogram("call_seconds", "Latency")
+    calls.inc(1, "get")
+    calls.inc(2, "get")
+    for v in (0.05, 0.5, 5.0):
+        seconds.observe(v)
+    registry.collector(lambda: [("depth", "Queue depth", 3)])
+    registry.collector(lambda: 1 / 0)
+
+    assert registry.render().splitlines() == [
+        "# HELP calls_total Calls",
+        "# TYPE calls_total counter",
+        'calls_total{op="get"} 3.0',
+        "# HELP call_seconds Latency",
+        "# TYPE call_seconds histogram",
+        'call_seconds_bucket{le="0.1"} 1',
+        'call_seconds_bucket{le="1.0"} 2',
+        'call_seconds_bucket{le="+Inf"} 3',
+        "call_seconds_sum 5.55",
+        "call_seconds_count 3",
+        "# HELP depth Queue depth",
+        "# TYPE depth gauge",
+        "depth 3.0",
+    ]
+
+
+def test_disabled_registry_records_nothing():
+    registry = Registry(False, (1.0,))
+    registry.counter("calls_total", "Calls").inc()
+    registry.histogram("call_seconds", "Latency").observe(0.5)
+    assert all(not m.children for m in registry.metrics.values())
+
@@ -0,0 +1,61 @@
+import pytest
+
+from services.repository import MemoryRepository, PotholeRepository, SQLiteRepository, open_repository
+
+
+def record(i, **extra):
+    return dict(id=1746148157 + i, lat=39.95, lng=-75.16, severity=2, confidence=0.8,
+                date="2025-05-02", s3_prefix="2025-05-02", s3_base=f"pothole_{i}", **extra)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def repo(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryRepository()
+    else:
+        r = SQLiteRepository(str(tmp_path / "potholes.db"))
+        yield r
+        r.close()
+
+
+def test_is_abstract():
+    with pytest.raises(TypeError):
+        PotholeRepository()
+
+
+def test_upsert_get_delete(repo):
+    assert repo.upsert([(f"k{i}", f"e{i}", "t", record(i)) for i in (2, 0, 1)]) == 3
+    assert len(repo) == 3
+    assert [r["id"] for r in repo.records()] == sorted(r["id"] for r in repo.records())
+
+    repo.upsert([("k1", "e1b", "t2", record(1, image_key="img.jpg"))])
+    assert len(repo) == 3
+    assert repo.sync_state()["k1"] == ("e1b", "t2", ("img.jpg", None, None))
+    assert repo.get_many(["k1", "missing"])["k1"]["image_key"] == "img.jpg"
+
+    assert repo.delete(["k0", "missing"]) == 1
+    assert set(repo.sync_state()) == {"k1", "k2"}
+
+
+def test_sqlite_survives_reopening(tmp_path):
+    path = str(tmp_path / "potholes.db")
+    first = SQLiteRepository(path)
+    first.upsert([("k", None, None, record(0))])
+    first.close()
+    again = open_repository(f"sqlite:///{path}")
+    assert again.records() == [record(0)]
+    assert again.sync_state() == {"k": (None, None, (None, None, None))}
+
+
+def test_open_repository_urls():
+    assert open_repository("") is None
+    assert isinstance(open_repository("memory://"), MemoryRepository)
+    with pytest.raises(ValueError):
+        open_repository("mysql://nope")
+
+
+def test_sqlite_stores_only_what_it_reads(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / "potholes.db"))
+    columns = [name for _, name, *_ in repo._fetch("PRAGMA table_info(potholes)")]
+    assert columns == ["key", "etag", "last_modified", "id", "image_key", "image_clean_key", "video_key", "record"]
+    repo.close()
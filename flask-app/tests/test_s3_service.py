@@ -0,0 +1,108 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from services.s3_service import S3Service
+
+TS = 1746148157
+
+
+class FakeClient:
+    """
+    get_object and a one-page list_objects_v2 paginator over a dict, with
+    a short random-ish delay per GET so concurrent fetches finish out of order
+    """
+    def __init__(self, objects):
+        self.objects = objects
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                yield {"Contents": [{"Key": k} for k in sorted(client.objects)]}
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.001 * (hash(Key) % 5))
+            body = self.objects.get(Key)
+            if body is None:
+                raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+            return {"Body": io.BytesIO(body)}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def sidecar(i):
+    return json.dumps({"timestamp": TS + i, "gps": {"lat": 39.95, "lon": -75.16}}).encode()
+
+
+@pytest.fixture
+def s3():
+    objects = {f"2025-05-02/pothole_{TS + i}.json": sidecar(i) for i in range(40)}
+    objects["2025-05-02/broken.json"] = b"{not json"
+    objects["2025-05-02/nogps.json"] = json.dumps({"timestamp": TS}).encode()
+    objects["2025-05-02/array.json"] = b"[1, 2]"
+    objects["2025-05-02/badts.json"] = json.dumps({"timestamp": "soon", "gps": {"lat": 1, "lon": 2}}).encode()
+    objects[f"2025-05-02/pothole_{TS + 3}_best.jpg"] = b""
+    service = S3Service("bucket", "http://localhost:1", "key", "secret", fetch_workers=4)
+    service.svc = FakeClient(objects)
+    return service
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_fetch_records_keeps_key_order(s3, workers):
+    keys = [f"2025-05-02/pothole_{TS + i}.json" for i in reversed(range(40))]
+    fetched = s3.fetch_records(iter(keys), workers)
+    assert [k for k, _ in fetched] == keys
+    assert [r["id"] for _, r in fetched] == [TS + i for i in reversed(range(40))]
+    assert s3.svc.peak <= workers
+
+
+def test_failed_and_incomplete_sidecars_are_none(s3):
+    keys = ["2025-05-02/broken.json", "2025-05-02/missing.json", "2025-05-02/nogps.json"]
+    assert s3.fetch_records(keys) == [(k, None) for k in keys]
+    assert s3.last_fetch_stats["skipped"] == 3
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_malformed_sidecars_are_skipped_not_fatal(s3, workers):
+    keys = ["2025-05-02/array.json", f"2025-05-02/pothole_{TS}.json", "2025-05-02/badts.json"]
+    fetched = s3.fetch_records(iter(keys), workers)
+    assert [k for k, _ in fetched] == keys
+    assert fetched[0][1] is None and fetched[2][1] is None
+    assert fetched[1][1]["id"] == TS
+
+
+def test_fetch_pothole_data_attaches_listed_media(s3):
+    records = s3.fetch_pothole_data()
+    assert len(records) == 40
+    assert s3.last_fetch_stats["listed"] == 44
+    with_image = [r for r in records if r["image_key"]]
+    assert [r["id"] for r in with_image] == [TS + 3]
+
+
+def test_presigned_urls_are_reused_for_half_their_lifetime(s3, monkeypatch):
+    signed = []
+    s3.svc.generate_presigned_url = lambda **kw: signed.append(kw) or f"url{len(signed)}"
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    assert s3.presign_get("a.jpg", expires_in=100) == "url1"
+    now[0] += 49
+    assert s3.presign_get("a.jpg", expires_in=100) == "url1"
+    now[0] += 2
+    assert s3.presign_get("a.jpg", expires_in=100) == "url2"
+    assert [kw["ExpiresIn"] for kw in signed] == [100, 100]
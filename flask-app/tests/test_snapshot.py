@@ -0,0 +1,122 @@
+import datetime
+
+import pytest
+from flask import Flask
+
+from services.cache import cache
+from services.data_loader import _swap, load_entities
+from services.ingest import batch_rows
+from services.repository import MemoryRepository
+from services.s3_service import S3Service, asset_slot
+from services.snapshot import SidecarSnapshot
+from services.store import PotholeStore
+
+TS = 1746148157
+LISTED_AT = datetime.datetime(2025, 5, 2, tzinfo=datetime.timezone.utc)
+
+
+class FakeBucket:
+    """
+    The two S3Service calls SidecarSnapshot.sync makes, over a dict bucket
+    """
+    def __init__(self):
+        self.objects = {}
+        self.fetched = []
+
+    def put_sidecar(self, i, lat=39.95, etag="e1"):
+        ts = TS + i
+        self.objects[f"2025-05-02/pothole_{ts}.json"] = (etag, {"timestamp": ts, "gps": {"lat": lat, "lon": -75.16}})
+
+    def put(self, key):
+        self.objects[key] = ("m", None)
+
+    def iter_sidecar_objects(self, assets=None):
+        for key, (etag, _) in sorted(self.objects.items()):
+            if key.endswith(".json"):
+                yield {"Key": key, "ETag": etag, "LastModified": LISTED_AT}
+            elif asset_slot(key):
+                stem, field = asset_slot(key)
+                assets.setdefault(stem, {}).setdefault(field, key)
+
+    def fetch_records(self, keys, workers=None):
+        out = []
+        for key in keys:
+            self.fetched.append(key)
+            out.append((key, S3Service.sidecar_to_record(key, self.objects[key][1])))
+        return out
+
+
+@pytest.fixture
+def bucket():
+    b = FakeBucket()
+    for i in range(3):
+        b.put_sidecar(i, lat=39.95 + i * 0.01)
+    return b
+
+
+@pytest.fixture
+def app(bucket):
+    app = Flask(__name__)
+    app.config["CACHE_TYPE"] = "SimpleCache"
+    cache.init_app(app)
+    app.snapshot = SidecarSnapshot(MemoryRepository())
+    app.snapshot.sync(bucket)
+    app.pothole_data = PotholeStore.from_records(app.snapshot.records())
+    load_entities(app, 10.0)
+    with app.app_context():
+        yield app
+
+
+def test_second_sync_fetches_nothing(app, bucket):
+    bucket.fetched.clear()
+    stats = app.snapshot.sync(bucket)
+    assert bucket.fetched == []
+    assert not (stats["upserted_keys"] or stats["media_keys"] or stats["removed_keys"])
+
+
+def test_new_media_is_patched_in_place(app, bucket):
+    before_store, before_clusters = app.pothole_data, app.clusters
+    bucket.put(f"2025-05-02/pothole_{TS + 1}_best.jpg")
+    stats = app.snapshot.sync(bucket)
+    assert stats["updated"] == 0
+    assert stats["media_keys"] == [f"2025-05-02/pothole_{TS + 1}.json"]
+
+    _swap(app, stats)
+    assert app.clusters is before_clusters                      # not reclustered
+    assert app.pothole_data.columns is before_store.columns     # only string columns copied
+    images = [r["image_key"] for r in app.pothole_data.to_records(range(3))]
+    assert images == [None, f"2025-05-02/pothole_{TS + 1}_best.jpg", None]
+    assert sum(r["image_key"] is not None for r in app.entity_data.to_records(range(3))) == 1
+
+
+def test_changed_sidecar_counts_as_updated(app, bucket):
+    bucket.put_sidecar(0, lat=40.5, etag="e2")
+    stats = app.snapshot.sync(bucket)
+    assert stats["updated"] == 1 and stats["media_keys"] == []
+
+
+def test_removed_sidecar_is_dropped(app, bucket):
+    del bucket.objects[f"2025-05-02/pothole_{TS}.json"]
+    stats = app.snapshot.sync(bucket)
+    assert stats["removed_keys"] == [f"2025-05-02/pothole_{TS}.json"]
+    assert len(app.snapshot) == 2
+
+
+def test_pushed_rows_are_adopted_or_dropped_after_the_grace(bucket):
+    snapshot = SidecarSnapshot(MemoryRepository(), push_grace_s=60)
+    rows, _ = batch_rows({"device_id": "pi", "sidecars": [
+        {"key": f"2025-05-02/pothole_{TS}.json", "sidecar": bucket.objects[f"2025-05-02/pothole_{TS}.json"][1]},
+        {"key": "2025-05-02/pothole_1.json", "sidecar": {"timestamp": TS + 9, "gps": {"lat": 1.0, "lon": 2.0}}},
+    ]}, 10)
+    snapshot.repo.upsert(rows)
+
+    # listed: adopted without a refetch; not listed yet: kept within the grace
+    stats = snapshot.sync(bucket)
+    assert stats["adopted"] == 1 and stats["removed_keys"] == []
+    assert f"2025-05-02/pothole_{TS}.json" not in bucket.fetched
+    assert snapshot.repo.sync_state()[f"2025-05-02/pothole_{TS}.json"][0] == "e1"
+
+    # an upload that never lands is dropped like any deleted sidecar
+    snapshot.push_grace_s = 0
+    assert snapshot.sync(bucket)["removed_keys"] == ["2025-05-02/pothole_1.json"]
+    assert len(snapshot) == 3
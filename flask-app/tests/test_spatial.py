@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from services.filter import MAX_SEARCH_RADIUS_M, PotholeQuery, filter_indices
+from services.spatial import GridIndex, radius_bbox
+from services.store import PotholeStore
+
+
+def make_store(points):
+    return PotholeStore.from_records(
+        dict(id=i, lat=lat, lng=lng, severity=1, confidence=0.9, date="2025-05-01")
+        for i, (lat, lng) in enumerate(points)
+    )
+
+
+def query(qs: str) -> PotholeQuery:
+    return PotholeQuery.from_args(MultiDict(kv.split("=", 1) for kv in qs.split("&")))
+
+
+def test_bbox_past_the_globe_returns_each_row_once():
+    index = GridIndex(np.array([0.0, 10.0, -10.0, 45.0]), np.array([-179.9, 0.0, 179.9, 180.0]))
+    assert index.bbox_candidates(-540, -85, 540, 85).tolist() == [0, 1, 2, 3]
+
+
+def test_bbox_crossing_the_antimeridian():
+    index = GridIndex(np.array([0.0, 0.0, 0.0]), np.array([179.5, -179.5, 0.0]))
+    assert index.bbox_candidates(179.0, -1, -179.0, 1).tolist() == [0, 1]
+
+
+def test_bbox_outside_the_grid_is_empty():
+    index = GridIndex(np.array([0.0]), np.array([0.0]))
+    assert len(index.bbox_candidates(-10, 95, 10, 100)) == 0
+
+
+def test_radius_bbox_wraps_the_antimeridian():
+    min_lng, _, max_lng, _ = radius_bbox(0.0, 179.9999, 1000)
+    assert min_lng > max_lng
+    assert min_lng < 179.9999 and max_lng > -180.0
+
+
+def test_radius_bbox_over_a_pole_spans_every_longitude():
+    min_lng, _, max_lng, max_lat = radius_bbox(89.5, 0.0, 200_000)
+    assert (min_lng, max_lng, max_lat) == (-180.0, 180.0, 90.0)
+
+
+def test_nearest_across_the_antimeridian():
+    store = make_store([(0.0, 179.9999), (0.0, -179.9999), (0.0, 0.0)])
+    assert filter_indices(query("near=0,179.9999&k=2"), store).tolist() == [0, 1]
+    assert filter_indices(query("near=0,-179.9999&radius_m=100"), store).tolist() == [1, 0]
+
+
+def test_world_bbox_query_has_no_duplicates():
+    store = make_store([(i * 1.0, i * 30.0 - 170) for i in range(12)])
+    assert filter_indices(query("bbox=-540,-85,540,85"), store).tolist() == list(range(12))
+
+
+def test_radius_is_clamped_to_the_globe():
+    assert query("near=39.5,-75.5&radius_m=1e300").radius_m == MAX_SEARCH_RADIUS_M
+    assert query("near=39.5,-75.5&radius_m=500").radius_m == 500
+    store = make_store([(39.5, -75.5), (-39.5, 104.5)])
+    assert filter_indices(query("near=39.5,-75.5&k=5&radius_m=1e300"), store).tolist() == [0, 1]
+
+
+@pytest.mark.parametrize("qs", [
+    "near=39.5,-75.5&radius_m=nan",
+    "near=39.5,-75.5&radius_m=inf",
+    "near=39.5,-75.5&radius_m=-1",
+    "near=nan,-75.5&k=3",
+    "bbox=-180,-90,inf,90",
+    "conf_min=nan",
+])
+def test_non_finite_parameters_are_rejected(qs):
+    with pytest.raises(ValueError):
+        query(qs)
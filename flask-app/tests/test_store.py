@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from services.filter import filter_potholes
+from services.store import PotholeStore
+
+TS = 1746148157
+
+
+def record(i, **extra):
+    p = dict(id=TS + i * 86400, lat=39.95 + i * 0.001, lng=-75.16, severity=1 + i % 5,
+             confidence=round(0.5 + i / 100, 2), date=f"2025-05-{2 + i:02d}",
+             description="", s3_prefix=f"2025-05-{2 + i:02d}", s3_base=f"pothole_{i}")
+    p.update(extra)
+    return p
+
+
+RECORDS = [record(i) for i in range(10)] + [record(10, severity=None, confidence=None, image_key="a.jpg")]
+
+
+def test_round_trip_preserves_records():
+    store = PotholeStore.from_records(reversed(RECORDS))
+    back = store.to_records(np.arange(len(store)))
+    assert back == [dict(p, image_key=p.get("image_key")) for p in RECORDS]
+    assert store.strings["description"].values == [""]
+
+
+def test_append_matches_a_rebuild():
+    store = PotholeStore.from_records(RECORDS[:6])
+    store.index                                     # built, so append extends it
+    grown = store.append(RECORDS[6:])
+    rebuilt = PotholeStore.from_records(RECORDS)
+    assert grown.fingerprint == rebuilt.fingerprint
+    assert grown.index.bbox_candidates(-180, -90, 180, 90).tolist() == list(range(len(RECORDS)))
+    assert len(store) == 6                          # the old store is untouched
+
+
+def test_append_refuses_to_break_id_order():
+    store = PotholeStore.from_records(RECORDS[5:])
+    with pytest.raises(ValueError):
+        store.append(RECORDS[:1])
+
+
+@pytest.mark.parametrize("args, expected", [
+    ({}, list(range(11))),
+    ({"severity": ["1", "2"]}, [0, 1, 5, 6]),
+    ({"start_date": "2025-05-05", "end_date": "2025-05-07"}, [3, 4, 5]),
+    ({"conf_min": "0.58"}, [8, 9]),
+    ({"bbox": "-76,39.9525,-75,40"}, [3, 4, 5, 6, 7, 8, 9, 10]),
+])
+def test_filter_potholes(args, expected):
+    store = PotholeStore.from_records(RECORDS)
+    found = filter_potholes(MultiDict(args), store)
+    assert [p["s3_base"] for p in found] == [f"pothole_{i}" for i in expected]
@@ -0,0 +1,113 @@
+import heapq
+import itertools
+from typing import Callable, List, Optional
+
+import cv2
+import numpy as np
+
+# how much each term (all in 0..1) counts towards a frame's score
+DEFAULT_WEIGHTS = {"center": 1.0, "confidence": 1.0, "size": 0.5, "sharpness": 1.0}
+# Laplacian variance that maps to a sharpness of 0.5
+SHARPNESS_REF = 100.0
+
+
+def detection_scores(meta, weights=DEFAULT_WEIGHTS):
+    """
+    Score every detection in one frame at once (everything but sharpness).
+    Returns (scores, boxes) with boxes as an (n, 4) xmin, ymin, xmax, ymax array.
+    """
+    conf = np.asarray(meta['confidences'], dtype=np.float32)
+    yc = np.asarray(meta['y_centers'], dtype=np.float32)
+    boxes = np.array(
+        [(b['xmin'], b['ymin'], b['xmax'], b['ymax']) for b in meta['bboxes']], dtype=np.float32,
+    ).reshape(-1, 4)
+    center = 1.0 - np.minimum(np.abs(yc - 0.5) * 2.0, 1.0)
+    area = np.clip(boxes[:, 2] - boxes[:, 0], 0, 1) * np.clip(boxes[:, 3] - boxes[:, 1], 0, 1)
+    scores = (
+        weights["center"] * center
+        + weights["confidence"] * conf
+        + weights["size"] * np.sqrt(area)
+    )
+    return scores, boxes
+
+
+def sharpness(frame, box, roi_px: int = 64) -> float:
+    """
+    Variance of the Laplacian over the detection, downscaled so its longer
+    side is at most roi_px; mapped to 0..1
+    """
+    h, w = frame.shape[:2]
+    x0, x1 = int(max(box[0], 0) * w), int(min(box[2], 1) * w)
+    y0, y1 = int(max(box[1], 0) * h), int(min(box[3], 1) * h)
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return 0.0
+    roi = frame[y0:y1, x0:x1]
+    scale = roi_px / max(roi.shape[:2])
+    if scale < 1.0:
+        roi = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if roi.ndim == 3:
+        roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    var = cv2.Laplacian(roi, cv2.CV_32F).var()
+    return float(var / (var + SHARPNESS_REF))
+
+
+class BestFrames:
+    """
+    Online top-k of an event's frames, scored as they arrive.
+
+    Only the k best frames are ever held, so memory doesn't grow with the
+    clip. A frame that can't reach the current k-th score even with
+    perfect sharpness is rejected before the ROI is looked at, and the
+    caller's make_item (the JPEG encode) only runs for frames that get in.
+    """
+    def __init__(self, k: int = 3, weights=DEFAULT_WEIGHTS, roi_px: int = 64):
+        self.k = k
+        self.weights = weights
+        self.roi_px = roi_px
+        self.first_meta = None          # first frame with detections
+        self.max_confidence = 0.0
+        self.scored = 0
+        self._heap = []                 # (score, tiebreak, parts, item), worst on top
+        self._tiebreak = itertools.count()
+
+    def offer(self, frame, meta, make_item: Callable[[], object]) -> bool:
+        """
+        Score a clean frame; keeps make_item() if it ranks in the top k
+        """
+        if not (meta and meta['confidences']):
+            return False
+        self.scored += 1
+        if self.first_meta is None:
+            self.first_meta = meta
+        self.max_confidence = max(self.max_confidence, float(max(meta['confidences'])))
+
+        scores, boxes = detection_scores(meta, self.weights)
+        i = int(np.argmax(scores))
+        full = len(self._heap) >= self.k
+        if full and scores[i] + self.weights["sharpness"] <= self._heap[0][0]:
+            return False
+        sharp = sharpness(frame, boxes[i], self.roi_px)
+        score = float(scores[i]) + self.weights["sharpness"] * sharp
+        if full and score <= self._heap[0][0]:
+            return False
+
+        item = make_item()
+        if item is None:
+            return False
+        parts = {"score": round(score, 4), "detection": i, "sharpness": round(sharp, 4)}
+        entry = (score, next(self._tiebreak), parts, item)
+        if full:
+            heapq.heapreplace(self._heap, entry)
+        else:
+            heapq.heappush(self._heap, entry)
+        return True
+
+    def ranked(self) -> List[tuple]:
+        """
+        [(parts, item)] best first
+        """
+        return [(parts, item) for _, _, parts, item in sorted(self._heap, reverse=True)]
+
+    def best(self) -> Optional[tuple]:
+        ranked = self.ranked()
+        return ranked[0] if ranked else None
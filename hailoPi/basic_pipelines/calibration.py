@@ -1,29 +1,178 @@
-import os
 import datetime
+import os
 import threading
+import time
+from typing import Callable, Optional
+
 import cv2
+import numpy as np
+from loguru import logger
+
 # --------------------------------------------
 # Periodic Calibration Upload
 # --------------------------------------------
-def upload_calibration_frame():
-    global latest_frame
-    # schedule next run
-    threading.Timer(1.0, upload_calibration_frame).start()
-
-    if latest_frame is None:
-        return  # no prints if nothing to upload
-
-    # save and upload calibration frame
-    ds = datetime.date.today().isoformat()
-    cd = os.path.join(OUTPUT_BASE_DIR, ds, 'calibration')
-    os.makedirs(cd, exist_ok=True)
-    fn = f"calib_{int(time.time())}.png"
-    path = os.path.join(cd, fn)
-    cv2.imwrite(path, latest_frame)
-
-    key = f"{ds}/calibration/{fn}"
-    try:
-        s3_client.upload_file(path, TIGRIS_BUCKET_NAME, key)
-        print(f"[CALIB] Uploaded calibration frame: {fn} to S3://{TIGRIS_BUCKET_NAME}/{key}")
-    except Exception as e:
-        print(f"[CALIB] Upload failed for {fn}: {e}")
\ No newline at end of file
+# grayscale thumbnail the change metric runs on
+THUMB_SIZE = (64, 36)
+
+
+def thumbnail(frame: np.ndarray) -> np.ndarray:
+    small = cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.int16)
+
+
+def change(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Mean absolute difference of two thumbnails, 0-255
+    """
+    return float(np.abs(a - b).mean())
+
+
+class CalibrationUploader:
+    """
+    One long-lived thread that uploads a reduced still of the camera view
+    now and then, so the dashboard can check mounting and exposure.
+
+    get_frame returns the latest frame by reference (a frame ring slot);
+    it is read once per tick, into a downscaled copy. Each tick:
+      - skips if the clip spool holds more than max_backlog uploads or
+        the link is down;
+      - skips if the view hasn't changed by change_threshold since the
+        last upload (mean abs diff of a 64x36 grayscale thumbnail);
+      - otherwise encodes a max_width JPEG in memory and put_objects it,
+        through the spool's rate limiter so it shares the bandwidth cap.
+    The interval stretches towards max_interval_s while skipping or
+    backlogged, and never drops below the time that keeps calibration
+    under link_share of the measured upload throughput.
+    """
+    def __init__(
+        self,
+        get_frame: Callable[[], Optional[np.ndarray]],
+        s3_client,
+        bucket: str,
+        upload_spool=None,
+        min_interval_s: float = 1.0,
+        max_interval_s: float = 60.0,
+        change_threshold: float = 4.0,
+        max_width: int = 640,
+        jpeg_quality: int = 70,
+        link_share: float = 0.05,
+        max_backlog: int = 0,
+    ):
+        self.get_frame = get_frame
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.spool = upload_spool
+        self.min_interval_s = min_interval_s
+        self.max_interval_s = max_interval_s
+        self.change_threshold = change_threshold
+        self.max_width = max_width
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        self.link_share = link_share
+        self.max_backlog = max_backlog
+        self.interval_s = min_interval_s
+        self.last_thumb = None
+        self.bytes_per_s = 0.0          # EWMA of our own uploads
+        self.uploaded = 0
+        self.uploaded_bytes = 0
+        self.skipped_unchanged = 0
+        self.skipped_backlog = 0
+        self.failed = 0
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls, get_frame, s3_client, bucket: str, upload_spool=None) -> "CalibrationUploader":
+        return cls(
+            get_frame, s3_client, bucket, upload_spool,
+            min_interval_s=float(os.getenv("CALIB_MIN_INTERVAL_S", "1")),
+            max_interval_s=float(os.getenv("CALIB_MAX_INTERVAL_S", "60")),
+            change_threshold=float(os.getenv("CALIB_CHANGE_THRESHOLD", "4")),
+            max_width=int(os.getenv("CALIB_MAX_WIDTH", "640")),
+            jpeg_quality=int(os.getenv("CALIB_JPEG_QUALITY", "70")),
+            link_share=float(os.getenv("CALIB_LINK_SHARE", "0.05")),
+            max_backlog=int(os.getenv("CALIB_MAX_BACKLOG", "0")),
+        )
+
+    def start(self) -> "CalibrationUploader":
+        threading.Thread(target=self._run, name="calibration", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.tick()
+            except Exception as e:
+                self.failed += 1
+                self._slower()
+                logger.warning(f"[CALIB] Calibration tick failed: {e}")
+
+    def _backlogged(self) -> bool:
+        if self.spool is None:
+            return False
+        st = self.spool.stats()
+        return not st["online"] or st["depth"] > self.max_backlog
+
+    def _slower(self):
+        self.interval_s = min(self.max_interval_s, self.interval_s * 2)
+
+    def tick(self, now: Optional[float] = None) -> bool:
+        """
+        One scheduling step; True if a frame was uploaded
+        """
+        if self._backlogged():
+            self.skipped_backlog += 1
+            self._slower()
+            return False
+        frame = self.get_frame()
+        if frame is None:
+            return False
+
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.max_width / w)
+        small = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 else frame.copy()
+        thumb = thumbnail(small)
+        if self.last_thumb is not None and change(thumb, self.last_thumb) < self.change_threshold:
+            self.skipped_unchanged += 1
+            self._slower()
+            return False
+
+        ok, jpeg = cv2.imencode('.jpg', small, self.encode_params)
+        if not ok:
+            raise RuntimeError("JPEG encode failed")
+        body = jpeg.tobytes()
+        now = time.time() if now is None else now
+        ds = datetime.date.fromtimestamp(now).isoformat()
+        key = f"{ds}/calibration/calib_{int(now)}.jpg"
+
+        if self.spool is not None:
+            self.spool.limiter.consume(len(body))
+        started = time.monotonic()
+        self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType="image/jpeg")
+        elapsed = max(time.monotonic() - started, 1e-3)
+
+        rate = len(body) / elapsed
+        self.bytes_per_s = rate if not self.bytes_per_s else 0.8 * self.bytes_per_s + 0.2 * rate
+        self.last_thumb = thumb
+        self.uploaded += 1
+        self.uploaded_bytes += len(body)
+        # the view changed: come back soon, but only as often as our share
+        # of the link allows
+        self.interval_s = max(self.min_interval_s, len(body) / (self.bytes_per_s * self.link_share))
+        self.interval_s = min(self.interval_s, self.max_interval_s)
+        logger.info(f"[CALIB] Uploaded calibration frame ({len(body)} B) to S3://{self.bucket}/{key}")
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "uploaded": self.uploaded,
+            "uploaded_bytes": self.uploaded_bytes,
+            "skipped_unchanged": self.skipped_unchanged,
+            "skipped_backlog": self.skipped_backlog,
+            "failed": self.failed,
+            "interval_s": round(self.interval_s, 2),
+            "bytes_per_s": round(self.bytes_per_s, 1),
+        }
@@ -0,0 +1,240 @@
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from bestframe import BestFrames
+from clipwriter import ClipWriter
+from dataCapture import annotate
+from framering import FrameRing
+import metrics
+
+
+class EncodedFrame:
+    __slots__ = ("seq", "ts", "jpeg", "meta")
+
+    def __init__(self, seq, ts, jpeg, meta):
+        self.seq = seq
+        self.ts = ts
+        self.jpeg = jpeg      # 1-D uint8 array of JPEG bytes (clean frame)
+        self.meta = meta      # detection metadata stored with the ring slot
+
+
+class Clip:
+    """
+    One finished event: the MP4 written while it was recorded, plus the
+    top-k scored frames (for the best-frame images and metadata)
+    """
+    __slots__ = ("path", "started_at", "best", "frame_count", "duration_s", "encode", "event")
+
+    def __init__(self, path, started_at, best, frame_count, duration_s, encode, event=None):
+        self.path = path                # None if no encoder could be opened
+        self.started_at = started_at    # wall clock at event begin; names the files
+        self.best = best                # BestFrames holding EncodedFrames
+        self.frame_count = frame_count
+        self.duration_s = duration_s
+        self.encode = encode            # ClipWriter.close() stats
+        self.event = event or {}        # whatever was passed to begin_event()
+
+    def __len__(self):
+        return self.frame_count
+
+
+class ClipBuffer:
+    """
+    JPEG-compressed frame history with a byte budget instead of a frame count.
+
+    The GStreamer callback only hands over ring sequence numbers (never
+    blocks); a worker thread encodes the ring slots. Outside an event the
+    last preroll_s seconds are kept, so a clip includes the approach to the
+    pothole. When an event begins the pre-roll goes into a new ClipWriter,
+    and from then on every frame is annotated and written straight from
+    the ring as it arrives, so ending the event only finalizes the file.
+    During the event frames are scored as they go by and only the best_k
+    are kept as JPEG, so memory stays flat however long it runs. max_bytes
+    caps the pre-roll.
+    """
+    def __init__(
+        self,
+        ring: FrameRing,
+        on_clip: Callable[[Clip], None],
+        open_writer: Callable[[tuple, float], ClipWriter],
+        preroll_s: float = 3.0,
+        max_bytes: int = 256 * 1024 * 1024,
+        jpeg_quality: int = 85,
+        queue_size: int = 32,
+        best_k: int = 3,
+    ):
+        self.ring = ring
+        self.on_clip = on_clip
+        self.open_writer = open_writer      # (width, height), started_at -> ClipWriter
+        self.preroll_s = preroll_s
+        self.max_bytes = max_bytes
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.frames = deque()
+        self.nbytes = 0
+        self.recording = False
+        self.writer: Optional[ClipWriter] = None
+        self.best_k = best_k
+        self.best: Optional[BestFrames] = None
+        self.event: Optional[dict] = None
+        self.clip_frames = 0
+        self.clip_started_at = 0.0        # wall clock at event begin
+        self.first_ts = self.last_ts = None
+        self._scratch = None              # copy of the ring slot being written
+        self._stages = metrics.stages(metrics.CLIP_FRAME_SECONDS)
+        self.dropped = 0        # frames never encoded: queue full or ring slot reused
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._controls = deque()   # ("begin"|"end", seq, options), applied in frame order
+        self._thread = threading.Thread(target=self._run, name="clip-encoder", daemon=True)
+
+    def start(self) -> "ClipBuffer":
+        self._thread.start()
+        return self
+
+    # --- called from the GStreamer callback; none of these block ---
+    def push(self, seq: int, ts: float):
+        try:
+            self._queue.put_nowait((seq, ts))
+        except queue.Full:
+            self.dropped += 1
+
+    def begin_event(self, seq: int, video: bool = True, event: Optional[dict] = None):
+        """
+        video=False scores frames but writes no clip (e.g. a re-observation);
+        event is handed back on the finished Clip
+        """
+        self._controls.append(("begin", seq, (video, event)))
+
+    def end_event(self, seq: int):
+        self._controls.append(("end", seq, None))
+
+    def stats(self) -> dict:
+        return {
+            "frames": len(self.frames),
+            "bytes": self.nbytes,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "recording": self.recording,
+            "best_scored": self.best.scored if self.best is not None else 0,
+        }
+
+    # --- worker thread ---
+    def _run(self):
+        while True:
+            try:
+                seq, ts = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                self._apply_controls(None)
+                continue
+            self._apply_controls(seq)
+            self._encode(seq, ts)
+
+    def _apply_controls(self, upto):
+        while self._controls and (upto is None or self._controls[0][1] <= upto):
+            kind, _, options = self._controls.popleft()
+            if kind == "begin":
+                self._begin(*options)
+            elif self.recording:
+                self._end()
+
+    def _begin(self, video: bool, event: Optional[dict]):
+        self.recording = True
+        self.event = event
+        self.best = BestFrames(self.best_k)
+        self.clip_frames = 0
+        self.clip_started_at = started_at = time.time()
+        self.first_ts = self.last_ts = None
+        preroll, self.frames, self.nbytes = self.frames, deque(), 0
+        if video and self.ring.frames is not None:
+            h, w = self.ring.frames.shape[1:3]
+            try:
+                self.writer = self.open_writer((w, h), started_at)
+            except Exception as e:
+                logger.error(f"[ERROR] Could not open clip writer: {e}")
+        for e in preroll:
+            if self.writer is not None or (e.meta and e.meta['confidences']):
+                frame = cv2.imdecode(e.jpeg, cv2.IMREAD_COLOR)
+                self.best.offer(frame, e.meta, lambda e=e: e)
+                if self.writer is not None:
+                    self.writer.write(annotate(frame, e.meta) if e.meta else frame)
+            self._count(e.ts)
+
+    def _end(self):
+        self.recording = False
+        encode = self.writer.close() if self.writer is not None else {}
+        path = self.writer.path if self.writer is not None else None
+        duration_s = round(self.last_ts - self.first_ts, 2) if self.clip_frames else 0.0
+        clip = Clip(path, self.clip_started_at, self.best, self.clip_frames, duration_s, encode, self.event)
+        self.writer, self.best = None, None
+        try:
+            self.on_clip(clip)
+        except Exception as e:
+            logger.error(f"[ERROR] Clip handler failed: {e}")
+
+    def _count(self, ts):
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+        self.clip_frames += 1
+
+    def _keep(self, e: EncodedFrame):
+        """
+        Add a pre-roll frame, dropping what is older than preroll_s or over budget
+        """
+        self.frames.append(e)
+        self.nbytes += e.jpeg.nbytes
+        while self.frames and self.frames[0].ts < e.ts - self.preroll_s:
+            self.nbytes -= self.frames.popleft().jpeg.nbytes
+        while self.nbytes > self.max_bytes and len(self.frames) > 1:
+            self.nbytes -= self.frames.popleft().jpeg.nbytes
+
+    def _encode(self, seq, ts):
+        self._stages.begin()
+        if self.recording:
+            self._record(seq, ts)
+            return
+        frame = self.ring.view(seq)
+        if frame is None:
+            self.dropped += 1
+            return
+        meta = self.ring.get_meta(seq)
+        ok, jpeg = cv2.imencode('.jpg', frame, self.encode_params)
+        if not ok or not self.ring.is_live(seq):     # slot reused mid-encode
+            self.dropped += 1
+            return
+        self._stages.mark("jpeg")
+        self._keep(EncodedFrame(seq, ts, jpeg, meta))
+        self._stages.end()
+
+    def _record(self, seq, ts):
+        src = self.ring.view(seq)
+        if src is None:
+            self.dropped += 1
+            return
+        if self._scratch is None or self._scratch.shape != src.shape:
+            self._scratch = np.empty_like(src)
+        meta = self.ring.get_meta(seq)
+        frame = self.ring.read(seq, self._scratch)
+        if frame is None:
+            self.dropped += 1
+            return
+        self._count(ts)
+        self._stages.mark("read")
+        self.best.offer(frame, meta, lambda: self._jpeg(seq, ts, frame, meta))
+        self._stages.mark("score")
+        if self.writer is not None:
+            out = annotate(frame, meta) if meta else frame
+            self._stages.mark("annotate")
+            self.writer.write(out)
+            self._stages.mark("write")
+        self._stages.end()
+
+    def _jpeg(self, seq, ts, frame, meta) -> Optional[EncodedFrame]:
+        ok, jpeg = cv2.imencode('.jpg', frame, self.encode_params)
+        return EncodedFrame(seq, ts, jpeg, meta) if ok else None
@@ -0,0 +1,88 @@
+import os
+import time
+
+import cv2
+from loguru import logger
+
+# H.264 into MP4 through GStreamer; v4l2h264enc is the Pi's hardware encoder,
+# x264enc the software fallback. {location}, {bitrate} (bit/s), {kbps} and
+# {fps} are filled in.
+GST_PIPELINES = {
+    "v4l2h264enc": "appsrc ! videoconvert ! video/x-raw,format=I420 ! "
+    "v4l2h264enc extra-controls=\"controls,video_bitrate={bitrate}\" ! "
+    "video/x-h264,level=(string)4 ! h264parse ! mp4mux ! filesink location={location}",
+    "x264enc": "appsrc ! videoconvert ! "
+    "x264enc tune=zerolatency speed-preset=ultrafast bitrate={kbps} key-int-max={fps} ! "
+    "h264parse ! mp4mux ! filesink location={location}",
+}
+# streaming writers tried when GStreamer is unavailable
+FOURCC_FALLBACKS = ("avc1", "mp4v")
+
+
+class ClipWriter:
+    """
+    Writes one clip to MP4 frame by frame while the event is still being
+    recorded, so closing it only has to flush the encoder and the muxer.
+
+    Tries the GStreamer H.264 pipelines (CLIP_GST_PIPELINE overrides them),
+    then OpenCV's own MP4 writers. Timing and size are tracked so every
+    clip can report its encode time and bitrate.
+    """
+    def __init__(self, path: str, size, fps: int = 30, bitrate_kbps: int = 2000):
+        self.path = path
+        self.size = size          # (width, height)
+        self.fps = fps
+        self.frames = 0
+        self.encode_s = 0.0
+        self.backend = None
+        self.writer = self._open(bitrate_kbps)
+
+    def _open(self, bitrate_kbps):
+        if cv2.videoio_registry.hasBackend(cv2.CAP_GSTREAMER):
+            custom = os.getenv("CLIP_GST_PIPELINE")
+            pipelines = {"custom": custom} if custom else GST_PIPELINES
+            for name, template in pipelines.items():
+                pipeline = template.format(
+                    location=self.path, bitrate=bitrate_kbps * 1000, kbps=bitrate_kbps, fps=self.fps,
+                )
+                writer = cv2.VideoWriter(pipeline, cv2.CAP_GSTREAMER, 0, self.fps, self.size)
+                if writer.isOpened():
+                    self.backend = f"gstreamer/{name}"
+                    return writer
+        for fourcc in FOURCC_FALLBACKS:
+            writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*fourcc), self.fps, self.size)
+            if writer.isOpened():
+                self.backend = fourcc
+                return writer
+        raise IOError(f"No MP4 encoder available for {self.path}")
+
+    def write(self, frame):
+        t = time.perf_counter()
+        self.writer.write(frame)
+        self.encode_s += time.perf_counter() - t
+        self.frames += 1
+
+    def close(self) -> dict:
+        """
+        Finalize the file; returns the per-clip encode stats
+        """
+        t = time.perf_counter()
+        self.writer.release()
+        finalize_s = time.perf_counter() - t
+        self.encode_s += finalize_s
+        nbytes = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        duration_s = self.frames / self.fps
+        stats = {
+            "backend": self.backend,
+            "frames": self.frames,
+            "bytes": nbytes,
+            "encode_s": round(self.encode_s, 3),
+            "finalize_ms": round(finalize_s * 1000, 1),
+            "bitrate_kbps": round(nbytes * 8 / duration_s / 1000, 1) if duration_s else 0.0,
+        }
+        logger.info(
+            f"[INFO] Encoded {os.path.basename(self.path)} with {self.backend}: {self.frames} frames, "
+            f"{nbytes / 1e6:.2f} MB, {stats['bitrate_kbps']} kbps, {stats['encode_s']}s encoding, "
+            f"{stats['finalize_ms']} ms to finalize"
+        )
+        return stats
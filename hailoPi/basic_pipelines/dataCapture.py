@@ -1,104 +1,133 @@
-import datetime, time
+import datetime
 import os
 import cv2
 import json
-import requests
 from loguru import logger
+from clipwriter import ClipWriter
 # --------------------------------------------
-# Save Clip, Best Frames & Metadata
+# Lazy annotation (only for frames that are saved)
 # --------------------------------------------
-def save_clip_and_metadata(frames_data, s3_client, OUTPUT_BASE_DIR, TIGRIS_BUCKET_NAME, latest_serial_data):
+def annotate(frame, meta):
+    """
+    Draw detection boxes and the max confidence onto frame in place
+    """
+    h, w = frame.shape[:2]
+    for box in meta['bboxes']:
+        x0, y0 = int(box['xmin']*w), int(box['ymin']*h)
+        x1, y1 = int(box['xmax']*w), int(box['ymax']*h)
+        cv2.rectangle(frame, (x0,y0), (x1,y1), (0,255,0), 2)
+    if meta['confidences']:
+        cv2.putText(frame, f"Conf: {max(meta['confidences']):.2f}", (10,30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
+    return frame
+
+# --------------------------------------------
+# Clip Video (written while recording)
+# --------------------------------------------
+def clip_dir(OUTPUT_BASE_DIR, started_at):
+    date_str = datetime.date.fromtimestamp(started_at).isoformat()
+    return date_str, os.path.join(OUTPUT_BASE_DIR, date_str)
+
+def open_clip_writer(OUTPUT_BASE_DIR, size, started_at, fps=30, bitrate_kbps=2000):
+    """
+    Called by the clip buffer when an event begins
+    """
+    _, out_dir = clip_dir(OUTPUT_BASE_DIR, started_at)
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"pothole_{int(started_at)}.mp4")
+    logger.info(f"[INFO] Writing video {os.path.basename(path)}")
+    return ClipWriter(path, size, fps=fps, bitrate_kbps=bitrate_kbps)
+
+# --------------------------------------------
+# Save Best Frames & Metadata
+# --------------------------------------------
+def save_clip_and_metadata(clip, spool, OUTPUT_BASE_DIR, gps_service, ingest_client=None):
+    """
+    clip is a clipbuffer.Clip: the video is already on disk and clip.best
+    holds the top-scored clean JPEG frames. Annotations are only drawn
+    for the best-frame image. A re-observation (clip.event has
+    "reobservation_of") only gets its metadata uploaded. Positions come
+    from gps_service at each frame's own timestamp, not at save time.
+    With an ingest_client the sidecar is also pushed to the dashboard
+    directly, ahead of the bucket upload. True once every file is queued
+    for upload, including the video unless this is a re-observation.
+    """
     logger.debug("[DEBUG] save_clip_and_metadata() triggered")
-    if not frames_data:
+    ranked = clip.best.ranked()
+    if not ranked:
         logger.warning("[WARN] No frames to save, aborting")
-        return
+        if clip.path and os.path.exists(clip.path):
+            os.remove(clip.path)
+        return False
 
-    date_str = datetime.date.today().isoformat()
-    out_dir = os.path.join(OUTPUT_BASE_DIR, date_str)
+    date_str, out_dir = clip_dir(OUTPUT_BASE_DIR, clip.started_at)
     os.makedirs(out_dir, exist_ok=True)
-    ts = int(time.time())
+    ts = int(clip.started_at)
 
-    vid = f"pothole_{ts}.avi"
+    vid = os.path.basename(clip.path) if clip.path else None
     meta_fn = f"pothole_{ts}.json"
     best_clean = f"pothole_{ts}_best_clean.jpg"
     best_ann = f"pothole_{ts}_best.jpg"
+    repeat = clip.event.get("reobservation_of")
+    if vid is None and not repeat:
+        logger.error("[ERROR] No video for this clip, saving frames and metadata only")
 
-    # Write video (annotated)
-    h, w, _ = frames_data[0]['annotated_frame'].shape
-    logger.info(f"[INFO] Writing video {vid}")
-    writer = cv2.VideoWriter(
-        os.path.join(out_dir, vid),
-        cv2.VideoWriter_fourcc(*'XVID'),
-        30,
-        (w, h)
-    )
-    if not writer.isOpened():
-        logger.error(f"[ERROR] VideoWriter failed for {vid}")
-        return
-    for e in frames_data:
-        writer.write(e['annotated_frame'])
-    writer.release()
-    logger.info(f"[INFO] Saved video: {vid}")
-
-    # Select best frame by center proximity
-    bi, bd = None, float('inf')
-    for i, e in enumerate(frames_data):
-        for yc in e['y_centers']:
-            d = abs(yc - 0.5)
-            if d < bd:
-                bd, bi = d, i
-
-    if bi is not None:
-        logger.debug(f"[DEBUG] Best frame index: {bi}")
-        # Save un-annotated “clean” best frame
+    # Best frame: scored online by center, confidence, size and sharpness
+    parts, best = ranked[0]
+    images = () if repeat else (best_clean, best_ann)
+    logger.debug(f"[DEBUG] Best frame seq {best.seq}: {parts}")
+    if images:
+        # Save un-annotated “clean” best frame (already a JPEG)
         clean_path = os.path.join(out_dir, best_clean)
-        cv2.imwrite(clean_path, frames_data[bi]['clean_frame'])
+        best.jpeg.tofile(clean_path)
         logger.info(f"[INFO] Saved clean best frame: {best_clean}")
 
         # Save annotated best frame
         ann_path = os.path.join(out_dir, best_ann)
-        cv2.imwrite(ann_path, frames_data[bi]['annotated_frame'])
+        cv2.imwrite(ann_path, annotate(cv2.imdecode(best.jpeg, cv2.IMREAD_COLOR), best.meta))
         logger.info(f"[INFO] Saved annotated best frame: {best_ann}")
 
+    # Where each ranked frame was taken; the sidecar position is the best frame's
+    positions = gps_service.ring.positions_at([e.ts for _, e in ranked])
+    best_frames = []
+    for (p, e), (lat, lon) in zip(ranked, positions.tolist()):
+        known = lat == lat
+        best_frames.append(dict(p, seq=e.seq, lat=lat if known else None, lon=lon if known else None))
+    lat, lon = best_frames[0]["lat"], best_frames[0]["lon"]
+    if lat is None:
+        logger.warning("[WARN] No GPS fix near the best frame, using the latest fix")
+        lat, lon = gps_service.latest() or (None, None)
+
     # Write metadata
     meta = {
         "timestamp": ts,
         "captured_at": datetime.datetime.now().isoformat(),
-        "gps": {"lat": latest_serial_data['lat'], "lon": latest_serial_data['lon']},
-        "nmea_raw": latest_serial_data['raw'],
-        "confidence": max(frames_data[0]['confidences']),
-        "bboxes": frames_data[0]['bboxes'],
+        "gps": {"lat": lat, "lon": lon},
+        "nmea_raw": gps_service.raw,
+        "confidence": max(clip.best.first_meta['confidences']),
+        "bboxes": clip.best.first_meta['bboxes'],
         "severity": None,
         "video_name": vid,
-        "s3_key": f"{date_str}/{vid}",
-        "frame_count": len(frames_data),
-        "duration_s": round(len(frames_data) / 30, 2)
+        "s3_key": f"{date_str}/{vid}" if vid else None,
+        "frame_count": clip.frame_count,
+        "duration_s": clip.duration_s,
+        "encode": clip.encode,
+        "best_frames": best_frames,
     }
+    if repeat:
+        meta["reobservation_of"] = repeat
     meta_path = os.path.join(out_dir, meta_fn)
     with open(meta_path, 'w') as f:
         json.dump(meta, f, indent=2)
     logger.info(f"[INFO] Saved metadata: {meta_fn}")
+    if ingest_client is not None:
+        ingest_client.submit(f"{date_str}/{meta_fn}", meta)
 
-    # Upload files to S3
-    for fn in (vid, meta_fn, best_clean, best_ann):
+    # Queue files for upload (the spool deletes them once uploaded)
+    files = ((vid,) if vid else ()) + (meta_fn,) + images
+    queued = True
+    for fn in files:
         lp = os.path.join(out_dir, fn)
         key = f"{date_str}/{fn}"
-        upload(lp, fn, s3_client, TIGRIS_BUCKET_NAME, key)
-
-
-
-def ping_google():
-    url = "https://www.google.com"
-    response = requests.get(url)
-    return response.status_code
-
-def upload(lp, fn, s3_client, TIGRIS_BUCKET_NAME, key):
-    if ping_google() == 200:
-        s3_client.upload_file(lp, TIGRIS_BUCKET_NAME, key)
-        os.remove(lp)
-        logger.info(f"[INFO] Uploaded {fn} to S3://{TIGRIS_BUCKET_NAME}/{key}")
-    else:
-        time.sleep(120)
-        upload(lp, fn, s3_client, TIGRIS_BUCKET_NAME, key)
-
-
+        queued = spool.enqueue(lp, key) and queued
+    return queued and (vid is not None or bool(repeat))
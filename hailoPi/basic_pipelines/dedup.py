@@ -0,0 +1,158 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from loguru import logger
+
+M_PER_DEG_LAT = 111_320.0
+
+# what to do with an event at a position reported within the window
+MODE_OFF = "off"            # record and upload everything
+MODE_SIDECAR = "sidecar"    # upload only the metadata, tagged as a re-observation
+MODE_DROP = "drop"          # don't record it at all
+MODES = (MODE_OFF, MODE_SIDECAR, MODE_DROP)
+
+
+def distance_m(lat1, lon1, lat2, lon2) -> float:
+    # equirectangular; plenty for the few tens of metres compared here
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6_371_000.0
+
+
+class RecentPotholes:
+    """
+    Positions of potholes this device reported recently, bucketed in a grid
+    of radius_m cells so a lookup only looks at the 3x3 cells around it.
+
+    check() says whether a new event is a re-observation: a report within
+    radius_m in the last window_s seconds. Entries older than the window
+    are dropped as they're met. A position only becomes a report through
+    record(), once its clip is actually saved. save() writes the index
+    atomically to a JSON file, so routes driven every day are still known
+    after a reboot.
+    """
+    def __init__(self, path: Optional[str], radius_m: float = 15.0, window_s: float = 72 * 3600, max_entries: int = 50_000):
+        self.path = path
+        self.radius_m = radius_m
+        self.window_s = window_s
+        self.max_entries = max_entries
+        self.cell_deg = radius_m / M_PER_DEG_LAT
+        self.cells = {}             # (row, col) -> [[lat, lon, ts], ...]
+        self.count = 0
+        self.events = 0
+        self.hits = 0
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lon, row=None):
+        if row is None:
+            row = math.floor(lat / self.cell_deg)
+        # columns are radius_m wide at this row's latitude
+        scale = max(math.cos(math.radians(row * self.cell_deg)), 1e-6)
+        return row, math.floor(lon * scale / self.cell_deg)
+
+    def load(self) -> "RecentPotholes":
+        if not self.path or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)["entries"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"[WARN] Ignoring unreadable dedup index {self.path}: {e}")
+            return self
+        cutoff = time.time() - self.window_s
+        for lat, lon, ts in entries:
+            if ts >= cutoff:
+                self._insert(lat, lon, ts)
+        logger.info(f"[INFO] Dedup index loaded with {self.count} recent positions")
+        return self
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with self._lock:
+            entries = [e for bucket in self.cells.values() for e in bucket]
+            self.dirty = False
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"entries": entries}, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"[ERROR] Could not save dedup index: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def check(self, lat, lon, now: Optional[float] = None):
+        """
+        Nearest report within radius_m and the window as (lat, lon, ts, distance_m), or None
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.window_s
+        row = math.floor(lat / self.cell_deg)
+        best = None
+        with self._lock:
+            for r in (row - 1, row, row + 1):
+                _, col = self._cell(lat, lon, r)
+                for c in (col - 1, col, col + 1):
+                    bucket = self.cells.get((r, c))
+                    if not bucket:
+                        continue
+                    fresh = [e for e in bucket if e[2] >= cutoff]
+                    if len(fresh) != len(bucket):
+                        self.count -= len(bucket) - len(fresh)
+                        self.dirty = True
+                        if fresh:
+                            self.cells[(r, c)] = fresh
+                        else:
+                            del self.cells[(r, c)]
+                    for e in fresh:
+                        d = distance_m(lat, lon, e[0], e[1])
+                        if d <= self.radius_m and (best is None or d < best[3]):
+                            best = (e[0], e[1], e[2], round(d, 1))
+        return best
+
+    def observe(self, lat, lon, now: Optional[float] = None):
+        """
+        Decide on a new event: returns the earlier report it repeats, or
+        None for a new pothole (record() it once its clip is saved). Counts
+        towards the hit rate.
+        """
+        hit = self.check(lat, lon, now)
+        self.events += 1
+        if hit is not None:
+            self.hits += 1
+        return hit
+
+    def record(self, lat, lon, ts: Optional[float] = None):
+        """
+        Remember a reported pothole, so events near it within the window repeat it
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self._insert(lat, lon, ts)
+
+    def _insert(self, lat, lon, ts):
+        self.cells.setdefault(self._cell(lat, lon), []).append([lat, lon, ts])
+        self.count += 1
+        self.dirty = True
+        if self.count > self.max_entries:
+            # drop the oldest bucket's oldest entry; rare, only on long trips
+            key = min(self.cells, key=lambda k: self.cells[k][0][2])
+            self.cells[key].pop(0)
+            if not self.cells[key]:
+                del self.cells[key]
+            self.count -= 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": self.count,
+            "events": self.events,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.events, 3) if self.events else 0.0,
+        }
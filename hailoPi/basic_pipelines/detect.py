@@ -1,18 +1,13 @@
-import gi
 import os
-import cv2
 import hailo
-import time
-import json
 import threading
-import serial
-import numpy as np
-import datetime
-from collections import deque
-from gi.repository import Gst, GLib
+from gi.repository import Gst
 import boto3
+from botocore.config import Config as BotoConfig
+import calibration
 import gps
-import dataCapture
+import metrics
+import pipeline
 from loguru import logger
 
 from hailo_apps_infra.hailo_rpi_common import (
@@ -31,34 +26,44 @@ Gst.init(None)
 S3_URL = os.getenv("S3_URL", "https://fly.storage.tigris.dev/")
 TIGRIS_BUCKET_NAME = os.getenv("TIGRIS_BUCKET_NAME", "pothole-images")
 
-# Initialize S3 client
+# Initialize S3 client: one client and one connection pool for every
+# upload worker and multipart part thread
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_PART_CONCURRENCY = int(os.getenv("UPLOAD_PART_CONCURRENCY", "4"))
 s3_client = boto3.client(
     's3',
     endpoint_url=S3_URL,
     aws_access_key_id=os.getenv('S3_ACCESS_KEY'),
     aws_secret_access_key=os.getenv('S3_SECRET_KEY'),
+    config=BotoConfig(
+        max_pool_connections=UPLOAD_WORKERS * UPLOAD_PART_CONCURRENCY + 2,
+        retries={"max_attempts": 2, "mode": "standard"},
+    ),
 )
 
 # --------------------------------------------
 # Global State
 # --------------------------------------------
-latest_serial_data = {"raw": "", "lat": None, "lon": None}
-latest_frame = None  # for calibration uploads
-
-FRAME_BUFFER = deque(maxlen=300)
-RECORDING = False
-LAST_DETECTION_TIME = 0
-DETECTION_TIMEOUT = 3
-
+# timestamped fixes; frames carry time.monotonic() stamps and are placed
+# by interpolating between the fixes around them
+GPS = gps.GpsService(
+    gps.FixRing(int(os.getenv("GPS_RING_SIZE", "4096"))),
+    latency_s=float(os.getenv("GPS_LATENCY_S", "0")),
+)
 OUTPUT_BASE_DIR = "cached_clips"
-os.makedirs(OUTPUT_BASE_DIR, exist_ok=True)
+PIPELINE = pipeline.EdgePipeline.from_env(OUTPUT_BASE_DIR, s3_client, TIGRIS_BUCKET_NAME, GPS)
+# reads PIPELINE.latest_frame (a ring slot, not a copy) and yields to clip uploads
+CALIBRATION = calibration.CalibrationUploader.from_env(
+    lambda: PIPELINE.latest_frame, s3_client, TIGRIS_BUCKET_NAME, PIPELINE.spool,
+)
 
 
 # --------------------------------------------
 # GStreamer Callback
 # --------------------------------------------
 def app_callback(pad, info, user_data):
-    global latest_frame, FRAME_BUFFER, RECORDING, LAST_DETECTION_TIME
+    stage = metrics.CALLBACK
+    stage.begin()
     buf = info.get_buffer()
     if buf is None:
         return Gst.PadProbeReturn.OK
@@ -71,65 +76,17 @@ def app_callback(pad, info, user_data):
     frame = get_numpy_from_buffer(buf, fmt, w, h)
     if frame is None:
         return Gst.PadProbeReturn.OK
-
-    # keep raw and latest for calibration
-    raw = frame.copy()
-    latest_frame = raw.copy()
-
-    # prepare annotated copy
-    ann = frame.copy()
+    stage.mark("map")
 
     dets = hailo.get_roi_from_buffer(buf).get_objects_typed(hailo.HAILO_DETECTION)
-    centers, confs, boxes = [], [], []
-    pothole_detected = False
-
+    detections = []
     for det in dets:
-        if det.get_class_id() == 1:
-            pothole_detected = True
         b = det.get_bbox()
-        boxes.append({
-            'xmin': b.xmin(), 'ymin': b.ymin(),
-            'xmax': b.xmax(), 'ymax': b.ymax()
-        })
-        centers.append((b.ymin() + b.ymax()) / 2.0)
-        confs.append(det.get_confidence())
-
-    # draw annotations
-    for box in boxes:
-        x0, y0 = int(box['xmin']*w), int(box['ymin']*h)
-        x1, y1 = int(box['xmax']*w), int(box['ymax']*h)
-        cv2.rectangle(ann, (x0,y0), (x1,y1), (0,255,0), 2)
-    if confs:
-        cv2.putText(ann, f"Conf: {max(confs):.2f}", (10,30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
-
-    now = time.time()
-    if pothole_detected:
-        LAST_DETECTION_TIME = now
-        if not RECORDING:
-            RECORDING = True
-            FRAME_BUFFER.clear()
-            logger.info("[INFO] Recording started")
-        FRAME_BUFFER.append({
-            'clean_frame': raw,
-            'annotated_frame': ann,
-            'y_centers': centers,
-            'confidences': confs,
-            'bboxes': boxes
-        })
-    elif RECORDING and (now - LAST_DETECTION_TIME > DETECTION_TIMEOUT):
-        RECORDING = False
-        logger.info("[INFO] Detection ended, saving clip")
-        threading.Thread(
-            target=dataCapture.save_clip_and_metadata,
-            args=(list(FRAME_BUFFER),
-                  s3_client,
-                  OUTPUT_BASE_DIR,
-                  TIGRIS_BUCKET_NAME,
-                  latest_serial_data),
-            daemon=True
-        ).start()
+        detections.append((det.get_class_id(), det.get_confidence(), (b.xmin(), b.ymin(), b.xmax(), b.ymax())))
+    stage.mark("convert")
 
+    PIPELINE.on_frame(frame, detections)
+    stage.end()
 
     return Gst.PadProbeReturn.OK
 
@@ -138,7 +95,16 @@ def app_callback(pad, info, user_data):
 # --------------------------------------------
 if __name__ == "__main__":
     logger.debug("[DEBUG] Starting application")
-    threading.Thread(target=gps.read_serial,args=(latest_serial_data,), daemon=True).start()
+    if os.getenv("GPS_REPLAY"):
+        # drive the pipeline with a recorded NMEA log instead of the UART
+        threading.Thread(target=GPS.replay, args=(os.getenv("GPS_REPLAY"),),
+                         kwargs={"realtime": True}, name="gps-replay", daemon=True).start()
+    else:
+        GPS.start(gps.serial_lines(os.getenv("GPS_PORT", "/dev/serial0")))
     logger.debug("[DEBUG] Serial reader started")
+    PIPELINE.start()
+    metrics.start_from_env()
+    if os.getenv("CALIB_ENABLED", "1") == "1":
+        CALIBRATION.start()
     app = GStreamerDetectionApp(app_callback, app_callback_class())
     app.run()
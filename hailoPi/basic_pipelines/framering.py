@@ -0,0 +1,62 @@
+import numpy as np
+from typing import Optional
+
+
+class FrameRing:
+    """
+    Fixed ring of preallocated frame buffers filled by the GStreamer callback.
+
+    push() is the only copy a frame ever gets: out of the recycled GStreamer
+    buffer into the next slot. Everyone else holds the returned sequence
+    number and reads the slot by reference; a slot's sequence number is
+    cleared while it is being overwritten, so readers can tell when a frame
+    they were promised is gone.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self.frames: Optional[np.ndarray] = None      # (size, h, w, c), allocated on first frame
+        self.seqs = np.full(size, -1, dtype=np.int64)
+        self.meta = [None] * size
+        self.next_seq = 0
+
+    def push(self, frame: np.ndarray, meta) -> int:
+        if self.frames is None or self.frames.shape[1:] != frame.shape or self.frames.dtype != frame.dtype:
+            self.frames = np.empty((self.size,) + frame.shape, dtype=frame.dtype)
+            self.seqs[:] = -1
+        seq = self.next_seq
+        slot = seq % self.size
+        self.seqs[slot] = -1
+        np.copyto(self.frames[slot], frame)
+        self.meta[slot] = meta
+        self.seqs[slot] = seq
+        self.next_seq = seq + 1
+        return seq
+
+    def is_live(self, seq: int) -> bool:
+        return self.seqs[seq % self.size] == seq
+
+    def view(self, seq: int) -> Optional[np.ndarray]:
+        """
+        Reference to the slot holding seq (valid until the ring wraps), or None
+        """
+        if self.frames is None or not self.is_live(seq):
+            return None
+        return self.frames[seq % self.size]
+
+    def get_meta(self, seq: int):
+        slot = seq % self.size
+        meta = self.meta[slot]
+        return meta if self.seqs[slot] == seq else None
+
+    def read(self, seq: int, out: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Copy frame seq into out; None if it was (or got) overwritten
+        """
+        src = self.view(seq)
+        if src is None:
+            return None
+        np.copyto(out, src)
+        return out if self.is_live(seq) else None
+
+    def latest(self) -> Optional[np.ndarray]:
+        return self.view(self.next_seq - 1) if self.next_seq else None
@@ -1,30 +1,270 @@
-import serial
+import threading
 import time
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
 from loguru import logger
-# Open UART port
+
+
 # --------------------------------------------
-# Serial Reader Thread
+# NMEA parsing
 # --------------------------------------------
-def read_serial(latest_serial_data):
-    logger.debug("[DEBUG] Serial reader thread starting")
+def _coord(value: str, hemi: str, deg_digits: int) -> float:
+    deg = float(value[:deg_digits]) + float(value[deg_digits:]) / 60.0
+    return -deg if hemi in ('S', 'W') else deg
+
+
+def _utc_seconds(hhmmss: str) -> Optional[float]:
+    if len(hhmmss) < 6:
+        return None
+    return int(hhmmss[:2]) * 3600 + int(hhmmss[2:4]) * 60 + float(hhmmss[4:])
+
+
+def parse_nmea(line: str) -> Optional[Tuple[float, float, Optional[float]]]:
+    """
+    (lat, lon, utc seconds of day) from a GGA/RMC sentence with a valid
+    fix, any talker ($GP, $GN, ...); None for anything else
+    """
+    if not line.startswith('$') or len(line) < 7:
+        return None
+    if '*' in line:
+        body, _, checksum = line[1:].partition('*')
+        calc = 0
+        for ch in body:
+            calc ^= ord(ch)
+        try:
+            if calc != int(checksum[:2], 16):
+                return None
+        except ValueError:
+            return None
+        line = '$' + body
+    parts = line.split(',')
+    kind = parts[0][3:]
     try:
-        ser = serial.Serial("/dev/serial0", 9600, timeout=1)
-        while True:
-            line = ser.readline().decode('ascii', errors='ignore').strip()
-            if line.startswith("$GPGGA") or line.startswith("$GPRMC"):
-                latest_serial_data["raw"] = line
-                parts = line.split(',')
-                if line.startswith("$GPRMC") and parts[2] == 'A':
-                    lat = float(parts[3][:2]) + float(parts[3][2:]) / 60.0
-                    if parts[4] == 'S': lat = -lat
-                    lon = float(parts[5][:3]) + float(parts[5][3:]) / 60.0
-                    if parts[6] == 'W': lon = -lon
-                    latest_serial_data.update({"lat": lat, "lon": lon})
-                elif line.startswith("$GPGGA") and parts[6] != '0':
-                    lat = float(parts[2][:2]) + float(parts[2][2:]) / 60.0
-                    if parts[3] == 'S': lat = -lat
-                    lon = float(parts[4][:3]) + float(parts[4][3:]) / 60.0
-                    if parts[5] == 'W': lon = -lon
-                    latest_serial_data.update({"lat": lat, "lon": lon})
-    except Exception as e:
-        logger.error(f"[ERROR] Serial thread error: {e}")
+        if kind == 'RMC' and len(parts) > 6 and parts[2] == 'A':
+            return _coord(parts[3], parts[4], 2), _coord(parts[5], parts[6], 3), _utc_seconds(parts[1])
+        if kind == 'GGA' and len(parts) > 6 and parts[6] not in ('', '0'):
+            return _coord(parts[2], parts[3], 2), _coord(parts[4], parts[5], 3), _utc_seconds(parts[1])
+    except ValueError:
+        return None
+    return None
+
+
+# --------------------------------------------
+# Fix ring
+# --------------------------------------------
+class FixRing:
+    """
+    Last `size` fixes in preallocated arrays, stamped with time.monotonic().
+
+    One writer thread appends; readers look fixes up from the pipeline
+    threads. A small lock keeps a reader from seeing a slot the writer is
+    halfway through overwriting: fixes arrive a few times a second and a
+    lookup holds it for microseconds, so nobody waits on it in practice.
+    Timestamps only increase, so a lookup is a binary search over the ring.
+    """
+    def __init__(self, size: int = 4096, max_gap_s: float = 5.0, max_age_s: float = 2.0):
+        self.size = size
+        self.max_gap_s = max_gap_s      # don't interpolate across a longer outage
+        self.max_age_s = max_age_s      # how far past the ends a fix is still used
+        self.t = np.zeros(size, dtype=np.float64)
+        self.lat = np.zeros(size, dtype=np.float64)
+        self.lon = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def append(self, t: float, lat: float, lon: float) -> bool:
+        """
+        Writer only. Fixes that don't move time forward are ignored.
+        """
+        with self._lock:
+            n = self.count
+            if n and t <= self.t[(n - 1) % self.size]:
+                return False
+            slot = n % self.size
+            self.t[slot] = t
+            self.lat[slot] = lat
+            self.lon[slot] = lon
+            self.count = n + 1
+            return True
+
+    def latest(self) -> Optional[Tuple[float, float, float]]:
+        with self._lock:
+            n = self.count
+            if not n:
+                return None
+            slot = (n - 1) % self.size
+            return self.t[slot], self.lat[slot], self.lon[slot]
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Consistent time-ordered copy of the buffered fixes
+        """
+        with self._lock:
+            n = self.count
+            idx = np.arange(max(0, n - self.size), n) % self.size
+            return self.t[idx], self.lat[idx], self.lon[idx]
+
+    def position_at(self, t: float) -> Optional[Tuple[float, float]]:
+        """
+        Position at monotonic time t, interpolated between the fixes around
+        it; None when there is no fix close enough
+        """
+        with self._lock:
+            n = self.count
+            if not n:
+                return None
+            lo = max(0, n - self.size)
+            a, b = lo, n               # first logical index with time > t, in [lo, n]
+            while a < b:
+                mid = (a + b) // 2
+                if self.t[mid % self.size] <= t:
+                    a = mid + 1
+                else:
+                    b = mid
+            return self._interpolate(a, lo, n, t)
+
+    def _interpolate(self, i, lo, n, t):
+        s = self.size
+        if i == lo:                         # before the oldest fix
+            j = lo % s
+            return (self.lat[j], self.lon[j]) if self.t[j] - t <= self.max_age_s else None
+        j = (i - 1) % s
+        if i == n:                          # after the newest fix
+            return (self.lat[j], self.lon[j]) if t - self.t[j] <= self.max_age_s else None
+        k = i % s
+        t0, t1 = self.t[j], self.t[k]
+        if t1 - t0 > self.max_gap_s:
+            # outage: only trust whichever fix is close in time
+            if t - t0 <= self.max_age_s:
+                return self.lat[j], self.lon[j]
+            if t1 - t <= self.max_age_s:
+                return self.lat[k], self.lon[k]
+            return None
+        w = (t - t0) / (t1 - t0)
+        return (
+            self.lat[j] + w * (self.lat[k] - self.lat[j]),
+            self.lon[j] + w * (self.lon[k] - self.lon[j]),
+        )
+
+    def positions_at(self, ts) -> np.ndarray:
+        """
+        Vectorised position_at for many timestamps: (m, 2) lat/lon, NaN where unknown
+        """
+        ts = np.asarray(ts, dtype=np.float64)
+        out = np.full((len(ts), 2), np.nan)
+        t, lat, lon = self.snapshot()
+        if not len(t):
+            return out
+        i = np.searchsorted(t, ts, side='right')
+        j, k = np.clip(i - 1, 0, len(t) - 1), np.clip(i, 0, len(t) - 1)
+        t0, t1 = t[j], t[k]
+        span = t1 - t0
+        w = np.divide(ts - t0, span, out=np.zeros_like(ts), where=span > 0)
+        out[:, 0] = lat[j] + w * (lat[k] - lat[j])
+        out[:, 1] = lon[j] + w * (lon[k] - lon[j])
+        inside = (i > 0) & (i < len(t)) & (span <= self.max_gap_s)
+        # ends and outages: nearest fix if it is recent enough
+        near_j = ~inside & (i > 0) & (ts - t0 <= self.max_age_s)
+        near_k = ~inside & ~near_j & (i < len(t)) & (t1 - ts <= self.max_age_s)
+        out[near_j] = np.column_stack([lat[j], lon[j]])[near_j]
+        out[near_k] = np.column_stack([lat[k], lon[k]])[near_k]
+        out[~(inside | near_j | near_k)] = np.nan
+        return out
+
+
+# --------------------------------------------
+# Readers
+# --------------------------------------------
+def serial_lines(port: str = "/dev/serial0", baud: int = 9600) -> Iterator[str]:
+    import serial   # only needed on the device; replays work without pyserial
+    ser = serial.Serial(port, baud, timeout=1)
+    while True:
+        yield ser.readline().decode('ascii', errors='ignore').strip()
+
+
+def nmea_file_lines(path: str) -> Iterator[str]:
+    with open(path, errors='ignore') as f:
+        for line in f:
+            yield line.strip()
+
+
+class GpsService:
+    """
+    Reads NMEA sentences from a source (the UART or a log file) into a
+    FixRing. Each fix is stamped with clock() on arrival, minus latency_s
+    for the time the receiver took to send it.
+
+    replay() feeds a log file without a serial port: fixes are stamped from
+    the sentences' own UTC times (offset to start at t0), optionally paced
+    in real time, so recorded drives can be replayed against the pipeline.
+    """
+    def __init__(self, ring: Optional[FixRing] = None, clock: Callable[[], float] = time.monotonic, latency_s: float = 0.0):
+        self.ring = ring or FixRing()
+        self.clock = clock
+        self.latency_s = latency_s
+        self.raw = ""               # last accepted sentence, for the sidecar
+        self.parsed = 0
+        self._last_utc = None
+
+    def feed(self, line: str, t: Optional[float] = None) -> bool:
+        fix = parse_nmea(line)
+        if fix is None:
+            return False
+        lat, lon, utc = fix
+        if utc is not None and utc == self._last_utc:
+            return False            # GGA and RMC for the same epoch
+        self._last_utc = utc
+        t = (self.clock() - self.latency_s) if t is None else t
+        if self.ring.append(t, lat, lon):
+            self.raw = line
+            self.parsed += 1
+            return True
+        return False
+
+    def run(self, lines: Iterable[str]):
+        logger.debug("[DEBUG] GPS reader starting")
+        try:
+            for line in lines:
+                if line:
+                    self.feed(line)
+        except Exception as e:
+            logger.error(f"[ERROR] GPS reader error: {e}")
+
+    def start(self, lines: Iterable[str]) -> threading.Thread:
+        thread = threading.Thread(target=self.run, args=(lines,), name="gps-reader", daemon=True)
+        thread.start()
+        return thread
+
+    def replay(self, path: str, t0: Optional[float] = None, realtime: bool = False) -> int:
+        """
+        Feed an NMEA log; returns the number of fixes stored
+        """
+        t0 = self.clock() if t0 is None else t0
+        first = prev = None
+        day = 0.0
+        for line in nmea_file_lines(path):
+            fix = parse_nmea(line)
+            if fix is None or fix[2] is None:
+                continue
+            utc = fix[2]
+            if prev is not None and utc < prev - 43200:     # passed midnight
+                day += 86400.0
+            prev = utc
+            utc += day
+            if first is None:
+                first = utc
+            t = t0 + (utc - first)
+            if realtime:
+                wait = t - self.clock()
+                if wait > 0:
+                    time.sleep(wait)
+            self.feed(line, t)
+        return self.parsed
+
+    def position_at(self, t: float) -> Optional[Tuple[float, float]]:
+        return self.ring.position_at(t)
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        fix = self.ring.latest()
+        return None if fix is None else (fix[1], fix[2])
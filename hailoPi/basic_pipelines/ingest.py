@@ -0,0 +1,210 @@
+import collections
+import gzip
+import json
+import os
+import socket
+import threading
+import time
+from typing import Optional
+
+import urllib3
+from loguru import logger
+
+import metrics
+
+# send() outcomes
+SENT, OFFLINE, FAILED = range(3)
+
+
+class IngestClient:
+    """
+    Pushes sidecars straight to the dashboard's POST /api/ingest, so a
+    detection is on the map seconds after its clip is saved instead of
+    after the next bucket scan.
+
+    submit() only appends to an in-memory batch; one thread sends it,
+    gzipped, when batch_size sidecars are waiting or the oldest has
+    waited max_delay_s, over a single keep-alive connection. Failed
+    batches are retried with backoff: indefinitely while the server is
+    unreachable, max_attempts times when it answers with an error. Past
+    max_pending the oldest waiting sidecars are dropped. That loses
+    nothing for good: every sidecar is also uploaded to the bucket by the
+    spool, where the dashboard's sync picks it up, and the server ignores
+    ones it has already seen.
+    """
+    def __init__(
+        self,
+        url: str,
+        device_id: str,
+        token: Optional[str] = None,
+        batch_size: int = 20,
+        max_delay_s: float = 2.0,
+        max_pending: int = 1000,
+        timeout_s: float = 10.0,
+        base_delay_s: float = 2.0,
+        max_retry_delay_s: float = 120.0,
+        max_attempts: int = 8,
+    ):
+        self.url = url
+        self.device_id = device_id
+        self.batch_size = batch_size
+        self.max_delay_s = max_delay_s
+        self.base_delay_s = base_delay_s
+        self.max_retry_delay_s = max_retry_delay_s
+        self.max_attempts = max_attempts
+        self.headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        # one pooled connection, kept alive between batches
+        self.http = urllib3.PoolManager(maxsize=1, retries=False, timeout=urllib3.Timeout(total=timeout_s))
+        self.pending = collections.deque(maxlen=max_pending)
+        self.oldest = None              # monotonic time the oldest pending sidecar arrived
+        self.in_flight = 0              # sidecars in the batch being sent or retried
+        self.failures = 0               # consecutive failed sends, for the backoff
+        self.sent = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.given_up = 0
+        self._cond = threading.Condition()
+        self._stop = False
+
+    @classmethod
+    def from_env(cls) -> Optional["IngestClient"]:
+        """
+        A client for INGEST_URL, or None when it isn't set
+        """
+        url = os.getenv("INGEST_URL")
+        if not url:
+            return None
+        return cls(
+            url,
+            os.getenv("DEVICE_ID") or socket.gethostname(),
+            token=os.getenv("INGEST_TOKEN") or None,
+            batch_size=int(os.getenv("INGEST_BATCH_SIZE", "20")),
+            max_delay_s=float(os.getenv("INGEST_MAX_DELAY_S", "2")),
+            max_pending=int(os.getenv("INGEST_MAX_PENDING", "1000")),
+            max_attempts=int(os.getenv("INGEST_MAX_ATTEMPTS", "8")),
+        )
+
+    def start(self) -> "IngestClient":
+        threading.Thread(target=self._run, name="ingest", daemon=True).start()
+        logger.info(f"[INFO] Pushing sidecars to {self.url} as {self.device_id}")
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def submit(self, key: str, sidecar: dict):
+        """
+        Queue one sidecar; key is the bucket key it is uploaded to
+        """
+        with self._cond:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append({"key": key, "sidecar": sidecar})
+            # wake the sender to start the delay clock, or to send a full batch
+            if self.oldest is None or len(self.pending) >= self.batch_size:
+                self._cond.notify()
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+
+    def _next_batch(self) -> Optional[list]:
+        """
+        Wait for a full batch or for the oldest sidecar to be max_delay_s
+        old, and take it; None once stopped
+        """
+        with self._cond:
+            while not self._stop:
+                now = time.monotonic()
+                if self.pending and (len(self.pending) >= self.batch_size or now - self.oldest >= self.max_delay_s):
+                    break
+                self._cond.wait(self.oldest + self.max_delay_s - now if self.pending else None)
+            if self._stop:
+                return None
+            batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+            self.oldest = time.monotonic() if self.pending else None
+            self.in_flight = len(batch)
+            return batch
+
+    def _run(self):
+        batch, attempts = None, 0
+        while True:
+            if batch is None:
+                batch, attempts = self._next_batch(), 0
+                if batch is None:
+                    return
+            try:
+                outcome = self.send(batch)
+            except Exception as e:
+                # never let one bad batch or response kill the sender
+                logger.error(f"[ERROR] Sidecar push failed unexpectedly: {e}")
+                outcome = FAILED
+            if outcome == SENT:
+                batch, self.in_flight, self.failures = None, 0, 0
+                continue
+
+            self.failures += 1
+            if outcome == FAILED:
+                # offline time doesn't count; a batch the server keeps failing
+                # on must not hold back the ones behind it forever
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    self.given_up += len(batch)
+                    logger.error(
+                        f"[ERROR] Giving up pushing {len(batch)} sidecars after {attempts} attempts; "
+                        "the bucket sync will pick them up"
+                    )
+                    batch, self.in_flight = None, 0
+            delay = min(self.max_retry_delay_s, self.base_delay_s * 2 ** (self.failures - 1))
+            with self._cond:
+                if self._cond.wait_for(lambda: self._stop, delay):
+                    return
+
+    def send(self, batch) -> int:
+        """
+        POST one batch: SENT when done with it (including batches the server
+        refuses as malformed, since resending can't fix them), OFFLINE when
+        the server couldn't be reached, FAILED when it answered with an error
+        """
+        body = gzip.compress(json.dumps({"device_id": self.device_id, "sidecars": batch}).encode())
+        started = time.monotonic()
+        try:
+            resp = self.http.request("POST", self.url, body=body, headers=self.headers)
+        except urllib3.exceptions.HTTPError as e:
+            metrics.UPLOAD_FAILURES.inc(1, "ingest_offline")
+            logger.warning(f"[WARN] Sidecar push failed ({e}); retrying later")
+            return OFFLINE
+        if resp.status >= 500 or resp.status in (401, 408, 429):
+            metrics.UPLOAD_FAILURES.inc(1, "ingest_error")
+            logger.warning(f"[WARN] Sidecar push got HTTP {resp.status}; retrying later")
+            return FAILED
+        if resp.status >= 400:
+            metrics.UPLOAD_FAILURES.inc(1, "ingest_error")
+            logger.error(f"[ERROR] Server refused {len(batch)} sidecars (HTTP {resp.status}): {resp.data[:200]!r}")
+            return SENT
+
+        try:
+            result = json.loads(resp.data or b"{}")
+        except ValueError:
+            logger.warning(f"[WARN] Unexpected ingest response: {resp.data[:200]!r}")
+            result = {}
+        metrics.UPLOAD_SECONDS.observe(time.monotonic() - started, "ingest")
+        metrics.UPLOAD_BYTES.inc(len(body), "ingest")
+        self.sent += result.get("accepted", 0)
+        self.duplicates += result.get("duplicates", 0)
+        logger.info(f"[INFO] Pushed {len(batch)} sidecars ({len(body)} B): {result}")
+        return SENT
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self.pending) + self.in_flight
+        return {
+            "pending": pending,
+            "sent": self.sent,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+            "given_up": self.given_up,
+            "failures": self.failures,
+        }
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from loguru import logger
+
+from promtext import Metric, Registry
+
+# off by default; when off every observe()/mark() returns at once
+ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+
+# seconds; per-frame stages sit at the bottom, uploads at the top
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0, 30.0)
+
+
+class _Registry(Registry):
+    def collector_failed(self, fn, error):
+        logger.warning(f"[WARN] Metrics collector failed: {error}")
+
+
+REGISTRY = _Registry(ENABLED, DEFAULT_BUCKETS)
+
+CALLBACK_SECONDS = REGISTRY.histogram(
+    "edge_callback_stage_seconds", "GStreamer callback time per stage (map, convert, copy, enqueue, total)", ("stage",))
+CLIP_FRAME_SECONDS = REGISTRY.histogram(
+    "edge_clip_frame_seconds", "Clip encoder thread time per frame and stage (jpeg, read, score, annotate, write)", ("stage",))
+CLIP_ENCODE_SECONDS = REGISTRY.histogram("edge_clip_encode_seconds", "Total encoder time per finished clip")
+CLIP_FINALIZE_SECONDS = REGISTRY.histogram("edge_clip_finalize_seconds", "Time to close a clip file")
+CLIP_SAVE_SECONDS = REGISTRY.histogram("edge_clip_save_seconds", "Saver thread time per clip (images, sidecar, enqueue)")
+UPLOAD_SECONDS = REGISTRY.histogram("edge_upload_seconds", "Upload duration by spool class", ("class",))
+UPLOAD_BYTES = REGISTRY.counter("edge_upload_bytes_total", "Bytes uploaded by spool class", ("class",))
+UPLOAD_FAILURES = REGISTRY.counter("edge_upload_failures_total", "Failed upload attempts", ("reason",))
+
+
+class Stages:
+    """
+    Consecutive stage timings on one thread: begin(), then mark(stage)
+    after each stage records the time since the previous mark; end()
+    records the total. Outside begin()/end() mark() does nothing, so
+    helpers can mark stages whether or not their caller is timing; a run
+    abandoned by an early return is simply restarted by the next begin().
+    """
+    __slots__ = ("metric", "started", "last")
+
+    def __init__(self, metric: Metric):
+        self.metric = metric
+        self.started = None
+        self.last = 0.0
+
+    def begin(self):
+        self.started = self.last = time.perf_counter()
+
+    def mark(self, stage: str):
+        if self.started is None:
+            return
+        now = time.perf_counter()
+        self.metric.observe(now - self.last, stage)
+        self.last = now
+
+    def end(self):
+        if self.started is None:
+            return
+        self.metric.observe(time.perf_counter() - self.started, "total")
+        self.started = None
+
+
+class _NoStages:
+    __slots__ = ()
+
+    def begin(self):
+        pass
+
+    def mark(self, stage: str):
+        pass
+
+    def end(self):
+        pass
+
+
+_NO_STAGES = _NoStages()
+
+
+def stages(metric: Metric):
+    """
+    A Stages for metric, or a shared no-op when metrics are disabled
+    """
+    return Stages(metric) if ENABLED else _NO_STAGES
+
+
+# the GStreamer callback thread's stages (detect.py and EdgePipeline.on_frame)
+CALLBACK = stages(CALLBACK_SECONDS)
+
+
+# --------------------------------------------
+# Export
+# --------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def write_file(path: str):
+    """
+    Render atomically to path (node_exporter textfile collector format)
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+
+def start_exporter(path: Optional[str] = None, port: Optional[int] = None, interval_s: float = 15.0):
+    """
+    Serve /metrics on port and/or rewrite path every interval_s; nothing
+    starts when metrics are disabled
+    """
+    if not ENABLED:
+        return
+    if port:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"[INFO] Metrics on http://0.0.0.0:{port}/metrics")
+    if path:
+        def run():
+            while True:
+                try:
+                    write_file(path)
+                except OSError as e:
+                    logger.warning(f"[WARN] Could not write metrics to {path}: {e}")
+                time.sleep(interval_s)
+        threading.Thread(target=run, name="metrics-file", daemon=True).start()
+        logger.info(f"[INFO] Writing metrics to {path} every {interval_s:.0f}s")
+
+
+def start_from_env():
+    start_exporter(
+        path=os.getenv("METRICS_FILE") or None,
+        port=int(os.getenv("METRICS_PORT", "0")) or None,
+        interval_s=float(os.getenv("METRICS_INTERVAL_S", "15")),
+    )
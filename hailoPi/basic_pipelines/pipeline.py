@@ -0,0 +1,262 @@
+import os
+import queue
+import threading
+import time
+from typing import Iterable, Optional, Tuple
+
+from loguru import logger
+
+import clipbuffer
+import dataCapture
+import dedup
+import framering
+import gps
+import ingest
+import metrics
+import spool
+
+# (class_id, confidence, (xmin, ymin, xmax, ymax)) with normalised coordinates
+Detection = Tuple[int, float, Tuple[float, float, float, float]]
+
+NO_DETECTIONS = {'y_centers': (), 'confidences': (), 'bboxes': ()}
+POTHOLE_CLASS_ID = 1
+
+
+class EdgePipeline:
+    """
+    Everything the GStreamer callback does once the frame and detections
+    are out of the Hailo buffer: frame ring, event start/end, dedup, the
+    clip encoder, the saver thread and the upload spool.
+
+    It knows nothing about GStreamer or Hailo, so the same logic runs on
+    the device (detect.py) and from a video file with a stub detector
+    (benchmarks/replay_bench.py).
+    """
+    def __init__(
+        self,
+        output_dir: str,
+        upload_spool: spool.UploadSpool,
+        gps_service: gps.GpsService,
+        ring: framering.FrameRing,
+        recent: dedup.RecentPotholes,
+        dedup_mode: str = dedup.MODE_SIDECAR,
+        detection_timeout_s: float = 3.0,
+        clip_queue_size: int = 4,
+        clip_fps: int = 30,
+        clip_bitrate_kbps: int = 2000,
+        ingest_client: Optional[ingest.IngestClient] = None,
+        **clip_options,
+    ):
+        if dedup_mode not in dedup.MODES:
+            raise ValueError(f"DEDUP_MODE must be one of {dedup.MODES}")
+        self.output_dir = output_dir
+        self.spool = upload_spool
+        self.ingest = ingest_client
+        self.gps = gps_service
+        self.ring = ring
+        self.dedup = recent
+        self.dedup_mode = dedup_mode
+        self.detection_timeout_s = detection_timeout_s
+        self.clip_fps = clip_fps
+        self.clip_bitrate_kbps = clip_bitrate_kbps
+        self.recording = False
+        self.last_detection_time = 0.0
+        self.latest_frame = None      # for calibration uploads (a ring slot, not a copy)
+        # finished clips wait here for the single saver thread; when the spool
+        # is full the saver blocks, this fills up and further clips are dropped
+        self.clip_queue = queue.Queue(maxsize=clip_queue_size)
+        self.clips_saved = 0
+        self.clips_dropped = 0
+        self.clips_failed = 0
+        self.save_s = 0.0
+        self.clip_buffer = clipbuffer.ClipBuffer(
+            ring, on_clip=self.save_clip, open_writer=self.open_clip_writer, **clip_options,
+        )
+
+    @classmethod
+    def from_env(cls, output_dir: str, s3_client, bucket: str, gps_service: gps.GpsService) -> "EdgePipeline":
+        os.makedirs(output_dir, exist_ok=True)
+        upload_spool = spool.UploadSpool(
+            os.path.join(output_dir, "spool.db"),
+            s3_client,
+            bucket,
+            workers=int(os.getenv("UPLOAD_WORKERS", "2")),
+            max_items=int(os.getenv("SPOOL_MAX_ITEMS", "5000")),
+            max_bytes=int(os.getenv("SPOOL_MAX_MB", "4096")) * 1024 * 1024,
+            max_bytes_per_s=float(os.getenv("UPLOAD_MAX_KBPS", "0")) * 1024,
+            part_concurrency=int(os.getenv("UPLOAD_PART_CONCURRENCY", "4")),
+        )
+        # events within DEDUP_RADIUS_M of one reported in the last DEDUP_WINDOW_H
+        # hours are re-observations; DEDUP_MODE says what happens to them
+        recent = dedup.RecentPotholes(
+            os.path.join(output_dir, "dedup.json"),
+            radius_m=float(os.getenv("DEDUP_RADIUS_M", "15")),
+            window_s=float(os.getenv("DEDUP_WINDOW_H", "72")) * 3600,
+        ).load()
+        return cls(
+            output_dir,
+            upload_spool,
+            gps_service,
+            # frames live in a preallocated ring that only has to outlast the
+            # encoder queue; the clip buffer keeps them JPEG-compressed
+            framering.FrameRing(int(os.getenv("FRAME_RING_SIZE", "64"))),
+            recent,
+            dedup_mode=os.getenv("DEDUP_MODE", dedup.MODE_SIDECAR),
+            detection_timeout_s=float(os.getenv("DETECTION_TIMEOUT_S", "3")),
+            clip_queue_size=int(os.getenv("CLIP_QUEUE_SIZE", "4")),
+            clip_fps=int(os.getenv("CLIP_FPS", "30")),
+            clip_bitrate_kbps=int(os.getenv("CLIP_BITRATE_KBPS", "2000")),
+            # INGEST_URL set: sidecars are also pushed to the dashboard's /api/ingest
+            ingest_client=ingest.IngestClient.from_env(),
+            preroll_s=float(os.getenv("CLIP_PREROLL_S", "3")),
+            max_bytes=int(os.getenv("CLIP_MAX_MB", "256")) * 1024 * 1024,
+            jpeg_quality=int(os.getenv("CLIP_JPEG_QUALITY", "85")),
+            best_k=int(os.getenv("BEST_FRAME_K", "3")),
+        )
+
+    def start(self) -> "EdgePipeline":
+        metrics.REGISTRY.collector(self.gauges)
+        self.spool.start()
+        if self.ingest is not None:
+            self.ingest.start()
+        threading.Thread(target=self._clip_saver, name="clip-saver", daemon=True).start()
+        self.clip_buffer.start()
+        return self
+
+    # --- clip hand-off ---
+    def open_clip_writer(self, size, started_at):
+        return dataCapture.open_clip_writer(self.output_dir, size, started_at, self.clip_fps, self.clip_bitrate_kbps)
+
+    def save_clip(self, clip):
+        try:
+            self.clip_queue.put_nowait(clip)
+        except queue.Full:
+            self.clips_dropped += 1
+            logger.error(f"[ERROR] Saver is backed up, dropping a {len(clip)}-frame clip")
+            if clip.path and os.path.exists(clip.path):
+                os.remove(clip.path)
+
+    def _clip_saver(self):
+        while True:
+            self.save(self.clip_queue.get())
+
+    def save(self, clip):
+        """
+        Write a finished clip and queue its files. Only once that worked is
+        the pothole remembered for dedup: a clip that was dropped or failed
+        must not suppress the next drive over the same spot.
+        """
+        t = time.perf_counter()
+        saved = False
+        try:
+            saved = dataCapture.save_clip_and_metadata(clip, self.spool, self.output_dir, self.gps, self.ingest)
+        except Exception as e:
+            logger.error(f"[ERROR] Saving clip failed: {e}")
+        report = clip.event.get("report")
+        if saved and report is not None:
+            self.dedup.record(*report)
+        self.dedup.save()
+        elapsed = time.perf_counter() - t
+        self.save_s += elapsed
+        metrics.CLIP_SAVE_SECONDS.observe(elapsed)
+        if clip.encode:
+            metrics.CLIP_ENCODE_SECONDS.observe(clip.encode["encode_s"])
+            metrics.CLIP_FINALIZE_SECONDS.observe(clip.encode["finalize_ms"] / 1000)
+        if saved:
+            self.clips_saved += 1
+        else:
+            self.clips_failed += 1
+
+    # --- per frame ---
+    def start_event(self, seq, now, mono):
+        """
+        Decide once, when the event begins, whether this pothole was already
+        reported from (about) here; no GPS fix means it's treated as new
+        """
+        pos = self.gps.position_at(mono)
+        repeat = None
+        if self.dedup_mode != dedup.MODE_OFF and pos is not None:
+            repeat = self.dedup.observe(pos[0], pos[1], now)
+        if repeat is None:
+            # remembered by save() once the clip is actually queued for upload
+            event = {"report": (pos[0], pos[1], now)} if self.dedup_mode != dedup.MODE_OFF and pos is not None else None
+            self.clip_buffer.begin_event(seq, event=event)
+            logger.info("[INFO] Recording started")
+            return
+        rlat, rlon, rts, dist = repeat
+        logger.info(f"[INFO] Re-observation {dist} m from a pothole reported at {int(rts)} ({self.dedup.stats()})")
+        if self.dedup_mode == dedup.MODE_SIDECAR:
+            event = {"reobservation_of": {"timestamp": int(rts), "lat": rlat, "lon": rlon, "distance_m": dist}}
+            self.clip_buffer.begin_event(seq, video=False, event=event)
+
+    def on_frame(self, frame, detections: Iterable[Detection], now: Optional[float] = None, mono: Optional[float] = None) -> int:
+        """
+        Handle one frame; returns its ring sequence number. now is wall
+        clock (event timing, dedup), mono the frame's GPS-clock timestamp.
+        """
+        now = time.time() if now is None else now
+        mono = time.monotonic() if mono is None else mono
+        meta = NO_DETECTIONS
+        pothole_detected = False
+
+        if detections:
+            centers, confs, boxes = [], [], []
+            for class_id, confidence, (xmin, ymin, xmax, ymax) in detections:
+                if class_id == POTHOLE_CLASS_ID:
+                    pothole_detected = True
+                boxes.append({'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax})
+                centers.append((ymin + ymax) / 2.0)
+                confs.append(confidence)
+            meta = {'y_centers': centers, 'confidences': confs, 'bboxes': boxes}
+
+        # the only copy: out of the recycled GStreamer buffer into a ring slot.
+        # Annotations are drawn later, and only for frames that get saved.
+        seq = self.ring.push(frame, meta)
+        self.latest_frame = self.ring.view(seq)
+        metrics.CALLBACK.mark("copy")
+
+        if pothole_detected:
+            self.last_detection_time = now
+            if not self.recording:
+                self.recording = True
+                self.start_event(seq, now, mono)
+        elif self.recording and (now - self.last_detection_time > self.detection_timeout_s):
+            self.recording = False
+            self.clip_buffer.end_event(seq)
+            logger.info("[INFO] Detection ended, saving clip")
+        self.clip_buffer.push(seq, mono)
+        metrics.CALLBACK.mark("enqueue")
+        return seq
+
+    def gauges(self):
+        """
+        Occupancy and drop counts for the metrics endpoint
+        """
+        st = self.stats()
+        cb, sp = st["clip_buffer"], st["spool"]
+        yield "edge_clip_buffer_frames", "Pre-roll frames held", cb["frames"]
+        yield "edge_clip_buffer_bytes", "Pre-roll JPEG bytes held", cb["bytes"]
+        yield "edge_clip_queue_frames", "Frames waiting for the clip encoder", cb["queued"]
+        yield "edge_dropped_frames", "Frames never encoded since start", cb["dropped"]
+        yield "edge_recording", "1 while an event is being recorded", int(cb["recording"])
+        yield "edge_saver_queue_clips", "Finished clips waiting for the saver", self.clip_queue.qsize()
+        yield "edge_clips_saved", "Clips saved since start", st["clips_saved"]
+        yield "edge_clips_dropped", "Clips dropped because the saver was backed up", st["clips_dropped"]
+        yield "edge_clips_failed", "Clips that could not be saved or queued", st["clips_failed"]
+        yield "edge_spool_depth", "Files waiting to upload", sp["depth"]
+        yield "edge_spool_bytes", "Bytes waiting to upload", sp["bytes"]
+        yield "edge_upload_online", "1 while the upload link is up", int(sp["online"])
+        if self.ingest is not None:
+            yield "edge_ingest_pending", "Sidecars waiting to be pushed", st["ingest"]["pending"]
+
+    def stats(self) -> dict:
+        return {
+            "clip_buffer": self.clip_buffer.stats(),
+            "clips_saved": self.clips_saved,
+            "clips_dropped": self.clips_dropped,
+            "clips_failed": self.clips_failed,
+            "save_s": round(self.save_s, 3),
+            "spool": self.spool.stats(),
+            "dedup": self.dedup.stats(),
+            "ingest": self.ingest.stats() if self.ingest is not None else None,
+        }
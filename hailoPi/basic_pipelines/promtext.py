@@ -0,0 +1,129 @@
+"""
+Prometheus text format counters, histograms and render-time gauges,
+small enough not to need prometheus_client on the device.
+
+The dashboard vendors a copy as flask-app/services/promtext.py; this one
+is the original. basic_pipelines/metrics.py defines the edge metrics on top.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+# (name, help, value) gauges, read when the metrics are rendered
+Collector = Callable[[], Iterable[Tuple[str, str, float]]]
+
+
+def _labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+
+class _Child:
+    __slots__ = ("value", "counts", "sum", "lock")
+
+    def __init__(self, n_buckets: int = 0):
+        self.value = 0.0
+        self.counts = [0] * (n_buckets + 1)     # last one is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+
+class Metric:
+    """
+    A counter or histogram family; label values pick the child, e.g.
+    UPLOAD_SECONDS.observe(0.8, "video")
+    """
+    def __init__(self, registry: "Registry", kind: str, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = ()):
+        self.registry = registry
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets) if kind == "histogram" else ()
+        self.children: Dict[Tuple, _Child] = {}
+        self._lock = threading.Lock()
+
+    def _child(self, values: Tuple) -> _Child:
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(values, _Child(len(self.buckets)))
+        return child
+
+    def inc(self, amount: float = 1, *labels):
+        if not self.registry.enabled:
+            return
+        child = self._child(labels)
+        with child.lock:
+            child.value += amount
+
+    def observe(self, value: float, *labels):
+        if not self.registry.enabled:
+            return
+        child = self._child(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with child.lock:
+            child.counts[i] += 1
+            child.sum += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, c in sorted(self.children.items()):
+            with c.lock:
+                counts, total, value = list(c.counts), c.sum, c.value
+            if self.kind == "counter":
+                yield f"{self.name}{_labels(self.label_names, values)} {value}"
+                continue
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_labels(self.label_names + ('le',), values + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, values)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, values)} {cumulative}"
+
+
+class Registry:
+    """
+    Every metric of the process. Disabled, inc() and observe() return at
+    once, so instrumentation costs next to nothing.
+    """
+    def __init__(self, enabled: bool, buckets: Sequence[float]):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)       # histogram default
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Metric:
+        return self.metrics.setdefault(name, Metric(self, "counter", name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Optional[Sequence[float]] = None) -> Metric:
+        return self.metrics.setdefault(name, Metric(self, "histogram", name, help, labels, buckets or self.buckets))
+
+    def collector(self, fn: Collector):
+        """
+        Gauges computed at render time (queue depths, ratios), so they
+        cost nothing in between
+        """
+        self.collectors.append(fn)
+
+    def collector_failed(self, fn: Collector, error: Exception):
+        """
+        Called when a collector raises; its gauges are left out
+        """
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        for fn in self.collectors:
+            try:
+                gauges = [(name, help, float(value)) for name, help, value in fn()]
+            except Exception as e:
+                self.collector_failed(fn, e)
+                continue
+            for name, help, value in gauges:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
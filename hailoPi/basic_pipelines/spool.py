@@ -0,0 +1,375 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+from loguru import logger
+
+import metrics
+
+# failures that mean "the link is down", not "this file is bad"
+OFFLINE_ERRORS = (
+    EndpointConnectionError,
+    ConnectTimeoutError,
+    ReadTimeoutError,
+    ConnectionClosedError,
+    ConnectionError,
+    TimeoutError,
+)
+# S3 error codes no retry can fix: the file is parked instead of retried
+PERMANENT_ERROR_CODES = {
+    "AccessDenied",
+    "AllAccessDisabled",
+    "InvalidAccessKeyId",
+    "InvalidBucketName",
+    "NoSuchBucket",
+    "SignatureDoesNotMatch",
+}
+
+# lower runs first: the dashboard learns about a pothole from its sidecar
+PRIORITY_SIDECAR, PRIORITY_BEST_FRAME, PRIORITY_VIDEO, PRIORITY_OTHER = range(4)
+CLASS_NAMES = {
+    PRIORITY_SIDECAR: "sidecar",
+    PRIORITY_BEST_FRAME: "best_frame",
+    PRIORITY_VIDEO: "video",
+    PRIORITY_OTHER: "other",
+}
+
+
+def error_code(error: BaseException) -> Optional[str]:
+    """
+    S3 error code of a ClientError, also when wrapped (upload_file raises
+    S3UploadFailedError from it)
+    """
+    while error is not None:
+        if isinstance(error, ClientError):
+            return error.response.get("Error", {}).get("Code")
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def priority_for(path: str) -> int:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        return PRIORITY_SIDECAR
+    if ext in ('.jpg', '.jpeg', '.png', '.webp'):
+        return PRIORITY_BEST_FRAME
+    if ext in ('.avi', '.mp4', '.mkv', '.h264'):
+        return PRIORITY_VIDEO
+    return PRIORITY_OTHER
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every transfer thread; consume() sleeps the
+    caller just long enough to hold the configured average rate
+    """
+    def __init__(self, bytes_per_s: float, burst_s: float = 1.0):
+        self.rate = bytes_per_s
+        self.burst = bytes_per_s * burst_s
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n: int):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    path         TEXT NOT NULL,
+    key          TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    priority     INTEGER NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    claimed      INTEGER NOT NULL DEFAULT 0,
+    parked       INTEGER NOT NULL DEFAULT 0,
+    created      REAL NOT NULL,
+    last_error   TEXT
+);
+"""
+INDEX = "CREATE INDEX IF NOT EXISTS uploads_next ON uploads (parked, claimed, priority, next_attempt)"
+
+
+class UploadSpool:
+    """
+    Durable upload queue kept in SQLite next to the cached clips.
+
+    Every file to upload is a row, so pending uploads survive reboots.
+    A fixed pool of workers drains it in priority order (sidecar JSON,
+    then best frames, then video); the first express_workers never pick
+    up video, so a long clip upload can't hold back a sidecar. Large
+    files go up as concurrent multipart transfers, and all transfers
+    share one bandwidth cap. Failures back off exponentially with jitter,
+    and connection-level failures pause every worker (the link is down)
+    instead of pinging some external host first.
+    A file that failed max_attempts times while online, or with an error
+    no retry can fix (AccessDenied, NoSuchBucket ...), is parked: kept on
+    disk but no longer retried or counted against the limits until the
+    next start, when parked files get another chance.
+    enqueue() blocks while the spool is over its item/byte limits.
+    """
+    def __init__(
+        self,
+        db_path: str,
+        s3_client,
+        bucket: str,
+        workers: int = 2,
+        max_items: int = 5000,
+        max_bytes: int = 4 * 1024 ** 3,
+        base_delay_s: float = 2.0,
+        max_delay_s: float = 600.0,
+        max_attempts: int = 10,
+        express_workers: int = 1,
+        max_bytes_per_s: float = 0,
+        multipart_chunk_bytes: int = 8 * 1024 * 1024,
+        part_concurrency: int = 4,
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.workers = max(workers, express_workers + 1)
+        self.express_workers = express_workers
+        self.limiter = RateLimiter(max_bytes_per_s)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_chunk_bytes,
+            multipart_chunksize=multipart_chunk_bytes,
+            max_concurrency=part_concurrency,
+            use_threads=part_concurrency > 1,
+        )
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.max_attempts = max_attempts
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.execute(INDEX)
+        # rows claimed by a worker when the process died are pending again,
+        # and parked ones get another go (credentials or bucket may be fixed)
+        self._db.execute("UPDATE uploads SET claimed = 0 WHERE claimed = 1")
+        self._db.execute("UPDATE uploads SET parked = 0, attempts = 0 WHERE parked = 1")
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+        self.online = True
+        self._offline_failures = 0
+        self._resume_at = 0.0
+        self.uploaded = 0
+        self.failed = 0
+        # per class: files, bytes and seconds spent uploading
+        self.done = {p: {"files": 0, "bytes": 0, "seconds": 0.0} for p in CLASS_NAMES}
+        self._threads = []
+
+    def start(self) -> "UploadSpool":
+        for i in range(self.workers):
+            max_priority = PRIORITY_BEST_FRAME if i < self.express_workers else PRIORITY_OTHER
+            t = threading.Thread(target=self._run, args=(max_priority,), name=f"upload-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    # --- producers ---
+    def enqueue(self, path: str, key: str, timeout: Optional[float] = None, priority: Optional[int] = None) -> bool:
+        """
+        Add a file; waits while the spool is full. False if still full after timeout.
+        priority defaults to the class implied by the file extension.
+        """
+        size = os.path.getsize(path)
+        if priority is None:
+            priority = priority_for(path)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._over_limit(size):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    logger.error(f"[ERROR] Upload spool full, not queueing {key}")
+                    return False
+                self._cond.wait(remaining if remaining is not None else 5.0)
+            self._db.execute(
+                "INSERT INTO uploads (path, key, size, priority, created) VALUES (?, ?, ?, ?, ?)",
+                (path, key, size, priority, time.time()),
+            )
+            self._cond.notify_all()
+        return True
+
+    def _over_limit(self, size: int) -> bool:
+        count, total = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM uploads WHERE parked = 0"
+        ).fetchone()
+        # an empty spool always accepts, even a file above max_bytes
+        return count > 0 and (count >= self.max_items or total + size > self.max_bytes)
+
+    def stats(self) -> dict:
+        """
+        Overall and per-class queue depth and upload throughput
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT priority, COUNT(*), COALESCE(SUM(size), 0) FROM uploads WHERE parked = 0 GROUP BY priority"
+            ).fetchall()
+            parked = self._db.execute("SELECT COUNT(*) FROM uploads WHERE parked = 1").fetchone()[0]
+            done = {p: dict(d) for p, d in self.done.items()}
+        queued = {p: (n, b) for p, n, b in rows}
+        classes = {}
+        for p, name in CLASS_NAMES.items():
+            n, b = queued.get(p, (0, 0))
+            d = done[p]
+            classes[name] = {
+                "depth": n,
+                "queued_bytes": b,
+                "uploaded": d["files"],
+                "uploaded_bytes": d["bytes"],
+                "bytes_per_s": round(d["bytes"] / d["seconds"], 1) if d["seconds"] else 0.0,
+            }
+        return {
+            "depth": sum(n for n, _ in queued.values()),
+            "bytes": sum(b for _, b in queued.values()),
+            "online": self.online,
+            "uploaded": self.uploaded,
+            "failed_attempts": self.failed,
+            "parked": parked,
+            "classes": classes,
+        }
+
+    # --- workers ---
+    def _claim(self, max_priority: int):
+        """
+        Next due row up to max_priority, marked claimed; None after waiting
+        if nothing is due
+        """
+        with self._cond:
+            now = time.time()
+            if now < self._resume_at:
+                self._cond.wait(self._resume_at - now)
+                return None
+            row = self._db.execute(
+                "SELECT id, path, key, attempts, priority, size FROM uploads "
+                "WHERE parked = 0 AND claimed = 0 AND priority <= ? AND next_attempt <= ? ORDER BY priority, id LIMIT 1",
+                (max_priority, now),
+            ).fetchone()
+            if row is None:
+                nxt = self._db.execute(
+                    "SELECT MIN(next_attempt) FROM uploads WHERE parked = 0 AND claimed = 0 AND priority <= ?",
+                    (max_priority,),
+                ).fetchone()[0]
+                self._cond.wait(min(5.0, max(0.05, nxt - now)) if nxt else 5.0)
+                return None
+            self._db.execute("UPDATE uploads SET claimed = 1 WHERE id = ?", (row[0],))
+            return row
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay_s, self.base_delay_s * (2 ** attempts))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _upload(self, path: str, key: str):
+        self.s3_client.upload_file(
+            path, self.bucket, key,
+            Config=self.transfer_config,
+            Callback=self.limiter.consume,
+        )
+
+    def _run(self, max_priority: int):
+        while True:
+            row = self._claim(max_priority)
+            if row is None:
+                continue
+            row_id, path, key, attempts, priority, size = row
+            started = time.monotonic()
+            try:
+                self._upload(path, key)
+            except FileNotFoundError:
+                logger.error(f"[ERROR] {path} vanished before upload, dropping it from the spool")
+                self._finish(row_id)
+                continue
+            except OFFLINE_ERRORS as e:
+                metrics.UPLOAD_FAILURES.inc(1, "offline")
+                self._retry(row_id, attempts, e, offline=True)
+                continue
+            except (S3UploadFailedError, ClientError, OSError) as e:
+                if error_code(e) in PERMANENT_ERROR_CODES or attempts + 1 >= self.max_attempts:
+                    metrics.UPLOAD_FAILURES.inc(1, "parked")
+                    self._park(row_id, key, e)
+                else:
+                    metrics.UPLOAD_FAILURES.inc(1, "error")
+                    self._retry(row_id, attempts, e, offline=False)
+                continue
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._finish(row_id)
+            elapsed = time.monotonic() - started
+            name = CLASS_NAMES.get(priority, "other")
+            metrics.UPLOAD_SECONDS.observe(elapsed, name)
+            metrics.UPLOAD_BYTES.inc(size, name)
+            with self._lock:
+                self.uploaded += 1
+                done = self.done[priority if priority in self.done else PRIORITY_OTHER]
+                done["files"] += 1
+                done["bytes"] += size
+                done["seconds"] += elapsed
+                if not self.online:
+                    logger.info("[INFO] Upload link is back")
+                self.online = True
+                self._offline_failures = 0
+            logger.info(f"[INFO] Uploaded {os.path.basename(path)} to S3://{self.bucket}/{key}")
+
+    def _finish(self, row_id: int):
+        with self._cond:
+            self._db.execute("DELETE FROM uploads WHERE id = ?", (row_id,))
+            self._cond.notify_all()   # wake producers waiting on a full spool
+
+    def _park(self, row_id: int, key: str, error: Exception):
+        with self._cond:
+            self.failed += 1
+            self._db.execute(
+                "UPDATE uploads SET claimed = 0, parked = 1, attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (str(error)[:500], row_id),
+            )
+            self._cond.notify_all()   # no longer counts against the limits
+        logger.error(f"[ERROR] Giving up on {key} ({error}); parked until the next start")
+
+    def _retry(self, row_id: int, attempts: int, error: Exception, offline: bool):
+        delay = self._backoff(attempts)
+        with self._cond:
+            self.failed += 1
+            if offline:
+                # pause every worker, not just this row
+                self._offline_failures += 1
+                pause = self._backoff(self._offline_failures - 1)
+                self._resume_at = max(self._resume_at, time.time() + pause)
+                if self.online:
+                    logger.warning(f"[WARN] Upload link down ({error}); pausing uploads")
+                self.online = False
+            # time offline doesn't count towards max_attempts
+            self._db.execute(
+                "UPDATE uploads SET claimed = 0, attempts = attempts + ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                (0 if offline else 1, time.time() + delay, str(error)[:500], row_id),
+            )
+        logger.warning(f"[WARN] Upload attempt {attempts + 1} failed ({error}); retrying in {delay:.0f}s")
@@ -0,0 +1,85 @@
+"""
+Compare the vectorised YoloDecoder with the per-row Python loop that
+pothole/stream.py used, on synthetic YOLO outputs (8400 candidates per
+640x640 image, a few dozen above threshold around some potholes).
+
+    python benchmarks/decode_bench.py [batch ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "pothole"))
+
+import numpy as np
+
+from decode import YoloDecoder, load_config
+
+N_CANDIDATES = 8400
+IMG_W, IMG_H = 1280, 720
+
+
+def legacy_decode(output, img_w, img_h, threshold):
+    # the loop from pothole/stream.py before decode.py (no NMS)
+    detections = []
+    output = output.reshape(-1, 5)
+    for det in output:
+        x_center, y_center, w, h, conf = det
+        if conf > threshold:
+            x1 = int((x_center - w / 2) * img_w)
+            y1 = int((y_center - h / 2) * img_h)
+            x2 = int((x_center + w / 2) * img_w)
+            y2 = int((y_center + h / 2) * img_h)
+            detections.append((x1, y1, x2, y2, conf))
+    return detections
+
+
+def synthetic_outputs(batch: int, rng) -> np.ndarray:
+    out = np.empty((batch, N_CANDIDATES, 5), dtype=np.float32)
+    out[..., :2] = rng.uniform(0.05, 0.95, (batch, N_CANDIDATES, 2))
+    out[..., 2:4] = rng.uniform(0.02, 0.2, (batch, N_CANDIDATES, 2))
+    out[..., 4] = rng.uniform(0, 0.3, (batch, N_CANDIDATES))
+    for b in range(batch):
+        # clusters of overlapping confident boxes, as a detector produces
+        for _ in range(3):
+            c = rng.uniform(0.2, 0.8, 2)
+            idx = rng.choice(N_CANDIDATES, 20, replace=False)
+            out[b, idx, :2] = c + rng.normal(0, 0.005, (20, 2))
+            out[b, idx, 2:4] = 0.1 + rng.normal(0, 0.005, (20, 2))
+            out[b, idx, 4] = rng.uniform(0.5, 0.95, 20)
+    return out
+
+
+def timeit(fn, repeat=20):
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main(batches):
+    threshold, max_boxes = load_config()
+    rng = np.random.default_rng(0)
+    print(f"threshold={threshold} max_boxes={max_boxes} candidates/image={N_CANDIDATES}")
+    print(f"{'batch':>5} {'legacy ms/img':>14} {'vector ms/img':>14} {'speedup':>8} {'legacy boxes':>13} {'kept':>5}")
+    for batch in batches:
+        outputs = synthetic_outputs(batch, rng)
+        decoder = YoloDecoder(threshold, max_boxes)
+        legacy = timeit(lambda: [legacy_decode(o.reshape(-1), IMG_W, IMG_H, threshold) for o in outputs], repeat=5)
+        vector = timeit(lambda: decoder.decode(outputs, IMG_W, IMG_H))
+
+        # same top box as the loop's best-scoring row, and far fewer boxes
+        boxes, scores, counts = decoder.decode(outputs, IMG_W, IMG_H)
+        raw = [legacy_decode(o.reshape(-1), IMG_W, IMG_H, threshold) for o in outputs]
+        for b in range(batch):
+            top = max(raw[b], key=lambda d: d[4])
+            assert tuple(boxes[b, 0]) == top[:4] and np.isclose(scores[b, 0], top[4]), (b, boxes[b, 0], top)
+        print(f"{batch:>5} {legacy / batch * 1e3:>14.3f} {vector / batch * 1e3:>14.3f} {legacy / vector:>7.1f}x "
+              f"{sum(len(r) for r in raw) / batch:>13.1f} {counts.mean():>5.1f}")
+
+
+if __name__ == "__main__":
+    main([int(b) for b in sys.argv[1:]] or [1, 8, 32])
@@ -0,0 +1,302 @@
+"""
+Replay a video through the edge pipeline without a Hailo device or camera.
+
+Frames from resources/example_640.mp4 (or --video) go through the same
+EdgePipeline.on_frame() the GStreamer callback uses, with detections from
+a stub detector (scripted, or recorded with --detections) and a replayed
+GPS track (--nmea, or a synthetic straight drive). Clips are encoded,
+saved and uploaded through the spool to a local S3 stand-in (moto, see
+benchmarks/requirements.txt, or --s3-url for e.g. MinIO).
+
+Reports per-frame callback latency percentiles, sustained fps, dropped
+frames/clips, peak RSS, clip encode/save time and upload throughput, and
+writes them to benchmarks/results/<commit>.json; --compare prints the
+change against an earlier result. With METRICS_ENABLED=1 the pipeline's
+Prometheus metrics go to results/<commit>.prom as well.
+
+Frames are fed at the camera's 30 fps by default. A run that drops
+frames or clips, or fails to save a clip, exits with status 1; with
+--fps 0 (as fast as possible) that measures how far past real time the
+pipeline can go before it falls behind.
+
+    python benchmarks/replay_bench.py [--fps 30] [--loops 2] [--compare results/abc1234.json]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "basic_pipelines"))
+
+import boto3
+import cv2
+import numpy as np
+from loguru import logger
+
+import gps
+import metrics
+import pipeline
+
+RESOURCES = os.path.join(HERE, os.pardir, "resources")
+BUCKET = "pothole-bench"
+
+
+# --------------------------------------------
+# Stub detectors
+# --------------------------------------------
+class ScriptedDetector:
+    """
+    A pothole in view for visible_s out of every period_s, moving down the
+    frame like the road does; nothing otherwise
+    """
+    def __init__(self, period_s: float = 8.0, visible_s: float = 2.0, confidence: float = 0.8):
+        self.period_s = period_s
+        self.visible_s = visible_s
+        self.confidence = confidence
+
+    def __call__(self, index: int, t: float):
+        phase = t % self.period_s
+        if phase >= self.visible_s:
+            return []
+        y = 0.2 + 0.6 * phase / self.visible_s
+        conf = self.confidence + 0.1 * math.sin(index)
+        return [(pipeline.POTHOLE_CLASS_ID, conf, (0.4, y - 0.08, 0.6, y + 0.08))]
+
+
+class RecordedDetector:
+    """
+    Detections from a JSON file: {"<frame index>": [[class_id, conf, xmin, ymin, xmax, ymax], ...]}
+    """
+    def __init__(self, path: str):
+        with open(path) as f:
+            self.frames = {int(k): v for k, v in json.load(f).items()}
+
+    def __call__(self, index: int, t: float):
+        return [(int(c), float(p), tuple(box)) for c, p, *box in self.frames.get(index, ())]
+
+
+# --------------------------------------------
+# GPS and S3 stand-ins
+# --------------------------------------------
+def synthetic_nmea(path: str, duration_s: float, speed_mps: float = 10.0):
+    """
+    1 Hz RMC fixes driving due north from Philadelphia
+    """
+    def checksum(body):
+        c = 0
+        for ch in body:
+            c ^= ord(ch)
+        return f"${body}*{c:02X}"
+
+    def dm(v, digits):
+        deg = int(abs(v))
+        return f"{deg:0{digits}d}{(abs(v) - deg) * 60:07.4f}"
+
+    with open(path, "w") as f:
+        for s in range(int(duration_s) + 2):
+            lat = 39.9526 + s * speed_mps / 111_320.0
+            hh, mm, ss = (s // 3600) % 24, (s // 60) % 60, s % 60
+            body = f"GPRMC,{hh:02d}{mm:02d}{ss:02d}.00,A,{dm(lat, 2)},N,{dm(-75.1652, 3)},W,{speed_mps * 1.944:.1f},0.0,010125,,"
+            f.write(checksum(body) + "\n")
+
+
+def local_s3(url):
+    """
+    boto3 client for url, or for a moto server started on a free port
+    """
+    server = None
+    if url is None:
+        try:
+            from moto.server import ThreadedMotoServer
+        except ImportError:
+            raise SystemExit("The local S3 stand-in needs moto: pip install -r benchmarks/requirements.txt, "
+                             "or point --s3-url at an S3-compatible endpoint")
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+        server.start()
+        url = f"http://127.0.0.1:{port}"
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    client = boto3.client("s3", endpoint_url=url, region_name="us-east-1")
+    try:
+        client.create_bucket(Bucket=BUCKET)
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    return client, server
+
+
+# --------------------------------------------
+# Run
+# --------------------------------------------
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentiles(values_ms):
+    a = np.asarray(values_ms)
+    return {f"p{p}": round(float(np.percentile(a, p)), 3) for p in (50, 90, 99)} | {"max": round(float(a.max()), 3)}
+
+
+def run(args) -> dict:
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open {args.video}")
+    src_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    n_src = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames_total = n_src * args.loops
+    duration_s = frames_total / src_fps
+
+    work = tempfile.mkdtemp(prefix="replay_bench_")
+    nmea = args.nmea or os.path.join(work, "track.nmea")
+    if not args.nmea:
+        synthetic_nmea(nmea, duration_s + 10)
+    s3, server = local_s3(args.s3_url)
+
+    detector = RecordedDetector(args.detections) if args.detections else ScriptedDetector()
+    gps_service = gps.GpsService(gps.FixRing(8192))
+    edge = pipeline.EdgePipeline.from_env(os.path.join(work, "clips"), s3, BUCKET, gps_service)
+
+    encodes = []
+    on_clip = edge.clip_buffer.on_clip
+    def record_clip(clip):
+        encodes.append(clip.encode)
+        on_clip(clip)
+    edge.clip_buffer.on_clip = record_clip
+    edge.start()
+
+    # frame times are video time, so runs are comparable whatever the pacing
+    t0_mono, t0_wall = time.monotonic(), time.time()
+    gps_service.replay(nmea, t0=t0_mono)
+
+    latencies = np.empty(frames_total)
+    started = time.perf_counter()
+    index = 0
+    for _ in range(args.loops):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        while index < frames_total:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            t = index / src_fps
+            if args.fps:
+                wait = started + index / args.fps - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            dets = detector(index, t)
+            c = time.perf_counter()
+            metrics.CALLBACK.begin()
+            edge.on_frame(frame, dets, now=t0_wall + t, mono=t0_mono + t)
+            metrics.CALLBACK.end()
+            latencies[index] = (time.perf_counter() - c) * 1000
+            index += 1
+    feed_s = time.perf_counter() - started
+    latencies = latencies[:index]
+
+    # close the last event and let clips, saves and uploads finish
+    last = t0_wall + index / src_fps + edge.detection_timeout_s + 1
+    edge.on_frame(frame, [], now=last, mono=t0_mono + index / src_fps)
+    drain_started = time.perf_counter()
+    deadline = drain_started + args.drain_timeout
+    while time.perf_counter() < deadline:
+        st = edge.stats()
+        if (not st["clip_buffer"]["recording"] and st["clip_buffer"]["queued"] == 0
+                and edge.clip_queue.empty() and st["clips_saved"] + st["clips_dropped"] + st["clips_failed"] >= len(encodes)
+                and st["spool"]["depth"] == 0):
+            break
+        time.sleep(0.05)
+    drain_s = time.perf_counter() - drain_started
+    stats = edge.stats()
+    if server is not None:
+        server.stop()
+
+    encoded = [e for e in encodes if e]
+    return {
+        "commit": git_commit(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"machine": platform.machine(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "params": {
+            "video": os.path.basename(args.video), "loops": args.loops, "fps": args.fps,
+            "detector": "recorded" if args.detections else "scripted",
+            "gps": os.path.basename(args.nmea) if args.nmea else "synthetic",
+        },
+        "frames": int(index),
+        "callback_ms": percentiles(latencies),
+        "sustained_fps": round(index / feed_s, 1),
+        "dropped_frames": stats["clip_buffer"]["dropped"],
+        "dropped_clips": stats["clips_dropped"],
+        "failed_clips": stats["clips_failed"],
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "clips": len(encodes),
+        "clip_encode_s": round(sum(e["encode_s"] for e in encoded), 3),
+        "clip_finalize_ms_max": max((e["finalize_ms"] for e in encoded), default=0.0),
+        "clip_bitrate_kbps_mean": round(float(np.mean([e["bitrate_kbps"] for e in encoded])), 1) if encoded else 0.0,
+        "clip_save_s": stats["save_s"],
+        "drain_s": round(drain_s, 3),
+        "uploaded": stats["spool"]["uploaded"],
+        "upload_classes": stats["spool"]["classes"],
+        "gps_fixes": gps_service.parsed,
+    }
+
+
+def compare(result: dict, previous: dict):
+    print(f"\nvs {previous.get('commit')} ({previous.get('recorded_at')}):")
+    for key in ("sustained_fps", "peak_rss_mb", "dropped_frames", "failed_clips", "clip_encode_s", "clip_save_s", "drain_s"):
+        a, b = previous.get(key), result.get(key)
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"  {key:<16} {a:>10} -> {b:<10} {change}")
+    for p, a in previous.get("callback_ms", {}).items():
+        b = result["callback_ms"].get(p)
+        if b is not None:
+            print(f"  callback {p:<7} {a:>10} -> {b:<10} {(b - a) / a * 100 if a else 0:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default=os.path.join(RESOURCES, "example_640.mp4"))
+    parser.add_argument("--loops", type=int, default=1, help="play the video this many times")
+    parser.add_argument("--fps", type=float, default=30.0, help="feed rate; 0 feeds as fast as possible")
+    parser.add_argument("--detections", help="recorded detections JSON instead of the scripted stub")
+    parser.add_argument("--nmea", help="NMEA log to replay instead of a synthetic track")
+    parser.add_argument("--s3-url", help="S3-compatible endpoint; default starts a local moto server")
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--out", default=os.path.join(HERE, "results"), help="directory for <commit>.json")
+    parser.add_argument("--compare", help="earlier result JSON to diff against")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's log output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+    result = run(args)
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{result['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+    print(f"\nSaved {path}")
+    if metrics.ENABLED:
+        metrics.write_file(os.path.join(args.out, f"{result['commit']}.prom"))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    lost = {k: result[k] for k in ("dropped_frames", "dropped_clips", "failed_clips") if result[k]}
+    if lost:
+        raise SystemExit(f"\nFAILED: the pipeline fell behind at {result['params']['fps'] or 'unpaced'} fps: {lost}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare the one-frame-at-a-time loop with the pipelined stream
+(pothole/pipelined.py) on a CPU-only box: frames from
+resources/example_640.mp4, a StubBackend standing in for the Hailo device
+and no display.
+
+    python benchmarks/stream_bench.py [--latency-ms 25] [--interval-ms 8] [--in-flight 4] [--fps 60]
+
+The stub takes --latency-ms per frame but, like the Hailo device, accepts
+a new frame every --interval-ms; the sequential loop only ever has one
+frame on it. With --fps 0 frames are read as fast as the file decodes and
+the pipelined stream drops the stale ones.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, "pothole"))
+
+import cv2
+
+from decode import YoloDecoder
+from pipelined import PipelinedStream, StubBackend, run_sequential
+
+RESOURCES = os.path.join(HERE, os.pardir, "resources")
+
+
+class LoopedCapture:
+    """
+    VideoCapture that replays the file `loops` times, optionally paced to fps
+    """
+    def __init__(self, path: str, loops: int, fps: float = 0.0):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise SystemExit(f"Cannot open {path}")
+        self.loops = loops
+        self.interval = 1.0 / fps if fps else 0.0
+        self.next_at = time.perf_counter()
+
+    def read(self):
+        ok, frame = self.cap.read()
+        if not ok and self.loops > 1:
+            self.loops -= 1
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        if self.interval:
+            wait = self.next_at - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            self.next_at += self.interval
+        return ok, frame
+
+
+def consume(frame, detections):
+    # stands in for drawing, without a window
+    for (x1, y1, x2, y2, _) in detections:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default=os.path.join(RESOURCES, "example_640.mp4"))
+    parser.add_argument("--loops", type=int, default=2)
+    parser.add_argument("--fps", type=float, default=60.0, help="camera rate; 0 reads as fast as possible")
+    parser.add_argument("--latency-ms", type=float, default=25.0, help="stub inference time per frame")
+    parser.add_argument("--interval-ms", type=float, default=8.0, help="stub time between results when busy")
+    parser.add_argument("--in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    decoder = YoloDecoder.from_config()
+    latency_s, interval_s = args.latency_ms / 1000, args.interval_ms / 1000
+
+    sequential = run_sequential(LoopedCapture(args.video, args.loops, args.fps), StubBackend(latency_s, 1, interval_s), decoder,
+                                on_frame=consume)
+
+    stream = PipelinedStream(LoopedCapture(args.video, args.loops, args.fps), StubBackend(latency_s, args.in_flight, interval_s),
+                             decoder, max_in_flight=args.in_flight).start()
+    for frame in stream.results():
+        consume(frame.image, frame.detections)
+    pipelined = stream.stats.report() | {"dropped": stream.dropped()}
+
+    print(json.dumps({"sequential": sequential, "pipelined": pipelined}, indent=2))
+    print(f"\nfps {sequential['fps']} -> {pipelined['fps']} "
+          f"({pipelined['fps'] / sequential['fps']:.1f}x, stub latency {args.latency_ms} ms)")
+
+
+if __name__ == "__main__":
+    main()
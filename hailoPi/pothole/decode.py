@@ -0,0 +1,134 @@
+import json
+import os
+from typing import List, Tuple
+
+import numpy as np
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "resources", "pothole.json")
+# candidates kept for NMS after thresholding, highest scores first
+MAX_CANDIDATES = 1000
+
+
+def load_config(path: str = CONFIG_PATH) -> Tuple[float, int]:
+    """
+    (detection_threshold, max_boxes) from resources/pothole.json
+    """
+    with open(path) as f:
+        cfg = json.load(f)
+    return float(cfg.get("detection_threshold", 0.5)), int(cfg.get("max_boxes", 100))
+
+
+class YoloDecoder:
+    """
+    Threshold, box conversion and NMS for single-class YOLO output rows of
+    [x_center, y_center, width, height, conf] (normalised), as array ops.
+
+    decode() takes one output, (N*5,) or (N, 5) as the accelerator hands
+    it over, or a batch: (B, N, 5), or (B, N*5) with batched=True. It
+    writes into preallocated arrays:
+    boxes (B, max_boxes, 4) int32 pixel x1, y1, x2, y2, scores
+    (B, max_boxes) float32 and counts (B,). The arrays are reused between
+    calls, so copy what you need to keep.
+    """
+    def __init__(self, threshold: float, max_boxes: int, iou_threshold: float = 0.45, max_candidates: int = MAX_CANDIDATES):
+        self.threshold = threshold
+        self.max_boxes = max_boxes
+        self.iou_threshold = iou_threshold
+        self.max_candidates = max_candidates
+        self.boxes = np.zeros((0, max_boxes, 4), dtype=np.int32)
+        self.scores = np.zeros((0, max_boxes), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int32)
+
+    @classmethod
+    def from_config(cls, path: str = CONFIG_PATH, **kwargs) -> "YoloDecoder":
+        threshold, max_boxes = load_config(path)
+        return cls(threshold, max_boxes, **kwargs)
+
+    def _buffers(self, batch: int):
+        if len(self.counts) < batch:
+            self.boxes = np.zeros((batch, self.max_boxes, 4), dtype=np.int32)
+            self.scores = np.zeros((batch, self.max_boxes), dtype=np.float32)
+            self.counts = np.zeros(batch, dtype=np.int32)
+        return self.boxes[:batch], self.scores[:batch], self.counts[:batch]
+
+    def decode(self, outputs, img_w: int, img_h: int, batched: bool = False):
+        """
+        Decode an output or a batch; returns (boxes, scores, counts) views
+        of the preallocated arrays, with row b valid up to counts[b]
+        """
+        out = np.asarray(outputs, dtype=np.float32)
+        # a 2-D (N, 5) output is one image's candidates, not N images
+        if batched or out.ndim == 3:
+            out = out.reshape(out.shape[0], -1, 5)
+        else:
+            out = out.reshape(1, -1, 5)
+        boxes, scores, counts = self._buffers(out.shape[0])
+        counts[:] = 0
+
+        conf = out[..., 4]
+        hits = conf > self.threshold
+        if not hits.any():
+            return boxes, scores, counts
+
+        # corners for every candidate that passed, whole batch at once
+        b_idx, c_idx = np.nonzero(hits)
+        rows = out[b_idx, c_idx]
+        half_w, half_h = rows[:, 2] / 2, rows[:, 3] / 2
+        xyxy = np.empty((len(rows), 4), dtype=np.float32)
+        xyxy[:, 0] = (rows[:, 0] - half_w) * img_w
+        xyxy[:, 1] = (rows[:, 1] - half_h) * img_h
+        xyxy[:, 2] = (rows[:, 0] + half_w) * img_w
+        xyxy[:, 3] = (rows[:, 1] + half_h) * img_h
+        cand_conf = rows[:, 4]
+
+        # candidates are grouped by image (nonzero is row-major)
+        bounds = np.searchsorted(b_idx, np.arange(out.shape[0] + 1))
+        for b in range(out.shape[0]):
+            lo, hi = bounds[b], bounds[b + 1]
+            if lo == hi:
+                continue
+            keep = self._nms(xyxy[lo:hi], cand_conf[lo:hi])
+            n = len(keep)
+            # int() truncation, as the per-row loop did
+            boxes[b, :n] = xyxy[lo:hi][keep].astype(np.int32)
+            scores[b, :n] = cand_conf[lo:hi][keep]
+            counts[b] = n
+        return boxes, scores, counts
+
+    def _nms(self, xyxy: np.ndarray, conf: np.ndarray) -> np.ndarray:
+        """
+        Greedy NMS; indices of kept boxes, best first, at most max_boxes
+        """
+        order = np.argsort(-conf, kind="stable")
+        if len(order) > self.max_candidates:
+            order = order[:self.max_candidates]
+        x1, y1, x2, y2 = (xyxy[order, i] for i in range(4))
+        area = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+        alive = np.ones(len(order), dtype=bool)
+        keep = []
+        for i in range(len(order)):
+            if not alive[i]:
+                continue
+            keep.append(order[i])
+            if len(keep) == self.max_boxes:
+                break
+            rest = np.nonzero(alive[i + 1:])[0] + i + 1
+            if not len(rest):
+                break
+            iw = np.maximum(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0)
+            ih = np.maximum(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0)
+            inter = iw * ih
+            iou = inter / np.maximum(area[i] + area[rest] - inter, 1e-9)
+            alive[rest[iou > self.iou_threshold]] = False
+        return np.asarray(keep, dtype=np.intp)
+
+    def detections(self, b: int = 0) -> List[Tuple[int, int, int, int, float]]:
+        """
+        Image b of the last decode() as (x1, y1, x2, y2, conf) tuples
+        """
+        n = self.counts[b]
+        return [(*map(int, box), float(s)) for box, s in zip(self.boxes[b, :n], self.scores[b, :n])]
+
+    def decode_one(self, output, img_w: int, img_h: int) -> List[Tuple[int, int, int, int, float]]:
+        self.decode(output, img_w, img_h)
+        return self.detections(0)
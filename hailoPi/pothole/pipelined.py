@@ -0,0 +1,272 @@
+import collections
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+from decode import YoloDecoder
+
+
+# === Drop-stale queue ===
+class LatestQueue:
+    """
+    Bounded queue that drops its oldest item instead of blocking the
+    producer, so a slow stage always gets the freshest frames
+    """
+    def __init__(self, maxsize: int = 2):
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None):
+        """
+        Next item; None once closed and empty, or on timeout
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.items or self.closed, timeout):
+                return None
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+# === Backends ===
+class VStreamBackend:
+    """
+    HailoRT input/output vstreams: results come back in send order
+    """
+    def __init__(self, input_vstream, output_vstream):
+        self.input_vstream = input_vstream
+        self.output_vstream = output_vstream
+
+    def send(self, input_data):
+        self.input_vstream.send(input_data)
+
+    def receive(self):
+        return self.output_vstream.receive()
+
+
+class StubBackend:
+    """
+    Stands in for the accelerator on a CPU-only box. Like the Hailo device
+    it is itself pipelined: each frame takes latency_s, and a new result can
+    come out every interval_s (default latency_s, i.e. one frame at a time),
+    with up to `depth` frames queued. Results come back in send order as a
+    YOLO-shaped output (n_candidates rows of 5, one confident box).
+    """
+    def __init__(self, latency_s: float = 0.025, depth: int = 4, interval_s: Optional[float] = None, n_candidates: int = 8400):
+        self.latency_s = latency_s
+        self.interval_s = latency_s if interval_s is None else interval_s
+        self.output = np.zeros((n_candidates, 5), dtype=np.float32)
+        self.output[0] = (0.5, 0.6, 0.2, 0.1, 0.9)
+        self.output = self.output.reshape(-1)
+        self._in = queue.Queue(maxsize=depth)
+        self._out = queue.Queue()
+        threading.Thread(target=self._run, name="stub-device", daemon=True).start()
+
+    def _run(self):
+        last = 0.0
+        while True:
+            sent_at = self._in.get()
+            ready = max(sent_at + self.latency_s, last + self.interval_s)
+            wait = ready - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            last = ready
+            self._out.put(self.output.copy())
+
+    def send(self, input_data):
+        self._in.put(time.perf_counter())
+
+    def receive(self):
+        return self._out.get()
+
+
+# === Stats ===
+class StageStats:
+    """
+    Rolling per-stage latencies (ms) and end-to-end fps
+    """
+    STAGES = ("capture", "queue", "infer", "decode", "end_to_end")
+
+    def __init__(self, window: int = 300):
+        self.samples = {s: collections.deque(maxlen=window) for s in self.STAGES}
+        self.frames = 0
+        self.started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds * 1000)
+
+    def report(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        out = {"fps": round(self.frames / elapsed, 1) if elapsed else 0.0, "frames": self.frames}
+        for stage, values in self.samples.items():
+            if values:
+                a = np.fromiter(values, dtype=np.float64)
+                out[stage] = {"p50": round(float(np.percentile(a, 50)), 2), "p95": round(float(np.percentile(a, 95)), 2)}
+        return out
+
+
+# === Pipeline ===
+class Frame:
+    __slots__ = ("seq", "image", "input", "t_captured", "capture_s", "t_sent", "t_received", "decode_s", "detections")
+
+    def __init__(self, seq, image, input_data, t_captured, capture_s):
+        self.seq = seq
+        self.image = image
+        self.input = input_data
+        self.t_captured = t_captured
+        self.capture_s = capture_s
+        self.t_sent = self.t_received = None
+        self.decode_s = 0.0
+        self.detections = None
+
+
+class PipelinedStream:
+    """
+    Capture, inference and decode as overlapping stages:
+
+    capture thread -> LatestQueue -> send thread -> backend (up to
+    max_in_flight frames) -> receive/decode thread -> LatestQueue -> caller
+
+    The accelerator keeps working while the CPU captures, resizes and
+    decodes. Queues between stages are small and drop the oldest frame
+    when full, so under load the output stays current instead of lagging.
+    results() yields decoded frames to the caller (drawing, display).
+    """
+    def __init__(
+        self,
+        capture,
+        backend,
+        decoder: YoloDecoder,
+        input_size=(640, 640),
+        max_in_flight: int = 4,
+        queue_size: int = 2,
+    ):
+        self.capture = capture
+        self.backend = backend
+        self.decoder = decoder
+        self.input_size = input_size
+        self.captured = LatestQueue(queue_size)
+        self.decoded = LatestQueue(queue_size)
+        self.in_flight = queue.Queue()          # frames sent, in send order
+        self.slots = threading.Semaphore(max_in_flight)
+        self.stats = StageStats()
+        self.running = False
+        self._threads = []
+
+    def start(self) -> "PipelinedStream":
+        self.running = True
+        for target, name in ((self._capture, "capture"), (self._send, "send"), (self._receive, "receive")):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self.running = False
+        self.captured.close()
+
+    def _capture(self):
+        seq = 0
+        while self.running:
+            t = time.perf_counter()
+            ok, image = self.capture.read()
+            if not ok:
+                break
+            resized = cv2.resize(image, self.input_size)
+            input_data = np.ascontiguousarray(resized, dtype=np.uint8).reshape(-1)
+            self.captured.put(Frame(seq, image, input_data, t, time.perf_counter() - t))
+            seq += 1
+        self.captured.close()
+
+    def _send(self):
+        while True:
+            frame = self.captured.get()
+            if frame is None:
+                break
+            self.slots.acquire()
+            frame.t_sent = time.perf_counter()
+            self.in_flight.put(frame)
+            self.backend.send(frame.input)
+        self.in_flight.put(None)
+
+    def _receive(self):
+        while True:
+            frame = self.in_flight.get()
+            if frame is None:
+                break
+            output = self.backend.receive()
+            self.slots.release()
+            frame.t_received = time.perf_counter()
+            t = time.perf_counter()
+            h, w = frame.image.shape[:2]
+            frame.detections = self.decoder.decode_one(output, w, h)
+            frame.decode_s = time.perf_counter() - t
+            frame.input = None
+            self.decoded.put(frame)
+        self.decoded.close()
+
+    def results(self, timeout: float = 5.0):
+        """
+        Decoded frames in capture order (stale ones dropped); ends when
+        capture ends or nothing arrives for `timeout` seconds
+        """
+        while True:
+            frame = self.decoded.get(timeout)
+            if frame is None:
+                return
+            now = time.perf_counter()
+            s = self.stats
+            s.frames += 1
+            s.add("capture", frame.capture_s)
+            s.add("queue", frame.t_sent - frame.t_captured - frame.capture_s)
+            s.add("infer", frame.t_received - frame.t_sent)
+            s.add("decode", frame.decode_s)
+            s.add("end_to_end", now - frame.t_captured)
+            yield frame
+
+    def dropped(self) -> dict:
+        return {"captured": self.captured.dropped, "decoded": self.decoded.dropped}
+
+
+def run_sequential(capture, backend, decoder: YoloDecoder, input_size=(640, 640), on_frame: Optional[Callable] = None) -> dict:
+    """
+    The original one-frame-at-a-time loop, for comparison
+    """
+    stats = StageStats()
+    while True:
+        t = time.perf_counter()
+        ok, image = capture.read()
+        if not ok:
+            break
+        input_data = cv2.resize(image, input_size).astype(np.uint8).flatten()
+        t_sent = time.perf_counter()
+        backend.send(input_data)
+        output = backend.receive()
+        t_received = time.perf_counter()
+        detections = decoder.decode_one(output, image.shape[1], image.shape[0])
+        stats.frames += 1
+        stats.add("capture", t_sent - t)
+        stats.add("infer", t_received - t_sent)
+        stats.add("decode", time.perf_counter() - t_received)
+        if on_frame is not None:
+            on_frame(image, detections)
+        stats.add("end_to_end", time.perf_counter() - t)
+    return stats.report()
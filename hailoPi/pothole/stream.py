@@ -1,77 +1,86 @@
+import os
+import time
+
 import cv2
-import numpy as np
-from hailort import HEF, InferenceRunner
+from decode import YoloDecoder
+from pipelined import PipelinedStream, StubBackend, VStreamBackend, run_sequential
 
 # === Config ===
 HEF_PATH = "pothole.hef"
 INPUT_WIDTH = 640
 INPUT_HEIGHT = 640
-CONF_THRESHOLD = 0.4
+# threshold and max_boxes come from resources/pothole.json
+DECODER = YoloDecoder.from_config()
+# "hailo", or "stub" to run the loop without an accelerator
+BACKEND = os.getenv("STREAM_BACKEND", "hailo")
+# 0 runs the original one-frame-at-a-time loop
+PIPELINED = os.getenv("STREAM_PIPELINED", "1") == "1"
+MAX_IN_FLIGHT = int(os.getenv("STREAM_MAX_IN_FLIGHT", "4"))
+SOURCE = os.getenv("STREAM_SOURCE", "0")
+STATS_INTERVAL_S = float(os.getenv("STREAM_STATS_INTERVAL_S", "5"))
 
 # === Decode YOLO Output ===
 def decode_output(output, img_w, img_h):
-    detections = []
-    output = output.reshape(-1, 5)  # [x_center, y_center, width, height, conf]
-
-    for det in output:
-        x_center, y_center, w, h, conf = det
-
-        if conf > CONF_THRESHOLD:
-            x1 = int((x_center - w / 2) * img_w)
-            y1 = int((y_center - h / 2) * img_h)
-            x2 = int((x_center + w / 2) * img_w)
-            y2 = int((y_center + h / 2) * img_h)
-            detections.append((x1, y1, x2, y2, conf))
-
-    return detections
+    """
+    [(x1, y1, x2, y2, conf)] after thresholding and NMS
+    """
+    return DECODER.decode_one(output, img_w, img_h)
+
+# === Display ===
+def show(frame, detections):
+    """
+    Draw boxes and show the frame; False once 'q' is pressed
+    """
+    for (x1, y1, x2, y2, conf) in detections:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        label = f"Pothole {conf:.2f}"
+        cv2.putText(frame, label, (x1, y1 - 8),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    cv2.imshow("Pothole Detection", frame)
+    return cv2.waitKey(1) & 0xFF != ord("q")
 
 # === Main Inference Loop ===
-hef = HEF(HEF_PATH)
-network_groups = hef.configure()
-network_group = network_groups[0]
-
-with InferenceRunner(network_group) as runner:
-    input_vstream_info = runner.get_input_vstream_infos()[0]
-    output_vstream_info = runner.get_output_vstream_infos()[0]
-
-    with runner.get_vstreams() as (input_vstreams, output_vstreams):
-        input_vstream = input_vstreams[0]
-        output_vstream = output_vstreams[0]
-
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            raise RuntimeError("Camera not accessible")
-
-        print("? Starting Pothole Detection... Press 'q' to exit.")
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
+def run(backend):
+    cap = cv2.VideoCapture(int(SOURCE) if SOURCE.isdigit() else SOURCE)
+    if not cap.isOpened():
+        raise RuntimeError("Camera not accessible")
+
+    print("? Starting Pothole Detection... Press 'q' to exit.")
+    try:
+        if not PIPELINED:
+            print(run_sequential(cap, backend, DECODER, (INPUT_WIDTH, INPUT_HEIGHT), show))
+            return
+
+        stream = PipelinedStream(cap, backend, DECODER, (INPUT_WIDTH, INPUT_HEIGHT), MAX_IN_FLIGHT).start()
+        next_report = time.monotonic() + STATS_INTERVAL_S
+        for frame in stream.results():
+            if not show(frame.image, frame.detections):
                 break
+            if time.monotonic() >= next_report:
+                print(stream.stats.report(), stream.dropped())
+                next_report += STATS_INTERVAL_S
+        stream.stop()
+        print(stream.stats.report(), stream.dropped())
+    finally:
+        cap.release()
+        cv2.destroyAllWindows()
 
-            # Resize to model input size
-            resized = cv2.resize(frame, (INPUT_WIDTH, INPUT_HEIGHT))
-            input_data = resized.astype(np.uint8).flatten()
 
-            # Run inference
-            input_vstream.send(input_data)
-            output_data = output_vstream.receive()
+def main():
+    if BACKEND == "stub":
+        run(StubBackend())
+        return
 
-            # Decode detections
-            detections = decode_output(output_data, frame.shape[1], frame.shape[0])
+    from hailort import HEF, InferenceRunner
 
-            # Draw boxes
-            for (x1, y1, x2, y2, conf) in detections:
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                label = f"Pothole {conf:.2f}"
-                cv2.putText(frame, label, (x1, y1 - 8),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    hef = HEF(HEF_PATH)
+    network_groups = hef.configure()
+    network_group = network_groups[0]
 
-            # Show output
-            cv2.imshow("Pothole Detection", frame)
-            if cv2.waitKey(1) & 0xFF == ord("q"):
-                break
+    with InferenceRunner(network_group) as runner:
+        with runner.get_vstreams() as (input_vstreams, output_vstreams):
+            run(VStreamBackend(input_vstreams[0], output_vstreams[0]))
 
-        cap.release()
-        cv2.destroyAllWindows()
 
+if __name__ == "__main__":
+    main()
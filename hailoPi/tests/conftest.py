@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the edge scripts import each other flat, as when run from their directory
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, os.pardir, "basic_pipelines"), os.path.join(HERE, os.pardir, "pothole")]
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from bestframe import BestFrames, detection_scores
+
+# flat grey: no sharpness, so a frame's score is its detection score
+FLAT = np.full((64, 64, 3), 128, dtype=np.uint8)
+
+
+def meta(conf, yc=0.5, box=(0.4, 0.4, 0.6, 0.6)):
+    xmin, ymin, xmax, ymax = box
+    return {"y_centers": [yc], "confidences": [conf],
+            "bboxes": [{"xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax}]}
+
+
+def offer_all(best, confs):
+    made = []
+    for i, conf in enumerate(confs):
+        best.offer(FLAT, meta(conf), lambda i=i: made.append(i) or i)
+    return made
+
+
+def test_keeps_the_top_k_best_first():
+    best = BestFrames(k=3)
+    offer_all(best, [0.5, 0.9, 0.6, 0.95, 0.55, 0.7])
+    assert [item for _, item in best.ranked()] == [3, 1, 5]
+    scores = [parts["score"] for parts, _ in best.ranked()]
+    assert scores == sorted(scores, reverse=True)
+    assert best.best()[1] == 3
+    assert best.scored == 6 and best.max_confidence == pytest.approx(0.95)
+
+
+def test_worse_frames_are_rejected_before_the_jpeg_is_made():
+    best = BestFrames(k=2, weights={"center": 1.0, "confidence": 1.0, "size": 0.5, "sharpness": 0.0})
+    made = offer_all(best, [0.9, 0.8, 0.5, 0.6, 0.95])
+    # 0.5 and 0.6 can't beat the k-th best, so their items are never built
+    assert made == [0, 1, 4]
+    assert [item for _, item in best.ranked()] == [4, 0]
+
+
+def test_frames_without_detections_are_ignored():
+    best = BestFrames(k=2)
+    assert not best.offer(FLAT, None, lambda: 1)
+    assert not best.offer(FLAT, {"y_centers": [], "confidences": [], "bboxes": []}, lambda: 1)
+    assert best.ranked() == [] and best.best() is None and best.first_meta is None
+
+
+def test_failed_item_is_not_kept():
+    best = BestFrames(k=2)
+    assert not best.offer(FLAT, meta(0.9), lambda: None)
+    assert best.ranked() == []
+
+
+def test_centred_larger_boxes_score_higher():
+    (low,), _ = detection_scores(meta(0.8, yc=0.9, box=(0.4, 0.85, 0.45, 0.95)))
+    (high,), _ = detection_scores(meta(0.8, yc=0.5, box=(0.3, 0.3, 0.7, 0.7)))
+    assert high > low
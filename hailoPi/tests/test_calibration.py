@@ -0,0 +1,119 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import calibration
+from calibration import CalibrationUploader
+
+
+class Spool:
+    def __init__(self, depth, online=True):
+        self.depth = depth
+        self.online = online
+
+    def stats(self):
+        return {"depth": self.depth, "online": self.online}
+
+
+def test_max_backlog_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv("CALIB_MAX_BACKLOG", "3")
+    spool = Spool(3)
+    uploader = CalibrationUploader.from_env(lambda: None, None, "bucket", spool)
+    assert uploader.max_backlog == 3
+    assert not uploader._backlogged()
+    spool.depth = 4
+    assert uploader._backlogged()
+
+
+def test_offline_link_counts_as_backlogged():
+    uploader = CalibrationUploader(lambda: None, None, "bucket", Spool(0, online=False))
+    assert uploader._backlogged()
+    assert not uploader.tick()
+    assert uploader.skipped_backlog == 1 and uploader.interval_s == 2.0
+
+
+class FakeS3:
+    """
+    Records put_object calls; each one takes `seconds` on the fake clock
+    """
+    def __init__(self, clock, seconds=0.1):
+        self.clock = clock
+        self.seconds = seconds
+        self.puts = []
+
+    def put_object(self, **kwargs):
+        self.clock[0] += self.seconds
+        self.puts.append(kwargs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(calibration.time, "monotonic", lambda: now[0])
+    return now
+
+
+def scene(level, shape=(720, 1280, 3)):
+    # a horizontal gradient, brightened by level
+    ramp = np.linspace(0, 100, shape[1], dtype=np.float32)
+    return np.broadcast_to(ramp[None, :, None] + level, shape).astype(np.uint8)
+
+
+def uploader_for(frames, s3, **kwargs):
+    frames = iter(frames)
+    return CalibrationUploader(lambda: next(frames), s3, "bucket", **kwargs)
+
+
+def test_unchanged_view_is_skipped(clock):
+    s3 = FakeS3(clock)
+    first = scene(60)
+    nudged = np.clip(first.astype(np.int16) + 2, 0, 255).astype(np.uint8)
+    up = uploader_for([first, nudged, scene(120)], s3)
+    assert up.tick(now=1746148157)
+    assert not up.tick(now=1746148158)
+    assert up.skipped_unchanged == 1 and len(s3.puts) == 1
+    assert up.tick(now=1746148159)
+    assert len(s3.puts) == 2
+
+
+def test_upload_is_an_in_memory_jpeg(clock, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(calibration.cv2, "imwrite", lambda *a, **k: pytest.fail("wrote a file"))
+    s3 = FakeS3(clock)
+    up = uploader_for([scene(60)], s3, max_width=320)
+    assert up.tick(now=1746148157)
+
+    put, = s3.puts
+    assert put["Bucket"] == "bucket" and put["ContentType"] == "image/jpeg"
+    assert put["Key"].endswith("/calibration/calib_1746148157.jpg")
+    assert isinstance(put["Body"], bytes) and put["Body"][:2] == b"\xff\xd8"
+    img = cv2.imdecode(np.frombuffer(put["Body"], np.uint8), cv2.IMREAD_COLOR)
+    assert img.shape == (180, 320, 3)
+    assert up.uploaded_bytes == len(put["Body"])
+    assert os.listdir(tmp_path) == []
+
+
+def test_interval_doubles_while_skipping(clock):
+    frame = scene(60)
+    up = uploader_for([frame] * 10, FakeS3(clock), min_interval_s=1.0, max_interval_s=10.0,
+                      link_share=1.0)
+    assert up.tick() and up.interval_s == 1.0
+    intervals = []
+    for _ in range(5):
+        assert not up.tick()
+        intervals.append(up.interval_s)
+    assert intervals == [2.0, 4.0, 8.0, 10.0, 10.0]
+
+
+def test_interval_falls_back_to_the_link_share_after_an_upload(clock):
+    frame = scene(60)
+    up = uploader_for([frame, frame, frame, scene(120)], FakeS3(clock, seconds=0.1), link_share=0.05)
+    assert up.tick()
+    # uploading took 0.1 s; staying under 5% of the link means waiting 2 s
+    assert up.interval_s == pytest.approx(2.0)
+    assert not up.tick() and not up.tick()
+    assert up.interval_s == pytest.approx(8.0)
+    assert up.tick()
+    assert up.interval_s == pytest.approx(2.0)
@@ -0,0 +1,129 @@
+import cv2
+import numpy as np
+
+from clipbuffer import ClipBuffer
+from framering import FrameRing
+
+GREEN = (0, 255, 0)
+DETECTION = {
+    "y_centers": [0.5],
+    "confidences": [0.9],
+    "bboxes": [{"xmin": 0.25, "ymin": 0.25, "xmax": 0.75, "ymax": 0.75}],
+}
+NONE = {"y_centers": (), "confidences": (), "bboxes": ()}
+
+
+class RecordingWriter:
+    path = None
+
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame.copy())
+
+    def close(self):
+        return {}
+
+
+def green_pixels(image):
+    return int(np.all(image == GREEN, axis=-1).sum())
+
+
+class Harness:
+    """
+    Drives a ClipBuffer the way its worker thread does, one frame at a time
+    """
+    def __init__(self, **options):
+        self.ring = FrameRing(8)
+        self.clips = []
+        self.writers = []
+        self.buffer = ClipBuffer(self.ring, self.clips.append, self.open_writer, **options)
+        # textured, so the JPEGs have some size and sharpness to score
+        self.texture = np.random.default_rng(0).integers(0, 120, (64, 96, 3), dtype=np.uint8)
+
+    def open_writer(self, size, started_at):
+        self.writers.append(RecordingWriter())
+        return self.writers[-1]
+
+    def frame(self, ts, meta=NONE, begin=False, end=False):
+        seq = self.ring.push(self.texture, meta)
+        if begin:
+            self.buffer.begin_event(seq)
+        if end:
+            self.buffer.end_event(seq)
+        self.buffer._apply_controls(seq)
+        self.buffer._encode(seq, ts)
+        return seq
+
+
+def test_preroll_keeps_only_the_last_seconds():
+    h = Harness(preroll_s=1.0)
+    for i in range(30):
+        h.frame(i / 4)
+    # nothing older than preroll_s before the newest frame
+    assert [e.ts for e in h.buffer.frames] == [6.25, 6.5, 6.75, 7.0, 7.25]
+    assert h.buffer.nbytes == sum(e.jpeg.nbytes for e in h.buffer.frames)
+
+
+def test_preroll_respects_the_byte_budget():
+    h = Harness(preroll_s=10.0)
+    h.frame(0.0)
+    h.buffer.max_bytes = h.buffer.frames[0].jpeg.nbytes * 3
+    for i in range(1, 10):
+        h.frame(i * 0.1)
+    assert len(h.buffer.frames) <= 3 and h.buffer.nbytes <= h.buffer.max_bytes
+
+
+def test_event_starts_with_the_preroll():
+    h = Harness(preroll_s=0.5)
+    for i in range(10):
+        h.frame(i * 0.1)
+    h.frame(1.0, DETECTION, begin=True)
+    for i in range(11, 15):
+        h.frame(i * 0.1, DETECTION)
+    h.frame(1.5, end=True)
+    h.frame(1.6)
+
+    clip, = h.clips
+    writer, = h.writers
+    # 0.5 s of pre-roll (0.5..0.9), then every frame from the event's first
+    assert clip.frame_count == 5 + 6
+    assert len(writer.frames) == clip.frame_count
+    assert clip.duration_s == 1.0
+    # the frame the event ended on starts the next pre-roll
+    assert not h.buffer.recording
+    assert [e.ts for e in h.buffer.frames] == [1.5, 1.6]
+
+
+def test_best_frame_is_taken_before_annotation():
+    h = Harness(preroll_s=0.0, best_k=2)
+    h.frame(0.0, DETECTION, begin=True)
+    for i in range(1, 5):
+        h.frame(i * 0.1, DETECTION)
+    h.frame(0.5, end=True)
+
+    clip, = h.clips
+    writer, = h.writers
+    # the video gets the boxes drawn in ...
+    assert all(green_pixels(f) for f in writer.frames[:5])
+    # ... the kept best frames don't
+    ranked = clip.best.ranked()
+    assert len(ranked) == 2
+    for _, entry in ranked:
+        assert green_pixels(cv2.imdecode(entry.jpeg, cv2.IMREAD_COLOR)) == 0
+        assert entry.meta is DETECTION
+
+
+def test_video_false_scores_without_writing():
+    h = Harness(preroll_s=0.0)
+    seq = h.ring.push(h.texture, DETECTION)
+    h.buffer.begin_event(seq, video=False, event={"reobservation_of": {"timestamp": 1}})
+    h.buffer._apply_controls(seq)
+    h.buffer._encode(seq, 0.0)
+    h.frame(0.1, end=True)
+
+    clip, = h.clips
+    assert h.writers == [] and clip.path is None
+    assert clip.event == {"reobservation_of": {"timestamp": 1}}
+    assert clip.best.ranked()
@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+import pytest
+
+import clipwriter
+from clipwriter import ClipWriter
+
+SIZE = (160, 96)        # (width, height)
+
+
+@pytest.fixture
+def no_gstreamer(monkeypatch):
+    monkeypatch.setattr(cv2.videoio_registry, "hasBackend", lambda backend: False)
+
+
+def frames(n):
+    for i in range(n):
+        frame = np.zeros((SIZE[1], SIZE[0], 3), dtype=np.uint8)
+        cv2.rectangle(frame, (4 * i, 10), (4 * i + 30, 60), (0, 255, 0), -1)
+        yield frame
+
+
+def test_opencv_fallback_writes_a_readable_mp4(tmp_path, no_gstreamer):
+    path = str(tmp_path / "pothole_1.mp4")
+    writer = ClipWriter(path, SIZE, fps=10)
+    assert writer.backend in clipwriter.FOURCC_FALLBACKS
+    for frame in frames(20):
+        writer.write(frame)
+    stats = writer.close()
+
+    assert stats["frames"] == 20 and stats["bytes"] > 0
+    assert stats["backend"] == writer.backend
+    cap = cv2.VideoCapture(path)
+    try:
+        assert cap.isOpened()
+        read = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            assert frame.shape == (SIZE[1], SIZE[0], 3)
+            read += 1
+    finally:
+        cap.release()
+    assert read == 20
+
+
+def test_no_encoder_raises(tmp_path, no_gstreamer, monkeypatch):
+    monkeypatch.setattr(clipwriter, "FOURCC_FALLBACKS", ())
+    with pytest.raises(IOError):
+        ClipWriter(str(tmp_path / "pothole_1.mp4"), SIZE)
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from decode import YoloDecoder
+
+IMG_W, IMG_H = 1280, 720
+THRESHOLD = 0.4
+# well-separated pothole centres, so clusters never overlap each other
+CENTRES = [(0.2, 0.3), (0.5, 0.7), (0.8, 0.25)]
+
+
+def legacy_decode(output, img_w, img_h, threshold):
+    # the per-row loop pothole/stream.py used before decode.py
+    detections = []
+    output = output.reshape(-1, 5)
+    for det in output:
+        x_center, y_center, w, h, conf = det
+        if conf > threshold:
+            x1 = int((x_center - w / 2) * img_w)
+            y1 = int((y_center - h / 2) * img_h)
+            x2 = int((x_center + w / 2) * img_w)
+            y2 = int((y_center + h / 2) * img_h)
+            detections.append((x1, y1, x2, y2, conf))
+    return detections
+
+
+def legacy_nms(detections, iou_threshold, max_boxes):
+    # textbook greedy NMS over the loop's boxes, one box at a time
+    kept = []
+    for det in sorted(detections, key=lambda d: -d[4]):
+        x1, y1, x2, y2, _ = det
+        area = (x2 - x1) * (y2 - y1)
+        for k in kept:
+            iw = max(min(x2, k[2]) - max(x1, k[0]), 0)
+            ih = max(min(y2, k[3]) - max(y1, k[1]), 0)
+            inter = iw * ih
+            if inter / (area + (k[2] - k[0]) * (k[3] - k[1]) - inter) > iou_threshold:
+                break
+        else:
+            kept.append(det)
+            if len(kept) == max_boxes:
+                break
+    return kept
+
+
+def synthetic_output(rng, n=400):
+    out = np.empty((n, 5), dtype=np.float32)
+    out[:, :2] = rng.uniform(0.05, 0.95, (n, 2))
+    out[:, 2:4] = rng.uniform(0.02, 0.2, (n, 2))
+    out[:, 4] = rng.uniform(0, 0.3, n)
+    for cx, cy in CENTRES:
+        idx = rng.choice(n, 10, replace=False)
+        out[idx, :2] = (cx, cy) + rng.normal(0, 0.002, (10, 2))
+        out[idx, 2:4] = 0.1 + rng.normal(0, 0.002, (10, 2))
+        out[idx, 4] = rng.uniform(0.5, 0.99, 10)
+    return out
+
+
+def expected(output, max_boxes=100):
+    return legacy_nms(legacy_decode(output, IMG_W, IMG_H, THRESHOLD), 0.45, max_boxes)
+
+
+def same(got, want):
+    assert [d[:4] for d in got] == [d[:4] for d in want]
+    assert np.allclose([d[4] for d in got], [d[4] for d in want])
+
+
+@pytest.mark.parametrize("shape", ["flat", "rows"])
+def test_single_output_matches_the_loop(shape):
+    output = synthetic_output(np.random.default_rng(1))
+    given = output.reshape(-1) if shape == "flat" else output
+    got = YoloDecoder(THRESHOLD, 100).decode_one(given, IMG_W, IMG_H)
+    assert len(got) == len(CENTRES)
+    same(got, expected(output))
+
+
+def test_rows_output_is_one_image_not_a_batch():
+    output = synthetic_output(np.random.default_rng(2), n=200)
+    decoder = YoloDecoder(THRESHOLD, 100)
+    _, _, counts = decoder.decode(output, IMG_W, IMG_H)
+    assert len(counts) == 1
+    assert np.isclose(decoder.detections(0)[0][4], output[:, 4].max())
+
+
+@pytest.mark.parametrize("shape", ["3d", "flat"])
+def test_batch_matches_the_loop_per_image(shape):
+    rng = np.random.default_rng(3)
+    outputs = np.stack([synthetic_output(rng) for _ in range(4)])
+    decoder = YoloDecoder(THRESHOLD, 100)
+    if shape == "3d":
+        _, _, counts = decoder.decode(outputs, IMG_W, IMG_H)
+    else:
+        _, _, counts = decoder.decode(outputs.reshape(4, -1), IMG_W, IMG_H, batched=True)
+    assert len(counts) == 4
+    for b in range(4):
+        same(decoder.detections(b), expected(outputs[b]))
+
+
+def test_max_boxes_and_empty_output():
+    output = synthetic_output(np.random.default_rng(4))
+    decoder = YoloDecoder(THRESHOLD, 2)
+    same(decoder.decode_one(output, IMG_W, IMG_H), expected(output, max_boxes=2))
+    output[:, 4] = 0
+    assert decoder.decode_one(output, IMG_W, IMG_H) == []
@@ -0,0 +1,145 @@
+import os
+
+import numpy as np
+import pytest
+
+import dataCapture
+import dedup
+import framering
+from clipbuffer import Clip, EncodedFrame
+from dedup import RecentPotholes
+from pipeline import EdgePipeline
+
+LAT, LON = 39.9526, -75.1652
+NOW = 1_746_148_157.0
+M_PER_DEG_LON = dedup.M_PER_DEG_LAT * np.cos(np.radians(LAT))
+
+
+def test_nearby_report_within_the_window_is_a_repeat():
+    recent = RecentPotholes(None, radius_m=15, window_s=3600)
+    assert recent.observe(LAT, LON, NOW) is None
+    recent.record(LAT, LON, NOW)
+
+    hit = recent.observe(LAT + 10 / dedup.M_PER_DEG_LAT, LON, NOW + 60)
+    assert hit[:3] == (LAT, LON, NOW) and hit[3] == pytest.approx(10, abs=0.5)
+    # 20 m east is a different pothole
+    assert recent.observe(LAT, LON + 20 / M_PER_DEG_LON, NOW + 60) is None
+    assert recent.stats()["hits"] == 1 and recent.stats()["events"] == 3
+
+
+def test_reports_expire_after_the_window():
+    recent = RecentPotholes(None, radius_m=15, window_s=3600)
+    recent.record(LAT, LON, NOW)
+    assert recent.check(LAT, LON, NOW + 3599) is not None
+    assert recent.check(LAT, LON, NOW + 3601) is None
+    assert recent.count == 0
+
+
+def test_observe_alone_does_not_record():
+    recent = RecentPotholes(None)
+    assert recent.observe(LAT, LON, NOW) is None
+    assert recent.observe(LAT, LON, NOW + 1) is None
+    assert recent.count == 0
+
+
+def test_index_survives_a_save_and_load(tmp_path):
+    path = str(tmp_path / "dedup.json")
+    recent = RecentPotholes(path, window_s=3600)
+    recent.record(LAT, LON)
+    recent.save()
+    assert RecentPotholes(path, window_s=3600).load().check(LAT, LON) is not None
+
+
+class FakeGps:
+    def position_at(self, t):
+        return LAT, LON
+
+
+class FakeSpool:
+    pass
+
+
+@pytest.fixture
+def edge(tmp_path):
+    recent = RecentPotholes(None, radius_m=15, window_s=3600)
+    return EdgePipeline(str(tmp_path), FakeSpool(), FakeGps(), framering.FrameRing(4), recent,
+                        dedup_mode=dedup.MODE_DROP, clip_queue_size=1)
+
+
+def begun_events(edge):
+    return [options for kind, _, options in edge.clip_buffer._controls if kind == "begin"]
+
+
+def clip_for(edge):
+    (_, event), = begun_events(edge)[-1:]
+    return Clip(None, NOW, None, 0, 0.0, {}, event)
+
+
+def test_saved_clip_suppresses_the_next_drive(edge, monkeypatch):
+    monkeypatch.setattr(dataCapture, "save_clip_and_metadata", lambda *a: True)
+    edge.start_event(0, NOW, 0.0)
+    assert len(begun_events(edge)) == 1
+    edge.save(clip_for(edge))
+    assert (edge.clips_saved, edge.clips_failed) == (1, 0)
+
+    edge.start_event(1, NOW + 600, 600.0)
+    assert len(begun_events(edge)) == 1       # dropped as a re-observation
+
+
+@pytest.mark.parametrize("failure", ["dropped", "not saved", "raised"])
+def test_lost_clip_does_not_suppress_the_next_drive(edge, monkeypatch, failure):
+    def save(*args):
+        if failure == "raised":
+            raise OSError("disk full")
+        return False
+    monkeypatch.setattr(dataCapture, "save_clip_and_metadata", save)
+
+    edge.start_event(0, NOW, 0.0)
+    if failure == "dropped":
+        edge.save_clip(clip_for(edge))      # fills the saver queue
+        edge.save_clip(clip_for(edge))      # backed up: dropped
+        assert edge.clips_dropped == 1
+    else:
+        edge.save(clip_for(edge))
+        assert (edge.clips_saved, edge.clips_failed) == (0, 1)
+
+    edge.start_event(1, NOW + 600, 600.0)
+    assert len(begun_events(edge)) == 2       # recorded again
+    assert edge.dedup.count == 0
+
+
+class QueueAll:
+    def enqueue(self, path, key):
+        return True
+
+
+class OneFrame:
+    """
+    BestFrames stand-in holding a single black frame
+    """
+    first_meta = {"confidences": [0.9], "bboxes": []}
+
+    def ranked(self):
+        jpeg = dataCapture.cv2.imencode(".jpg", np.zeros((8, 8, 3), dtype=np.uint8))[1]
+        return [({"score": 1.0}, EncodedFrame(0, 0.0, jpeg, self.first_meta))]
+
+
+class FixedFixes:
+    raw = ""
+
+    def __init__(self):
+        self.ring = self
+
+    def positions_at(self, ts):
+        return np.array([[LAT, LON]] * len(ts))
+
+
+def test_clip_without_video_is_not_a_report(tmp_path):
+    clip = Clip(None, NOW, OneFrame(), 1, 0.0, {})
+    assert dataCapture.save_clip_and_metadata(clip, QueueAll(), str(tmp_path), FixedFixes()) is False
+
+    clip.path = str(tmp_path / "pothole.mp4")
+    open(clip.path, "wb").close()
+    assert dataCapture.save_clip_and_metadata(clip, QueueAll(), str(tmp_path), FixedFixes()) is True
+    _, out_dir = dataCapture.clip_dir(str(tmp_path), NOW)
+    assert os.path.exists(os.path.join(out_dir, f"pothole_{int(NOW)}.json"))
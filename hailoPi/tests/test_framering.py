@@ -0,0 +1,56 @@
+import numpy as np
+
+from framering import FrameRing
+
+
+def frame(value, shape=(4, 6, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_wraparound_retires_the_oldest_slots():
+    ring = FrameRing(3)
+    seqs = [ring.push(frame(i), {"i": i}) for i in range(5)]
+    assert seqs == [0, 1, 2, 3, 4]
+    assert ring.view(0) is None and ring.view(1) is None
+    assert ring.get_meta(1) is None
+    for seq in (2, 3, 4):
+        assert ring.is_live(seq)
+        assert ring.view(seq)[0, 0, 0] == seq
+        assert ring.get_meta(seq) == {"i": seq}
+    assert ring.latest()[0, 0, 0] == 4
+
+
+def test_push_copies_and_view_does_not():
+    ring = FrameRing(2)
+    src = frame(7)
+    seq = ring.push(src, None)
+    src[:] = 0                       # the GStreamer buffer gets recycled
+    assert ring.view(seq)[0, 0, 0] == 7
+
+    view = ring.view(seq)
+    assert np.shares_memory(view, ring.frames)
+    ring.push(frame(8), None)
+    ring.push(frame(9), None)        # seq's slot reused: the view now shows 9
+    assert view[0, 0, 0] == 9 and ring.view(seq) is None
+
+
+def test_read_copies_out_of_the_ring():
+    ring = FrameRing(2)
+    seq = ring.push(frame(5), None)
+    out = np.empty((4, 6, 3), dtype=np.uint8)
+    got = ring.read(seq, out)
+    assert got is out and out[0, 0, 0] == 5
+    ring.push(frame(6), None)
+    ring.push(frame(7), None)
+    assert out[0, 0, 0] == 5         # still the copy taken before the wrap
+    assert ring.read(seq, out) is None
+
+
+def test_new_frame_shape_reallocates():
+    ring = FrameRing(2)
+    old = ring.push(frame(1), None)
+    new = ring.push(frame(2, shape=(8, 8, 3)), None)
+    assert ring.frames.shape == (2, 8, 8, 3)
+    assert ring.view(old) is None
+    assert ring.view(new).shape == (8, 8, 3)
+    assert ring.latest()[0, 0, 0] == 2
@@ -0,0 +1,112 @@
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from gps import FixRing, GpsService, parse_nmea
+
+
+def nmea(body):
+    checksum = 0
+    for ch in body:
+        checksum ^= ord(ch)
+    return f"${body}*{checksum:02X}"
+
+
+def test_parse_nmea():
+    lat, lon, utc = parse_nmea(nmea("GPRMC,123519,A,4807.038,N,01131.000,W,022.4,084.4,230394,003.1,W"))
+    assert lat == pytest.approx(48.1173) and lon == pytest.approx(-11.516667) and utc == 12 * 3600 + 35 * 60 + 19
+    assert parse_nmea(nmea("GNGGA,123520,4807.038,S,01131.000,E,1,08,0.9,545.4,M,46.9,M,,"))[:2] == \
+        pytest.approx((-48.1173, 11.516667))
+    assert parse_nmea(nmea("GPRMC,123519,V,4807.038,N,01131.000,W,,,230394,,")) is None     # no fix
+    assert parse_nmea(nmea("GPRMC,123519,A,4807.038,N,01131.000,W,,,230394,,")[:-2] + "00") is None
+    assert parse_nmea("garbage") is None
+
+
+def ring_of(times, size=8):
+    ring = FixRing(size, max_gap_s=5.0, max_age_s=2.0)
+    for t in times:
+        ring.append(t, t, -t)
+    return ring
+
+
+def test_position_at_interpolates_between_fixes():
+    ring = ring_of([10.0, 11.0, 12.0])
+    assert ring.position_at(10.25) == pytest.approx((10.25, -10.25))
+    assert ring.position_at(12.0) == pytest.approx((12.0, -12.0))
+
+
+def test_ends_and_outages_use_a_recent_fix_or_nothing():
+    ring = ring_of([10.0, 20.0])
+    assert ring.position_at(9.0) == (10.0, -10.0)
+    assert ring.position_at(7.0) is None
+    assert ring.position_at(11.5) == (10.0, -10.0)      # across the outage, near the first fix
+    assert ring.position_at(15.0) is None
+    assert ring.position_at(19.0) == (20.0, -20.0)
+    assert ring.position_at(23.0) is None
+
+
+def test_old_fixes_are_overwritten_and_time_only_moves_forward():
+    ring = ring_of([float(t) for t in range(20)], size=8)
+    assert not ring.append(5.0, 0.0, 0.0)
+    t, lat, _ = ring.snapshot()
+    assert t.tolist() == [float(t) for t in range(12, 20)]
+    assert ring.position_at(9.0) is None                 # before the oldest kept fix, too far
+    assert ring.latest() == (19.0, 19.0, -19.0)
+
+
+def test_positions_at_matches_position_at():
+    ring = ring_of([10.0, 11.0, 12.5, 20.0, 21.0], size=16)
+    ts = np.arange(6.0, 25.0, 0.25)
+    many = ring.positions_at(ts)
+    for t, row in zip(ts, many):
+        one = ring.position_at(t)
+        if one is None:
+            assert np.isnan(row).all()
+        else:
+            assert row == pytest.approx(one)
+
+
+def test_readers_never_see_a_half_written_fix():
+    # every fix has lon == -lat, so interpolating between whole fixes keeps
+    # that; a torn slot (new t, old lat/lon) would not
+    ring = FixRing(4, max_gap_s=1e9, max_age_s=1e9)
+    stop = threading.Event()
+
+    def writer():
+        t = 0.0
+        while not stop.is_set():
+            t += 1.0
+            ring.append(t, t, -t)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)         # switch threads often enough to land mid-append
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(20000):
+            latest = ring.latest()
+            if latest is None:
+                continue
+            t, lat, lon = latest
+            assert lat == t and lon == -t
+            pos = ring.position_at(t - 1.5)
+            assert pos is None or pos[0] == -pos[1]
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+
+
+def test_replay_stamps_fixes_from_their_utc_times(tmp_path):
+    log = tmp_path / "drive.nmea"
+    log.write_text("\n".join([
+        nmea("GPRMC,235959,A,4807.038,N,01131.000,W,,,230394,,"),
+        nmea("GPGGA,235959,4807.038,N,01131.000,W,1,08,0.9,545.4,M,46.9,M,,"),  # same epoch
+        nmea("GPRMC,000001,A,4807.100,N,01131.000,W,,,240394,,"),            # past midnight
+    ]))
+    service = GpsService(FixRing(16))
+    assert service.replay(str(log), t0=100.0) == 2
+    t, _, _ = service.ring.snapshot()
+    assert t.tolist() == [100.0, 102.0]
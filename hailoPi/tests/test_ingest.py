@@ -0,0 +1,106 @@
+import gzip
+import json
+import time
+
+import urllib3
+
+import ingest
+
+
+class Response:
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+
+class FakeHttp:
+    """
+    Answers POSTs from a script of responses/exceptions, the last one repeating
+    """
+    def __init__(self, *script):
+        self.script = list(script)
+        self.batches = []
+
+    def request(self, method, url, body, headers):
+        self.batches.append([s["key"] for s in json.loads(gzip.decompress(body))["sidecars"]])
+        step = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+def client(http, **kwargs):
+    c = ingest.IngestClient("http://dashboard/api/ingest", "pi-01", base_delay_s=0.01, max_retry_delay_s=0.01, **kwargs)
+    c.http = http
+    return c
+
+
+def wait_for(predicate, timeout_s=3.0):
+    deadline = time.monotonic() + timeout_s
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def ok(accepted):
+    return Response(200, json.dumps({"accepted": accepted, "duplicates": 0}).encode())
+
+
+def test_batches_by_size_and_delay():
+    http = FakeHttp(ok(2))
+    c = client(http, batch_size=2, max_delay_s=0.05).start()
+    for i in range(3):
+        c.submit(f"k{i}", {"timestamp": i})
+    wait_for(lambda: len(http.batches) == 2)
+    assert http.batches == [["k0", "k1"], ["k2"]]
+    c.stop()
+
+
+def test_survives_bad_responses_and_unexpected_errors():
+    http = FakeHttp(Response(200, b"<html>proxy</html>"), RuntimeError("boom"), ok(1))
+    c = client(http, batch_size=1).start()
+    c.submit("a", {})
+    c.submit("b", {})
+    wait_for(lambda: c.stats()["pending"] == 0 and len(http.batches) == 3)
+    # a: odd 2xx body still counts as sent; b: crashed once, then retried
+    assert http.batches == [["a"], ["b"], ["b"]]
+    c.stop()
+
+
+def test_server_errors_give_up_so_later_batches_go_through():
+    http = FakeHttp(Response(500, b""), Response(500, b""), Response(500, b""), ok(1))
+    c = client(http, batch_size=1, max_attempts=3).start()
+    c.submit("poison", {})
+    c.submit("next", {})
+    wait_for(lambda: ["next"] in http.batches)
+    assert http.batches.count(["poison"]) == 3
+    assert c.stats()["given_up"] == 1
+    c.stop()
+
+
+def test_offline_retries_are_not_capped():
+    down = urllib3.exceptions.NewConnectionError(None, "refused")
+    http = FakeHttp(*[down] * 5, ok(1))
+    c = client(http, batch_size=1, max_attempts=2).start()
+    c.submit("a", {})
+    wait_for(lambda: c.stats()["sent"] == 1)
+    assert c.stats()["given_up"] == 0
+    c.stop()
+
+
+def test_refused_batches_are_dropped():
+    http = FakeHttp(Response(400, b"bad"), ok(1))
+    c = client(http, batch_size=1).start()
+    c.submit("bad", {})
+    c.submit("good", {})
+    wait_for(lambda: c.stats()["sent"] == 1)
+    assert http.batches == [["bad"], ["good"]]
+    c.stop()
+
+
+def test_oldest_dropped_past_max_pending():
+    c = client(FakeHttp(ok(0)), max_pending=3)
+    for i in range(5):
+        c.submit(str(i), {})
+    assert [p["key"] for p in c.pending] == ["2", "3", "4"]
+    assert c.stats()["dropped"] == 2
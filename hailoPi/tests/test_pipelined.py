@@ -0,0 +1,94 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from decode import YoloDecoder
+from pipelined import LatestQueue, PipelinedStream, StubBackend
+
+
+def test_latest_queue_drops_the_oldest():
+    q = LatestQueue(2)
+    for i in range(5):
+        q.put(i)
+    assert q.dropped == 3
+    assert [q.get(), q.get()] == [3, 4]
+    assert q.get(timeout=0.01) is None
+
+
+def test_latest_queue_drains_before_reporting_closed():
+    q = LatestQueue(3)
+    q.put("a")
+    q.close()
+    assert q.get() == "a"
+    assert q.get() is None
+
+
+def test_latest_queue_get_wakes_on_put_and_close():
+    q = LatestQueue()
+    got = []
+    reader = threading.Thread(target=lambda: got.extend([q.get(), q.get()]))
+    reader.start()
+    q.put(1)
+    time.sleep(0.01)
+    q.close()
+    reader.join(1)
+    assert got == [1, None]
+
+
+class Capture:
+    def __init__(self, n):
+        self.n = n
+        self.read_count = 0
+
+    def read(self):
+        if self.read_count == self.n:
+            return False, None
+        self.read_count += 1
+        return True, np.zeros((48, 64, 3), dtype=np.uint8)
+
+
+class CountingBackend(StubBackend):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = self.peak = 0
+        self._lock = threading.Lock()
+
+    def send(self, input_data):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        super().send(input_data)
+
+    def receive(self):
+        output = super().receive()
+        with self._lock:
+            self.in_flight -= 1
+        return output
+
+
+def stream(n, latency_s, max_in_flight=3, queue_size=2):
+    backend = CountingBackend(latency_s=latency_s, depth=8, n_candidates=16)
+    return PipelinedStream(
+        Capture(n), backend, YoloDecoder(0.5, 5), input_size=(32, 32), max_in_flight=max_in_flight,
+        queue_size=queue_size,
+    ).start()
+
+
+def test_every_frame_comes_out_in_order_with_room_to_queue():
+    s = stream(30, latency_s=0.001, queue_size=30)
+    frames = list(s.results(timeout=2))
+    assert [f.seq for f in frames] == list(range(30))
+    assert s.dropped() == {"captured": 0, "decoded": 0}
+    assert [d[4] for d in frames[0].detections] == [pytest.approx(0.9)]
+    assert s.stats.report()["frames"] == 30
+
+
+def test_slow_inference_drops_stale_frames_but_keeps_order():
+    s = stream(60, latency_s=0.01)
+    seqs = [f.seq for f in s.results(timeout=2)]
+    assert seqs == sorted(seqs) and len(set(seqs)) == len(seqs)
+    assert seqs[-1] == 59                               # the newest frame always gets through
+    assert len(seqs) < 60 and s.dropped()["captured"] > 0
+    assert s.backend.peak <= 3
@@ -0,0 +1,191 @@
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from boto3.exceptions import S3UploadFailedError
+
+import spool as spool_module
+from spool import PRIORITY_BEST_FRAME, PRIORITY_OTHER, RateLimiter, UploadSpool
+
+
+class FakeS3:
+    def __init__(self):
+        self.keys = []
+        self.uploaded = threading.Event()
+
+    def upload_file(self, path, bucket, key, Config=None, Callback=None):
+        self.keys.append(key)
+        self.uploaded.set()
+
+
+def touch(tmp_path, name, size=10):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def spool_of(tmp_path, s3=None, **kwargs):
+    return UploadSpool(str(tmp_path / "spool.db"), s3 or FakeS3(), "bucket", **kwargs)
+
+
+def test_claims_run_in_priority_order(tmp_path):
+    spool = spool_of(tmp_path)
+    for name in ("a.mp4", "a_best.jpg", "a.json", "b.json"):
+        spool.enqueue(touch(tmp_path, name), name)
+    # express workers never take video, even when it was queued first
+    assert [spool._claim(PRIORITY_BEST_FRAME)[2] for _ in range(3)] == ["a.json", "b.json", "a_best.jpg"]
+    assert spool._claim(PRIORITY_OTHER)[2] == "a.mp4"
+
+
+def test_pending_rows_survive_a_restart(tmp_path):
+    spool = spool_of(tmp_path)
+    spool.enqueue(touch(tmp_path, "a.json"), "a.json")
+    spool._claim(PRIORITY_OTHER)                    # claimed when the process died
+    again = spool_of(tmp_path)
+    assert again.stats()["depth"] == 1
+    assert again._claim(PRIORITY_OTHER)[2] == "a.json"
+
+
+def test_full_spool_times_out(tmp_path):
+    spool = spool_of(tmp_path, max_items=1)
+    assert spool.enqueue(touch(tmp_path, "a.json"), "a.json")
+    assert not spool.enqueue(touch(tmp_path, "b.json"), "b.json", timeout=0.05)
+
+
+def test_uploads_remove_the_file(tmp_path):
+    s3 = FakeS3()
+    spool = spool_of(tmp_path, s3).start()
+    path = touch(tmp_path, "a_best.jpg", size=100)
+    spool.enqueue(path, "2025-05-02/a_best.jpg")
+    assert s3.uploaded.wait(2)
+    deadline = time.monotonic() + 2
+    while spool.stats()["depth"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = spool.stats()
+    assert stats["depth"] == 0 and stats["classes"]["best_frame"]["uploaded_bytes"] == 100
+    assert not (tmp_path / "a_best.jpg").exists()
+
+
+@pytest.mark.parametrize("error, offline", [
+    (EndpointConnectionError(endpoint_url="http://s3"), True),
+    (ClientError({"Error": {"Code": "500"}}, "PutObject"), False),
+])
+def test_failures_back_off(tmp_path, error, offline):
+    spool = spool_of(tmp_path, base_delay_s=60)
+    spool.enqueue(touch(tmp_path, "a.json"), "a.json")
+    row_id, _, _, attempts, _, _ = spool._claim(PRIORITY_OTHER)
+    spool._retry(row_id, attempts, error, offline=offline)
+
+    assert spool.online is not offline
+    assert (spool._resume_at > time.time()) is offline     # the link being down pauses everyone
+    attempts, next_attempt = spool._db.execute("SELECT attempts, next_attempt FROM uploads").fetchone()
+    assert attempts == (0 if offline else 1) and next_attempt >= time.time() + 30
+
+
+class FailingS3(FakeS3):
+    def __init__(self, code):
+        super().__init__()
+        self.code = code
+
+    def upload_file(self, path, bucket, key, Config=None, Callback=None):
+        self.keys.append(key)
+        try:
+            raise ClientError({"Error": {"Code": self.code}}, "PutObject")
+        except ClientError as e:
+            # what boto3's upload_file raises
+            raise S3UploadFailedError(f"Failed to upload {path} to {bucket}/{key}: {e}")
+
+
+def run_until(spool, done, timeout=2):
+    spool.start()
+    deadline = time.monotonic() + timeout
+    while not done() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_permanent_errors_park_the_file_at_once(tmp_path):
+    s3 = FailingS3("AccessDenied")
+    spool = spool_of(tmp_path, s3, max_items=1, base_delay_s=0.01)
+    path = touch(tmp_path, "a.json")
+    spool.enqueue(path, "a.json")
+    run_until(spool, lambda: spool.stats()["parked"])
+
+    assert s3.keys == ["a.json"]
+    assert spool.stats()["parked"] == 1 and spool.stats()["depth"] == 0
+    # a parked file no longer holds the spool full, and stays on disk
+    assert spool.enqueue(touch(tmp_path, "b.json"), "b.json", timeout=0.05)
+    assert (tmp_path / "a.json").exists()
+
+
+def test_other_errors_park_after_max_attempts(tmp_path):
+    s3 = FailingS3("InternalError")
+    spool = spool_of(tmp_path, s3, base_delay_s=0.001, max_delay_s=0.001, max_attempts=3)
+    spool.enqueue(touch(tmp_path, "a.json"), "a.json")
+    run_until(spool, lambda: spool.stats()["parked"])
+
+    assert s3.keys == ["a.json"] * 3
+    assert spool._db.execute("SELECT attempts, parked FROM uploads").fetchone() == (3, 1)
+
+
+def test_parked_files_get_another_go_after_a_restart(tmp_path):
+    spool = spool_of(tmp_path)
+    spool.enqueue(touch(tmp_path, "a.json"), "a.json")
+    row_id, _, key, _, _, _ = spool._claim(PRIORITY_OTHER)
+    spool._park(row_id, key, ClientError({"Error": {"Code": "NoSuchBucket"}}, "PutObject"))
+    assert spool.stats()["parked"] == 1
+
+    again = spool_of(tmp_path)
+    assert again.stats()["parked"] == 0
+    assert again._claim(PRIORITY_OTHER)[2] == "a.json"
+
+
+class FakeClock:
+    """
+    monotonic() and sleep() for the rate limiter; sleeping advances time
+    """
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, s):
+        self.slept.append(s)
+        self.now += s
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(spool_module.time, "monotonic", c.monotonic)
+    monkeypatch.setattr(spool_module.time, "sleep", c.sleep)
+    return c
+
+
+def test_rate_limiter_throttles_to_the_cap(clock):
+    limiter = RateLimiter(1000, burst_s=1.0)
+    limiter.consume(1000)               # the burst is free
+    assert clock.slept == []
+    limiter.consume(500)
+    assert clock.slept == [pytest.approx(0.5)]
+    clock.now += 2.0                    # idle time refills up to the burst only
+    limiter.consume(1000)
+    limiter.consume(250)
+    assert clock.slept[1:] == [pytest.approx(0.25)]
+    # over 4 MB at 1000 B/s the average rate holds
+    start, sent = clock.now, 0
+    for _ in range(400):
+        limiter.consume(10_000)
+        sent += 10_000
+    assert sent / (clock.now - start) == pytest.approx(1000, rel=0.01)
+
+
+@pytest.mark.parametrize("cap", [0, None])
+def test_rate_limiter_is_a_no_op_without_a_cap(tmp_path, clock, cap):
+    spool = spool_of(tmp_path) if cap is None else spool_of(tmp_path, max_bytes_per_s=cap)
+    for _ in range(100):
+        spool.limiter.consume(10_000_000)
+    assert clock.slept == [] and clock.now == 1000.0